@@ -0,0 +1,408 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from datetime import date, datetime, timedelta
+from urllib.parse import urlparse, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from telemetry import log
+
+# =====================================================
+# CONFIG
+# =====================================================
+# Local stand-in for f1api.dev and Open-Meteo. Point the ingestion scripts
+# at it with F1_API_BASE_URL / OPEN_METEO_URL (see the startup log).
+HOST = os.getenv("API_STUB_HOST", "127.0.0.1")
+PORT = int(os.getenv("API_STUB_PORT", "8600"))
+
+FIRST_RACE = (3, 1)  # month, day of round 1
+ROUND_SPACING_DAYS = 12
+ROUNDS_PER_SEASON = 24
+SESSIONS = ["fp1", "fp2", "fp3", "qualy", "race"]
+
+CIRCUITS = [
+    ("Bahrain International Circuit", "Bahrain"),
+    ("Jeddah Corniche Circuit", "Saudi Arabia"),
+    ("Albert Park Circuit", "Australia"),
+    ("Suzuka Circuit", "Japan"),
+    ("Shanghai International Circuit", "China"),
+    ("Miami International Autodrome", "USA"),
+    ("Autodromo Enzo e Dino Ferrari", "Italy"),
+    ("Circuit de Monaco", "Monaco"),
+    ("Gilles Villeneuve Circuit", "Canada"),
+    ("Circuit de Barcelona-Catalunya", "Spain"),
+    ("Red Bull Ring", "Austria"),
+    ("Silverstone Circuit", "UK"),
+    ("Hungaroring", "Hungary"),
+    ("Circuit de Spa-Francorchamps", "Belgium"),
+    ("Circuit Zandvoort", "Netherlands"),
+    ("Autodromo Nazionale di Monza", "Italy"),
+    ("Baku City Circuit", "Azerbaijan"),
+    ("Marina Bay Street Circuit", "Singapore"),
+    ("Circuit of the Americas", "USA"),
+    ("Autódromo Hermanos Rodríguez", "Mexico"),
+    ("Autódromo José Carlos Pace", "Brazil"),
+    ("Las Vegas Strip Circuit", "USA"),
+    ("Losail International Circuit", "Qatar"),
+    ("Yas Marina Circuit", "UAE"),
+]
+
+# (driver_id, team_id) in rough order of pace
+DRIVERS = [
+    ("max_verstappen", "red_bull"), ("norris", "mclaren"),
+    ("leclerc", "ferrari"), ("piastri", "mclaren"),
+    ("hamilton", "ferrari"), ("russell", "mercedes"),
+    ("perez", "red_bull"), ("sainz", "williams"),
+    ("alonso", "aston_martin"), ("gasly", "alpine"),
+    ("hulkenberg", "sauber"), ("tsunoda", "rb"),
+    ("albon", "williams"), ("ocon", "haas"),
+    ("antonelli", "mercedes"), ("stroll", "aston_martin"),
+    ("lawson", "rb"), ("bearman", "haas"),
+    ("doohan", "alpine"), ("bortoleto", "sauber"),
+]
+
+DNF_REASONS = ["Engine", "Gearbox", "Hydraulics", "Brakes", "Collision", "Accident", "Spun off"]
+POINTS = [25, 18, 15, 12, 10, 8, 6, 4, 2, 1]
+
+
+def lap(seconds):
+    m, s = divmod(seconds, 60)
+    return f"{int(m)}:{s:06.3f}"
+
+
+def race_clock(seconds):
+    h, rest = divmod(seconds, 3600)
+    m, s = divmod(rest, 60)
+    return f"{int(h)}:{int(m):02d}:{s:06.3f}"
+
+
+# =====================================================
+# SYNTHETIC PAYLOADS
+# =====================================================
+def race_date(season, rnd):
+    return date(season, *FIRST_RACE) + timedelta(days=ROUND_SPACING_DAYS * (rnd - 1))
+
+
+def race_meta(season, rnd):
+    circuit, country = CIRCUITS[(rnd - 1) % len(CIRCUITS)]
+    day = race_date(season, rnd)
+    return {
+        "raceId": f"{season}_{rnd:02d}_{circuit.split()[0].lower()}",
+        "round": rnd,
+        "raceName": f"{country} Grand Prix",
+        "date": day.isoformat(),
+        "time": "14:00:00Z",
+        "qualyDate": (day - timedelta(days=1)).isoformat(),
+        "laps": 50 + (rnd * 7) % 21,
+        "circuit": {"circuitName": circuit, "country": country},
+    }
+
+
+def synthetic_round(season, rnd, as_of, seed=0):
+    # Deterministic per (seed, season, round); sessions on or after `as_of`
+    # have not happened yet and come back empty, like the real API
+    rng = random.Random(seed * 1_000_000 + season * 100 + rnd)
+    meta = race_meta(season, rnd)
+    day = race_date(season, rnd)
+    base_lap = 78 + rng.random() * 14
+
+    pace = {
+        driver: i * 0.06 + rng.gauss(0, 0.25)
+        for i, (driver, _) in enumerate(DRIVERS)
+    }
+
+    def practice(days_before):
+        if day - timedelta(days=days_before) >= as_of:
+            return []
+        return [
+            {"driverId": d, "teamId": t, "time": lap(base_lap + 1.2 + pace[d] + rng.gauss(0, 0.3))}
+            for d, t in DRIVERS
+        ]
+
+    qualy = []
+    if day - timedelta(days=1) < as_of:
+        q_times = {d: base_lap + pace[d] + rng.gauss(0, 0.15) for d, _ in DRIVERS}
+        order = sorted(DRIVERS, key=lambda dt: q_times[dt[0]])
+        for grid, (d, t) in enumerate(order, start=1):
+            qualy.append({
+                "driverId": d, "teamId": t,
+                "q1": lap(q_times[d] + 0.4),
+                "q2": lap(q_times[d] + 0.2) if grid <= 15 else None,
+                "q3": lap(q_times[d]) if grid <= 10 else None,
+                "gridPosition": grid,
+            })
+
+    results = []
+    if day < as_of and qualy:
+        grid = {q["driverId"]: q["gridPosition"] for q in qualy}
+        race_pace = {d: pace[d] * 60 + grid[d] * 1.5 + rng.gauss(0, 6) for d, _ in DRIVERS}
+        retired = {d: rng.choice(DNF_REASONS) for d, _ in DRIVERS if rng.random() < 0.06}
+        finishers = sorted((d for d, _ in DRIVERS if d not in retired), key=race_pace.get)
+        winner_time = meta["laps"] * (base_lap + 4)
+        team = dict(DRIVERS)
+
+        for pos, d in enumerate(finishers, start=1):
+            gap = race_pace[d] - race_pace[finishers[0]]
+            results.append({
+                "position": pos,
+                "grid": grid[d],
+                "points": POINTS[pos - 1] if pos <= len(POINTS) else 0,
+                "time": race_clock(winner_time) if pos == 1 else f"+{gap:.3f}",
+                "retired": None,
+                "driver": {"driverId": d},
+                "team": {"teamId": team[d]},
+            })
+        for d, reason in retired.items():
+            results.append({
+                "position": "-",
+                "grid": grid[d],
+                "points": 0,
+                "time": None,
+                "retired": reason,
+                "driver": {"driverId": d},
+                "team": {"teamId": team[d]},
+            })
+
+    return {
+        "meta": meta,
+        "fp1Results": practice(2),
+        "fp2Results": practice(2),
+        "fp3Results": practice(1),
+        "qualyResults": qualy,
+        "results": results,
+    }
+
+
+def synthetic_forecast(lat, lon, as_of, days=7):
+    rng = random.Random(f"{lat:.3f},{lon:.3f},{as_of.isoformat()}")
+    base = 28 - abs(lat) * 0.3
+    t_max = [round(base + rng.gauss(0, 3), 1) for _ in range(days)]
+    return {
+        "latitude": lat,
+        "longitude": lon,
+        "timezone": "UTC",
+        "daily": {
+            "time": [(as_of + timedelta(days=i)).isoformat() for i in range(days)],
+            "temperature_2m_max": t_max,
+            "temperature_2m_min": [round(t - 6 - rng.random() * 4, 1) for t in t_max],
+            "precipitation_sum": [round(max(0.0, rng.gauss(0, 3)), 1) for _ in range(days)],
+            "windspeed_10m_max": [round(8 + rng.random() * 20, 1) for _ in range(days)],
+        },
+    }
+
+
+# =====================================================
+# PAYLOAD SOURCE (RECORDED OR SYNTHETIC)
+# =====================================================
+class RoundSource:
+    def __init__(self, fixtures=None, as_of=None, seed=0):
+        self.fixtures = fixtures
+        self.as_of = as_of or date.today()
+        self.seed = seed
+
+    def round(self, season, rnd):
+        # Recorded payloads are plain f1api.dev /{season}/{round} responses
+        path = os.path.join(self.fixtures or "", str(season), f"{rnd}.json")
+        if self.fixtures and os.path.exists(path):
+            with open(path) as f:
+                race = json.load(f)["race"][0]
+            return {
+                "meta": race,
+                **{k: race.get(k, []) for k in
+                   ["fp1Results", "fp2Results", "fp3Results", "qualyResults", "results"]},
+            }
+
+        if rnd < 1 or rnd > ROUNDS_PER_SEASON:
+            return None
+        return synthetic_round(season, rnd, self.as_of, self.seed)
+
+    def full_round(self, season, rnd):
+        data = self.round(season, rnd)
+        if data is None:
+            return None
+        meta = data["meta"]
+        race = {
+            "raceId": meta["raceId"],
+            "raceName": meta["raceName"],
+            "round": meta.get("round", rnd),
+            "laps": meta.get("laps"),
+            "schedule": meta.get("schedule") or {
+                "race": {"date": meta["date"], "time": meta["time"]},
+                "qualy": {"date": meta["qualyDate"], "time": "15:00:00Z"},
+            },
+            "circuit": meta["circuit"],
+        }
+        for key in ["fp1Results", "fp2Results", "fp3Results", "qualyResults", "results"]:
+            race[key] = data[key]
+        return {"season": season, "round": rnd, "race": [race]}
+
+    def session(self, season, rnd, session):
+        data = self.round(season, rnd)
+        if data is None:
+            return None
+        key = "results" if session == "race" else f"{session}Results"
+        return {
+            "season": season,
+            "round": rnd,
+            "races": {"raceId": data["meta"]["raceId"], key: data[key]},
+        }
+
+    def races(self, season):
+        races = []
+        for rnd in range(1, ROUNDS_PER_SEASON + 1):
+            meta = self.round(season, rnd)["meta"]
+            sched = meta.get("schedule", {}).get("race", {})
+            races.append({
+                "raceId": meta["raceId"],
+                "round": str(rnd),
+                "raceName": meta["raceName"],
+                "date": meta.get("date", sched.get("date")),
+                "time": meta.get("time", sched.get("time")),
+                "circuit": meta["circuit"],
+            })
+        return {"season": season, "races": races}
+
+
+# =====================================================
+# FAULT INJECTION
+# =====================================================
+class Faults:
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, rate_429=0.0, error_rate=0.0, seed=0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.rate_429 = rate_429
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def draw(self):
+        # Returns (delay seconds, status override or None)
+        with self.lock:
+            delay = (self.latency_ms + self.rng.random() * self.jitter_ms) / 1000
+            roll = self.rng.random()
+        if roll < self.rate_429:
+            return delay, 429
+        if roll < self.rate_429 + self.error_rate:
+            return delay, 500
+        return delay, None
+
+
+# =====================================================
+# HTTP
+# =====================================================
+def route(source, parsed):
+    parts = [p for p in parsed.path.split("/") if p]
+
+    if parts[:2] == ["v1", "forecast"]:
+        q = parse_qs(parsed.query)
+        lat = float(q["latitude"][0])
+        lon = float(q["longitude"][0])
+        days = int(q.get("forecast_days", ["7"])[0])
+        return synthetic_forecast(lat, lon, source.as_of, days)
+
+    if parts[:1] != ["api"]:
+        return None
+    parts = parts[1:]
+
+    if len(parts) == 2 and parts[1] == "races":
+        return source.races(int(parts[0]))
+    if len(parts) == 2:
+        return source.full_round(int(parts[0]), int(parts[1]))
+    if len(parts) == 3 and parts[2] in SESSIONS:
+        return source.session(int(parts[0]), int(parts[1]), parts[2])
+    return None
+
+
+def make_handler(source, faults, stats):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, code, payload, headers=None):
+            body = json.dumps(payload).encode()
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            parsed = urlparse(self.path)
+            if parsed.path == "/_stats":
+                with stats["lock"]:
+                    self._send(200, {k: v for k, v in stats.items() if k != "lock"})
+                return
+
+            delay, status = faults.draw()
+            if delay:
+                time.sleep(delay)
+
+            with stats["lock"]:
+                stats["requests"] += 1
+                if status:
+                    stats[str(status)] = stats.get(str(status), 0) + 1
+
+            if status == 429:
+                self._send(429, {"error": "rate limited"}, {"Retry-After": "1"})
+                return
+            if status == 500:
+                self._send(500, {"error": "injected failure"})
+                return
+
+            try:
+                payload = route(source, parsed)
+            except (ValueError, KeyError) as e:
+                self._send(400, {"error": str(e)})
+                return
+
+            if payload is None:
+                self._send(404, {"error": "not found"})
+            else:
+                self._send(200, payload)
+
+        def log_message(self, fmt, *args):
+            pass
+
+    return Handler
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local f1api.dev / Open-Meteo stand-in")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--fixtures", help="directory of recorded {season}/{round}.json payloads")
+    parser.add_argument("--as-of", help="pretend today is YYYY-MM-DD (default: today)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--rate-429", type=float, default=0.0, help="fraction of requests answered 429")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered 500")
+    args = parser.parse_args(argv)
+
+    as_of = datetime.strptime(args.as_of, "%Y-%m-%d").date() if args.as_of else None
+    source = RoundSource(args.fixtures, as_of, args.seed)
+    faults = Faults(args.latency_ms, args.jitter_ms, args.rate_429, args.error_rate, args.seed)
+    stats = {"requests": 0, "lock": threading.Lock()}
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(source, faults, stats))
+    server.daemon_threads = True
+
+    base = f"http://{args.host}:{args.port}"
+    log(f"🧪 API stand-in on {base} (as of {source.as_of})")
+    log(f"   export F1_API_BASE_URL={base}/api")
+    log(f"   export OPEN_METEO_URL={base}/v1/forecast")
+    log("   export F1_API_SLEEP=0")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
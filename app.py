@@ -1,10 +1,16 @@
 import os
+import time
 import psycopg2
 import pandas as pd
 import streamlit as st
+import threading
+from contextlib import contextmanager
 from datetime import datetime
-import os
-print("DATABASE_URL =", os.getenv("DATABASE_URL"))
+from psycopg2.pool import ThreadedConnectionPool
+
+import pipeline_state
+import telemetry
+from pipeline_state import COVERAGE_SOURCES
 
 # -----------------------------
 # Page Config
@@ -25,18 +31,103 @@ if not DATABASE_URL:
     st.error("DATABASE_URL not set")
     st.stop()
 
+POOL_MAX_CONN = int(os.getenv("DASHBOARD_POOL_MAX", "8"))
+
+# Stage versions are refreshed the moment the pipeline NOTIFYs; the TTL is
+# only a fallback in case the listener connection is down
+VERSION_TTL_SECONDS = 300
+DATA_TTL_SECONDS = 6 * 3600
+LIVE_CHECK_SECONDS = 5
+
+# One pool per server process, shared by every session's thread; the
+# semaphore makes callers wait for a free connection instead of erroring
+@st.cache_resource
+def get_pool():
+    return (
+        ThreadedConnectionPool(1, POOL_MAX_CONN, DATABASE_URL),
+        threading.BoundedSemaphore(POOL_MAX_CONN),
+    )
+
+@contextmanager
+def pooled_conn():
+    pool, slots = get_pool()
+    with slots:
+        conn = pool.getconn()
+        try:
+            # Read-only dashboard: never leave a connection idle in transaction
+            conn.autocommit = True
+            yield conn
+        except Exception:
+            # Hand back a clean connection; a broken one fails here too
+            # and is closed below instead of being reused
+            if not conn.closed:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    pass
+            raise
+        finally:
+            pool.putconn(conn, close=bool(conn.closed))
+
+@st.cache_data(ttl=VERSION_TTL_SECONDS, show_spinner=False)
+def stage_versions():
+    try:
+        with pooled_conn() as conn, conn.cursor() as cur:
+            cur.execute(pipeline_state.STAGE_VERSIONS_QUERY)
+            return dict(cur.fetchall())
+    except Exception:
+        # Pipeline has not created its state table yet
+        return {}
+
+@st.cache_data(ttl=DATA_TTL_SECONDS, show_spinner=False)
+def cached_query(query, params, version):
+    # Body only runs on a cache miss
+    telemetry.count("dashboard_cache_misses")
+    with telemetry.span("dashboard_query", quiet=True), pooled_conn() as conn:
+        return pd.read_sql(query, conn, params=params)
+
+# -----------------------------
+# Push invalidation (LISTEN/NOTIFY)
+# -----------------------------
+# One listener thread per server process. A notification drops the cached
+# stage versions, so only queries depending on the notified stages miss.
 @st.cache_resource
-def get_conn():
-    return psycopg2.connect(DATABASE_URL)
+def start_listener():
+    state = {"events": 0, "stages": set()}
+
+    def run():
+        while True:
+            try:
+                conn = psycopg2.connect(DATABASE_URL)
+                pipeline_state.listen(conn)
+                while True:
+                    stages = pipeline_state.wait_for_stages(conn, 60)
+                    if stages:
+                        stage_versions.clear()
+                        state["stages"] = stages
+                        state["events"] += 1
+            except Exception:
+                time.sleep(5)
+
+    threading.Thread(target=run, name="f1-listener", daemon=True).start()
+    return state
 
-conn = get_conn()
+listener = start_listener()
 
 # -----------------------------
 # Helpers
 # -----------------------------
-def load_df(query):
+def load_df(query, params=None, depends=None):
+    # Cache key carries the versions of the stages the query reads
+    telemetry.count("dashboard_queries")
+    versions = stage_versions()
+    if depends is None:
+        version = tuple(sorted(versions.items()))
+    else:
+        version = tuple(versions.get(stage) for stage in depends)
+
     try:
-        return pd.read_sql(query, conn)
+        return cached_query(query, params, version)
     except Exception as e:
         st.error(str(e))
         return pd.DataFrame()
@@ -45,82 +136,303 @@ def bool_icon(val):
     return "✅" if val else "❌"
 
 # -----------------------------
-# Upcoming / Latest Race
-# -----------------------------
-st.header("🏁 Latest / Upcoming Race")
-
-race_info = load_df("""
-SELECT
-    r.season,
-    r.round,
-    r.race_name,
-    r.race_date,
-    r.race_time,
-    r.circuit_name,
-    r.circuit_country
-FROM f1_races r
-LEFT JOIN f1_race_results rr
-  ON r.season = rr.season
- AND r.round = rr.round
-WHERE rr.season IS NULL
-ORDER BY r.season ASC, r.round ASC
-LIMIT 1;
-""")
-
-if race_info.empty:
-    st.warning("No race information available.")
-else:
-    race = race_info.iloc[0]
+# Data Health Page
+# -----------------------------
+def render_data_health():
+    # Upcoming / Latest Race
+    st.header("🏁 Latest / Upcoming Race")
+
+    race_info = load_df("""
+    SELECT
+        r.season,
+        r.round,
+        r.race_name,
+        r.race_date,
+        r.race_time,
+        r.circuit_name,
+        r.circuit_country
+    FROM f1_races r
+    LEFT JOIN f1_race_results rr
+      ON r.season = rr.season
+     AND r.round = rr.round
+    WHERE rr.season IS NULL
+    ORDER BY r.season ASC, r.round ASC
+    LIMIT 1;
+    """, depends=("f1_races", "f1_race_results"))
+
+    if race_info.empty:
+        st.warning("No race information available.")
+    else:
+        race = race_info.iloc[0]
+
+        col1, col2, col3 = st.columns(3)
+
+        with col1:
+            st.metric("Season", int(race["season"]))
+            st.metric("Round", int(race["round"]))
 
-    col1, col2, col3 = st.columns(3)
+        with col2:
+            date_str = (
+                pd.to_datetime(race["race_date"], errors="coerce")
+                .strftime("%d %B %Y")
+                if race["race_date"] else "TBD"
+            )
+            st.metric("Race Date", date_str)
+            race_time = race.get("race_time")
 
-    with col1:
-        st.metric("Season", int(race["season"]))
-        st.metric("Round", int(race["round"]))
+            if race_time:
+                race_time_display = race_time.strftime("%H:%M")
+            else:
+                race_time_display = "TBD"
 
-    with col2:
-        date_str = (
-            pd.to_datetime(race["race_date"], errors="coerce")
-            .strftime("%d %B %Y")
-            if race["race_date"] else "TBD"
+            st.metric("Race Time", race_time_display)
+
+        with col3:
+            st.metric("Circuit", race["circuit_name"])
+            st.metric("Country", race["circuit_country"])
+
+    # Data Coverage (one summary table)
+    st.header("🩺 Data Coverage")
+
+    coverage = load_df("""
+    SELECT
+        c.season,
+        c.round,
+        COALESCE(r.race_name, '') AS race_name,
+        c.source,
+        c.row_count,
+        c.updated_at
+    FROM f1_round_coverage c
+    LEFT JOIN f1_races r
+      ON r.season = c.season
+     AND r.round = c.round
+    ORDER BY c.season DESC, c.round ASC;
+    """, depends=("f1_round_coverage", "f1_races"))
+
+    if coverage.empty:
+        st.info("No coverage summary yet — it is written by the pipeline after each run.")
+    else:
+        seasons = coverage["season"].drop_duplicates().tolist()
+        season = st.selectbox("Season", seasons, index=0)
+        season_cov = coverage[coverage["season"] == season]
+
+        matrix = (
+            season_cov
+            .pivot_table(
+                index=["round", "race_name"],
+                columns="source",
+                values="row_count",
+                aggfunc="sum",
+                fill_value=0,
+            )
+            .reindex(columns=list(COVERAGE_SOURCES), fill_value=0)
         )
-        st.metric("Race Date", date_str)
-        race_time = race.get("race_time")
+        matrix["last_updated"] = season_cov.groupby(["round", "race_name"])["updated_at"].max()
 
-        if race_time:
-            race_time_display = race_time.strftime("%H:%M")
-        else:
-            race_time_display = "TBD"
+        st.dataframe(matrix.reset_index(), hide_index=True)
 
-        st.metric("Race Time", race_time_display)
+        last_by_source = season_cov.groupby("source")["updated_at"].max()
+        st.caption(
+            " • ".join(
+                f"{src}: {last_by_source[src]:%d %b %H:%M}"
+                for src in COVERAGE_SOURCES
+                if src in last_by_source
+            )
+        )
+
+    # Model Status (Safe)
+    st.header("🤖 ML Model Status")
+
+    model_exists = os.path.exists("model.pkl")
+
+    if model_exists:
+        st.success("Model trained and available")
+    else:
+        st.warning("Model not trained yet (auto pipeline will handle this)")
 
-    with col3:
-        st.metric("Circuit", race["circuit_name"])
-        st.metric("Country", race["circuit_country"])
+    st.info(
+        """
+    **Important**  
+    The model only trains when:
+    - Race results exist
+    - Qualifying exists
+    - At least 1 completed race
+
+    Until then, the dashboard stays stable and usable.
+    """
+    )
 
 # -----------------------------
-# Model Status (Safe)
+# Predictions Page
 # -----------------------------
-st.header("🤖 ML Model Status")
+PAGE_SIZE = 10
+
+def render_predictions():
+    st.header("🔮 Upcoming Race Predictions")
 
-model_exists = os.path.exists("model.pkl")
+    upcoming = load_df("""
+    SELECT DISTINCT p.season, p.round, r.race_name
+    FROM f1_predictions p
+    JOIN f1_races r
+      ON r.season = p.season
+     AND r.round = p.round
+    WHERE NOT EXISTS (
+        SELECT 1 FROM f1_race_results rr
+        WHERE rr.season = p.season AND rr.round = p.round
+    )
+    ORDER BY p.season, p.round;
+    """, depends=("f1_predictions", "f1_race_results"))
+
+    if upcoming.empty:
+        st.info("No predictions for upcoming rounds yet.")
+    else:
+        labels = [
+            f"{int(r.season)} R{int(r.round)} — {r.race_name}"
+            for r in upcoming.itertuples()
+        ]
+        choice = st.selectbox("Round", range(len(labels)), format_func=labels.__getitem__)
+        sel = upcoming.iloc[choice]
+
+        grid = load_df("""
+        SELECT
+            p.predicted_position AS pos,
+            p.driver_id,
+            p.team_id,
+            100 * pr.p_win    AS p_win,
+            100 * pr.p_podium AS p_podium,
+            pr.expected_points,
+            RANK() OVER (ORDER BY pr.p_win DESC NULLS LAST) AS win_odds_rank
+        FROM f1_predictions p
+        LEFT JOIN f1_race_probabilities pr
+          ON pr.season = p.season
+         AND pr.round = p.round
+         AND pr.driver_id = p.driver_id
+        WHERE p.season = %(season)s AND p.round = %(round)s
+        ORDER BY p.predicted_position;
+        """, {"season": int(sel["season"]), "round": int(sel["round"])},
+            depends=("f1_predictions", "f1_race_probabilities"))
+
+        st.dataframe(
+            grid,
+            hide_index=True,
+            column_config={
+                "p_win": st.column_config.ProgressColumn("P(win)", format="%.1f%%", min_value=0, max_value=100),
+                "p_podium": st.column_config.ProgressColumn("P(podium)", format="%.1f%%", min_value=0, max_value=100),
+                "expected_points": st.column_config.NumberColumn("E[points]", format="%.1f"),
+            },
+        )
+
+        # Per-feature contributions stored with each prediction
+        why = load_df("""
+        SELECT driver_id, base_score, contributions
+        FROM f1_predictions
+        WHERE season = %(season)s AND round = %(round)s
+          AND contributions IS NOT NULL
+        ORDER BY predicted_position;
+        """, {"season": int(sel["season"]), "round": int(sel["round"])},
+            depends=("f1_predictions",))
+
+        if why.empty:
+            st.caption("No explanations stored for this round (forest models only).")
+        else:
+            st.subheader("🧩 Why this position?")
+            driver = st.selectbox("Driver", why["driver_id"].tolist(), key="explain_driver")
+            row = why[why["driver_id"] == driver].iloc[0]
+            contrib = pd.Series(row["contributions"], name="shift").sort_values()
+            st.caption(
+                f"Average prediction {row['base_score']:.2f}; each feature shifts it "
+                f"(negative = towards the front), ending at {row['base_score'] + contrib.sum():.2f}."
+            )
+            st.bar_chart(contrib, horizontal=True)
 
-if model_exists:
-    st.success("Model trained and available")
+    # Season-to-date accuracy, aggregated and paged in SQL
+    st.header("🎯 Season-to-Date Accuracy")
+
+    seasons = load_df("SELECT DISTINCT season FROM f1_predictions ORDER BY season DESC;",
+        depends=("f1_predictions",))
+    if seasons.empty:
+        st.info("No predictions stored yet.")
+        return
+
+    season = st.selectbox("Season", seasons["season"].tolist(), key="accuracy_season")
+    page = st.number_input("Page", min_value=1, value=1, step=1)
+
+    accuracy = load_df("""
+    WITH per_round AS (
+        SELECT
+            p.season,
+            p.round,
+            MAX(p.driver_id)  FILTER (WHERE p.predicted_position = 1) AS predicted_winner,
+            MAX(rr.driver_id) FILTER (WHERE rr.position = 1)          AS actual_winner,
+            COUNT(*) FILTER (WHERE p.predicted_position <= 3 AND rr.position <= 3) AS podium_hits,
+            AVG(ABS(p.predicted_position - rr.position))              AS mean_abs_error,
+            CORR(p.predicted_position, rr.position)                   AS rank_corr
+        FROM f1_predictions p
+        JOIN f1_race_results rr
+          ON rr.season = p.season
+         AND rr.round = p.round
+         AND rr.driver_id = p.driver_id
+        WHERE p.season = %(season)s
+        GROUP BY p.season, p.round
+    )
+    SELECT
+        pr.round,
+        r.race_name,
+        pr.predicted_winner,
+        pr.actual_winner,
+        pr.podium_hits,
+        ROUND(pr.mean_abs_error::numeric, 2) AS mean_abs_error,
+        ROUND(pr.rank_corr::numeric, 3)      AS rank_corr,
+        -- A round missing either winner counts as a miss, not a skip
+        AVG(COALESCE(pr.predicted_winner = pr.actual_winner, false)::int)
+            OVER (ORDER BY pr.round ROWS UNBOUNDED PRECEDING) AS winner_hit_rate_to_date,
+        AVG(pr.podium_hits / 3.0)
+            OVER (ORDER BY pr.round ROWS UNBOUNDED PRECEDING) AS podium_hit_rate_to_date,
+        COUNT(*) OVER () AS total_rounds
+    FROM per_round pr
+    JOIN f1_races r
+      ON r.season = pr.season
+     AND r.round = pr.round
+    ORDER BY pr.round DESC
+    LIMIT %(limit)s OFFSET %(offset)s;
+    """, {"season": int(season), "limit": PAGE_SIZE, "offset": (int(page) - 1) * PAGE_SIZE},
+        depends=("f1_predictions", "f1_race_results"))
+
+    if accuracy.empty:
+        st.info("No completed rounds with predictions on this page.")
+        return
+
+    total = int(accuracy["total_rounds"].iloc[0])
+    if page == 1:
+        latest = accuracy.iloc[0]
+        col1, col2 = st.columns(2)
+        col1.metric("Winner hit rate", f"{latest['winner_hit_rate_to_date']:.0%}")
+        col2.metric("Podium hit rate", f"{latest['podium_hit_rate_to_date']:.0%}")
+
+    st.dataframe(accuracy.drop(columns="total_rounds"), hide_index=True)
+    st.caption(f"Page {int(page)} of {max(1, -(-total // PAGE_SIZE))} • {total} completed rounds")
+
+# -----------------------------
+# Page Router
+# -----------------------------
+page = st.sidebar.radio("Page", ["🩺 Data Health", "🔮 Predictions"])
+
+if page == "🔮 Predictions":
+    render_predictions()
 else:
-    st.warning("Model not trained yet (auto pipeline will handle this)")
+    render_data_health()
 
-st.info(
-    """
-**Important**  
-The model only trains when:
-- Race results exist
-- Qualifying exists
-- At least 1 completed race
-
-Until then, the dashboard stays stable and usable.
-"""
-)
+# Open sessions rerun when the listener has heard new commits; the check
+# reads an in-process counter, never the database
+if hasattr(st, "fragment"):
+    @st.fragment(run_every=LIVE_CHECK_SECONDS)
+    def live_refresh():
+        seen = st.session_state.setdefault("seen_events", listener["events"])
+        if listener["events"] != seen:
+            st.session_state["seen_events"] = listener["events"]
+            st.rerun()
+
+    live_refresh()
 
 # -----------------------------
 # Footer
@@ -1,51 +1,51 @@
 import os
+import sys
 import time
-import requests
-import psycopg2
-from psycopg2.extras import execute_batch
+import argparse
 from datetime import date, datetime
 
+import circuit_affinity
+import form_features
+import pipeline_state
+import telemetry
+import validation
+import weather_history
+
 # ============================================================
 # CONFIG (2026 ONLY)
 # ============================================================
-BASE_URL = "https://f1api.dev/api"
+BASE_URL = os.getenv("F1_API_BASE_URL", "https://f1api.dev/api")
+OPEN_METEO_URL = os.getenv("OPEN_METEO_URL", "https://api.open-meteo.com/v1/forecast")
 SEASON = 2026
 MAX_ROUNDS = 24
-SLEEP_SECONDS = 1.2
+SLEEP_SECONDS = float(os.getenv("F1_API_SLEEP", "1.2"))
 
-DB_URL = os.getenv("DATABASE_URL")
-if not DB_URL:
-    raise RuntimeError("DATABASE_URL not set")
+# Forecasts are fetched for races up to this many days out
+WEATHER_DAYS = 7
 
-# ============================================================
-# DB CONNECT
-# ============================================================
-conn = psycopg2.connect(DB_URL)
-cur = conn.cursor()
-
-print("🚀 AUTO PIPELINE STARTED (2026 ONLY)")
+DB_URL = os.getenv("DATABASE_URL")
+SOURCE = "auto_pipeline"
 
 # ============================================================
 # HELPERS
 # ============================================================
 def fetch_json(url):
+    import requests
+
+    start = time.perf_counter()
+    status = "error"
     try:
         r = requests.get(url, timeout=20)
+        status = r.status_code
         r.raise_for_status()
-        print(f"🌐 API OK → {url}")
+        telemetry.log(f"🌐 API OK → {url}", status=status)
         return r.json()
     except Exception as e:
-        print(f"❌ API failed: {url} → {e}")
-        return None
-
-
-def safe_int(val):
-    if val in [None, "-", ""]:
-        return None
-    try:
-        return int(val)
-    except:
+        telemetry.log(f"❌ API failed: {url} → {e}", status=status)
         return None
+    finally:
+        telemetry.count("http_requests", status=status)
+        telemetry.observe("http_request_seconds", time.perf_counter() - start)
 
 
 def days_to_race(race_date):
@@ -56,12 +56,23 @@ def days_to_race(race_date):
     return (race_date - date.today()).days
 
 
-def exists(table, season, rnd):
-    cur.execute(
-        f"SELECT 1 FROM {table} WHERE season=%s AND round=%s LIMIT 1",
-        (season, rnd),
-    )
-    return cur.fetchone() is not None
+def missing_rounds(conn, cur, table):
+    # Read up front and the read transaction closed, so no transaction
+    # stays open across the API calls that follow
+    cur.execute(f"SELECT DISTINCT round FROM {table} WHERE season=%s", (SEASON,))
+    have = {rnd for (rnd,) in cur.fetchall()}
+    conn.commit()
+    return [rnd for rnd in range(1, MAX_ROUNDS + 1) if rnd not in have]
+
+
+def write_rounds(conn, table, rows):
+    # Staged rows are checked as one batch, then written one short
+    # transaction per round; a failing round is rolled back on its own
+    written = 0
+    for rnd, batch in validation.by_round(validation.prepare(table, rows)).items():
+        with pipeline_state.round_transaction(conn, table, SEASON, rnd) as cur:
+            written += validation.write(cur, batch, SOURCE)
+    return written
 
 
 # ============================================================
@@ -159,14 +170,12 @@ MECHANICAL_DNF_KEYWORDS = [
 # ============================================================
 # RACE CALENDAR
 # ============================================================
-def import_race_calendar():
-    print("📅 Importing race calendar")
+@telemetry.timed()
+def import_race_calendar(conn, cur):
+    telemetry.log("📅 Importing race calendar")
     rows = []
 
-    for rnd in range(1, MAX_ROUNDS + 1):
-        if exists("f1_races", SEASON, rnd):
-            continue
-
+    for rnd in missing_rounds(conn, cur, "f1_races"):
         url = f"{BASE_URL}/{SEASON}/{rnd}"
         data = fetch_json(url)
         time.sleep(SLEEP_SECONDS)
@@ -178,49 +187,32 @@ def import_race_calendar():
         sched = race.get("schedule", {})
         circuit = race.get("circuit", {})
 
-        rows.append((
-            race.get("raceId"),
-            SEASON,
-            rnd,
-            race.get("raceName"),
-            sched.get("race", {}).get("date"),
-            sched.get("race", {}).get("time"),
-            sched.get("qualy", {}).get("date"),
-            sched.get("qualy", {}).get("time"),
-            circuit.get("circuitName"),
-            circuit.get("country"),
-            race.get("laps"),
-        ))
-
-    if rows:
-        execute_batch(
-            cur,
-            """
-            INSERT INTO f1_races
-            (race_id, season, round, race_name,
-             race_date, race_time, qualy_date, qualy_time,
-             circuit_name, circuit_country, laps)
-            VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
-            ON CONFLICT (season, round) DO NOTHING
-            """,
-            rows,
-        )
-        conn.commit()
+        rows.append({
+            "race_id": race.get("raceId"),
+            "season": SEASON,
+            "round": rnd,
+            "race_name": race.get("raceName"),
+            "race_date": sched.get("race", {}).get("date"),
+            "race_time": sched.get("race", {}).get("time"),
+            "qualy_date": sched.get("qualy", {}).get("date"),
+            "qualy_time": sched.get("qualy", {}).get("time"),
+            "circuit_name": circuit.get("circuitName"),
+            "circuit_country": circuit.get("country"),
+            "laps": race.get("laps"),
+        })
 
-    print(f"✅ f1_races: {len(rows)} rows")
+    written = write_rounds(conn, "f1_races", rows)
+    telemetry.log(f"✅ f1_races: {written} rows")
 
 
 # ============================================================
 # FP SESSIONS
 # ============================================================
-def import_fp(session, table, key):
-    print(f"🏎️ Importing {session.upper()}")
+def import_fp(conn, cur, session, table, key):
+    telemetry.log(f"🏎️ Importing {session.upper()}")
     rows = []
 
-    for rnd in range(1, MAX_ROUNDS + 1):
-        if exists(table, SEASON, rnd):
-            continue
-
+    for rnd in missing_rounds(conn, cur, table):
         url = f"{BASE_URL}/{SEASON}/{rnd}"
         data = fetch_json(url)
         time.sleep(SLEEP_SECONDS)
@@ -230,42 +222,29 @@ def import_fp(session, table, key):
 
         race = data["race"][0]
         for r in race.get(key, []):
-            rows.append((
-                SEASON,
-                rnd,
-                race.get("raceId"),
-                r.get("driverId"),
-                r.get("teamId"),
-                r.get("time"),
-            ))
-
-    if rows:
-        execute_batch(
-            cur,
-            f"""
-            INSERT INTO {table}
-            (season, round, race_id, driver_id, team_id, best_time)
-            VALUES (%s,%s,%s,%s,%s,%s)
-            ON CONFLICT DO NOTHING
-            """,
-            rows,
-        )
-        conn.commit()
+            rows.append({
+                "season": SEASON,
+                "round": rnd,
+                "race_id": race.get("raceId"),
+                "driver_id": r.get("driverId"),
+                "team_id": r.get("teamId"),
+                "best_time": r.get("time"),
+            })
 
-    print(f"✅ {table}: {len(rows)} rows")
+    written = write_rounds(conn, table, rows)
+
+    telemetry.log(f"✅ {table}: {written} rows")
 
 
 # ============================================================
 # QUALIFYING
 # ============================================================
-def import_qualy():
-    print("⏱️ Importing qualifying")
+@telemetry.timed()
+def import_qualy(conn, cur):
+    telemetry.log("⏱️ Importing qualifying")
     rows = []
 
-    for rnd in range(1, MAX_ROUNDS + 1):
-        if exists("f1_qualifying_results", SEASON, rnd):
-            continue
-
+    for rnd in missing_rounds(conn, cur, "f1_qualifying_results"):
         url = f"{BASE_URL}/{SEASON}/{rnd}"
         data = fetch_json(url)
         time.sleep(SLEEP_SECONDS)
@@ -275,61 +254,54 @@ def import_qualy():
 
         race = data["race"][0]
         for r in race.get("qualyResults", []):
-            rows.append((
-                SEASON,
-                rnd,
-                race.get("raceId"),
-                r.get("driverId"),
-                r.get("teamId"),
-                r.get("q1"),
-                r.get("q2"),
-                r.get("q3"),
-                safe_int(r.get("gridPosition")),
-            ))
-
-    if rows:
-        execute_batch(
-            cur,
-            """
-            INSERT INTO f1_qualifying_results
-            (season, round, race_id, driver_id, team_id,
-             q1, q2, q3, grid_position)
-            VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s)
-            ON CONFLICT DO NOTHING
-            """,
-            rows,
-        )
-        conn.commit()
+            rows.append({
+                "season": SEASON,
+                "round": rnd,
+                "race_id": race.get("raceId"),
+                "driver_id": r.get("driverId"),
+                "team_id": r.get("teamId"),
+                "q1": r.get("q1"),
+                "q2": r.get("q2"),
+                "q3": r.get("q3"),
+                "grid_position": r.get("gridPosition"),
+            })
 
-    print(f"✅ f1_qualifying_results: {len(rows)} rows")
+    written = write_rounds(conn, "f1_qualifying_results", rows)
+
+    telemetry.log(f"✅ f1_qualifying_results: {written} rows")
 
 
 # ============================================================
 # WEATHER (RACE-WEEK ONLY)
 # ============================================================
-def import_weather():
-    print("🌦️ Importing weather (race-week only)")
-    rows = []
+@telemetry.timed()
+def import_weather(conn, cur):
+    telemetry.log("🌦️ Importing weather (race-week only)")
+    written = 0
 
     cur.execute("""
-        SELECT season, round, race_id, race_date, circuit_name
+        SELECT season, round, race_date, circuit_name
         FROM f1_races
         WHERE season=%s
     """, (SEASON,))
     races = cur.fetchall()
+    issued = weather_history.issue_time()
+    weather_history.ensure_partitions(cur, [issued])
+    conn.commit()
 
-    for season, rnd, race_id, race_date, circuit in races:
+    for season, rnd, race_date, circuit in races:
         delta = days_to_race(race_date)
-        if delta is None or delta < 0 or delta > 7:
+        if delta is None or delta < 0 or delta > WEATHER_DAYS:
             continue
         if circuit not in CIRCUIT_COORDS:
             continue
 
         lat, lon = CIRCUIT_COORDS[circuit]
         url = (
-            "https://api.open-meteo.com/v1/forecast"
+            f"{OPEN_METEO_URL}"
             f"?latitude={lat}&longitude={lon}"
             "&daily=temperature_2m_max,temperature_2m_min,precipitation_sum,windspeed_10m_max"
+            f"&forecast_days={WEATHER_DAYS + 1}"
             "&timezone=UTC"
         )
 
@@ -339,62 +311,31 @@ def import_weather():
         if not data or "daily" not in data:
             continue
 
-        d = data["daily"]
-
-        rows.append((
-            season,
-            rnd,
-            race_id,
-            d["time"][0],
-            (d["temperature_2m_max"][0] + d["temperature_2m_min"][0]) / 2,
-            d["temperature_2m_max"][0],
-            d["temperature_2m_min"][0],
-            d["precipitation_sum"][0],
-            d["windspeed_10m_max"][0],
-        ))
-
-    if rows:
-        execute_batch(
-            cur,
-            """
-            INSERT INTO f1_weather
-            (season, round, race_id, weather_date,
-             temp_avg, temp_max, temp_min, precipitation, wind_speed)
-            VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s)
-            ON CONFLICT DO NOTHING
-            """,
-            rows,
-        )
-        conn.commit()
+        # The whole forecast goes into the history; f1_weather takes the
+        # race-day entry from there
+        with pipeline_state.round_transaction(conn, "f1_weather", season, rnd) as tx:
+            if weather_history.record(tx, circuit, issued, data["daily"]):
+                pipeline_state.mark_updated(tx, weather_history.TABLE)
+            written += weather_history.refresh_race_weather(tx, season, rnd)
 
-    print(f"✅ f1_weather: {len(rows)} rows")
+    telemetry.log(f"✅ f1_weather: {written} rows")
 
 
-def cleanup_weather():
-    print("🧹 Cleaning completed-race weather")
-    cur.execute("""
-        DELETE FROM f1_weather
-        WHERE (season, round) IN (
-            SELECT r.season, r.round
-            FROM f1_races r
-            JOIN f1_race_results rr
-              ON r.season = rr.season AND r.round = rr.round
-        )
-    """)
+@telemetry.timed()
+def prune_weather(conn, cur):
+    weather_history.drop_expired(cur)
     conn.commit()
 
 
 # ============================================================
 # RACE RESULTS + MECHANICAL DNF
 # ============================================================
-def import_race_results():
-    print("🏆 Importing race results")
-    rows = []
-
-    for rnd in range(1, MAX_ROUNDS + 1):
-        if exists("f1_race_results", SEASON, rnd):
-            continue
+@telemetry.timed()
+def import_race_results(conn, cur):
+    telemetry.log("🏆 Importing race results")
+    rows, dnfs = [], []
 
+    for rnd in missing_rounds(conn, cur, "f1_race_results"):
         url = f"{BASE_URL}/{SEASON}/{rnd}"
         data = fetch_json(url)
         time.sleep(SLEEP_SECONDS)
@@ -406,62 +347,84 @@ def import_race_results():
 
         for r in race.get("results", []):
             status = (r.get("retired") or "").lower()
-
-            if any(k in status for k in MECHANICAL_DNF):
-                cur.execute("""
-                    INSERT INTO f1_dnf
-                    (season, round, race_id, driver_id, team_id, dnf_reason)
-                    VALUES (%s,%s,%s,%s,%s,%s)
-                    ON CONFLICT DO NOTHING
-                """, (
-                    SEASON, rnd, race.get("raceId"),
-                    r["driver"]["driverId"],
-                    r["team"]["teamId"],
-                    status
-                ))
-
-            rows.append((
-                SEASON,
-                rnd,
-                race.get("raceId"),
-                r["driver"]["driverId"],
-                r["team"]["teamId"],
-                safe_int(r.get("position")),
-                safe_int(r.get("grid")),
-                safe_int(r.get("points")),
-                r.get("time"),
-                status,
-            ))
-
-    if rows:
-        execute_batch(
-            cur,
-            """
-            INSERT INTO f1_race_results
-            (season, round, race_id, driver_id, team_id,
-             position, grid, points, race_time, status)
-            VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
-            ON CONFLICT DO NOTHING
-            """,
-            rows,
-        )
-        conn.commit()
-
-    print(f"✅ f1_race_results: {len(rows)} rows")
+            driver = {
+                "season": SEASON,
+                "round": rnd,
+                "race_id": race.get("raceId"),
+                "driver_id": (r.get("driver") or {}).get("driverId"),
+                "team_id": (r.get("team") or {}).get("teamId"),
+            }
+
+            if any(k in status for k in MECHANICAL_DNF_KEYWORDS):
+                dnfs.append({**driver, "dnf_reason": status})
+
+            rows.append({
+                **driver,
+                "position": r.get("position"),
+                "grid": r.get("grid"),
+                "points": r.get("points"),
+                "race_time": r.get("time"),
+                "status": status,
+            })
+
+    written = 0
+    results = validation.by_round(validation.prepare("f1_race_results", rows))
+    dnf_rounds = validation.by_round(validation.prepare("f1_dnf", dnfs))
+    for rnd, batch in results.items():
+        with pipeline_state.round_transaction(conn, "f1_race_results", SEASON, rnd) as cur:
+            if rnd in dnf_rounds:
+                validation.write(cur, dnf_rounds.pop(rnd), SOURCE)
+            n = validation.write(cur, batch, SOURCE)
+            # Same transaction, so the form state never lags committed results
+            form_features.update(cur)
+            circuit_affinity.update(cur)
+            written += n
+
+    telemetry.log(f"✅ f1_race_results: {written} rows")
 
 
 # ============================================================
 # RUN ORDER
 # ============================================================
-import_race_calendar()
-import_fp("fp1Results", "f1_fp1_results", "fp1Results")
-import_fp("fp2Results", "f1_fp2_results", "fp2Results")
-import_fp("fp3Results", "f1_fp3_results", "fp3Results")
-import_qualy()
-import_weather()
-cleanup_weather()
-import_race_results()
-
-cur.close()
-conn.close()
-print("🎉 AUTO PIPELINE COMPLETE (2026)")
\ No newline at end of file
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=f"Import the {SEASON} season from f1api.dev")
+    parser.parse_args(argv)
+
+    if not DB_URL:
+        raise RuntimeError("DATABASE_URL not set")
+
+    import psycopg2
+
+    conn = psycopg2.connect(DB_URL)
+    cur = conn.cursor()
+
+    pipeline_state.ensure_schema(cur)
+    validation.ensure_schema(cur)
+    weather_history.ensure_schema(cur)
+    conn.commit()
+
+    telemetry.log("🚀 AUTO PIPELINE STARTED (2026 ONLY)")
+
+    import_race_calendar(conn, cur)
+    with telemetry.span("import_fp", table="f1_fp1_results"):
+        import_fp(conn, cur, "fp1Results", "f1_fp1_results", "fp1Results")
+    with telemetry.span("import_fp", table="f1_fp2_results"):
+        import_fp(conn, cur, "fp2Results", "f1_fp2_results", "fp2Results")
+    with telemetry.span("import_fp", table="f1_fp3_results"):
+        import_fp(conn, cur, "fp3Results", "f1_fp3_results", "fp3Results")
+    import_qualy(conn, cur)
+    import_weather(conn, cur)
+    prune_weather(conn, cur)
+    import_race_results(conn, cur)
+
+    with telemetry.span("refresh_coverage"):
+        pipeline_state.refresh_coverage(cur, SEASON)
+        conn.commit()
+
+    cur.close()
+    conn.close()
+    telemetry.log("🎉 AUTO PIPELINE COMPLETE (2026)")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
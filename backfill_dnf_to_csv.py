@@ -1,11 +1,15 @@
+import os
+import sys
 import csv
 import time
-import requests
+import argparse
 
-BASE_URL = "https://f1api.dev/api"
+import telemetry
+
+BASE_URL = os.getenv("F1_API_BASE_URL", "https://f1api.dev/api")
 SEASONS = [2024, 2025]
 MAX_ROUNDS = 24
-SLEEP = 1.2
+SLEEP = float(os.getenv("F1_API_SLEEP", "1.2"))
 
 OUT_FILE = "f1_dnf_2024_2025.csv"
 
@@ -27,59 +31,72 @@ def is_mechanical(reason: str) -> bool:
     return any(x in r for x in MECH_KEYWORDS)
 
 def fetch(url):
+    import requests
+
     r = requests.get(url, timeout=20)
     r.raise_for_status()
     return r.json()
 
-rows = []
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write mechanical DNFs from f1api.dev to CSV")
+    parser.add_argument("--seasons", type=int, nargs="+", default=SEASONS)
+    parser.add_argument("--out", default=OUT_FILE)
+    args = parser.parse_args(argv)
+    seasons, out = args.seasons, args.out
 
-print("🚀 DNF BACKFILL STARTED")
+    rows = []
 
-for season in SEASONS:
-    for rnd in range(1, MAX_ROUNDS + 1):
-        url = f"{BASE_URL}/{season}/{rnd}"
-        try:
-            data = fetch(url)
-            print(f"🌐 OK {season} R{rnd}")
-        except Exception:
-            continue
+    telemetry.log("🚀 DNF BACKFILL STARTED")
 
-        time.sleep(SLEEP)
-
-        if "races" not in data:
-            continue
+    for season in seasons:
+        for rnd in range(1, MAX_ROUNDS + 1):
+            url = f"{BASE_URL}/{season}/{rnd}"
+            try:
+                data = fetch(url)
+                telemetry.log(f"🌐 OK {season} R{rnd}")
+            except Exception:
+                continue
 
-        race = data["races"]
-        race_id = race.get("raceId")
+            time.sleep(SLEEP)
 
-        for r in race.get("results", []):
-            reason = r.get("retired")
-            if not reason:
+            if "races" not in data:
                 continue
 
-            if is_mechanical(reason):
-                rows.append([
-                    season,
-                    rnd,
-                    race_id,
-                    r["driver"]["driverId"],
-                    r["team"]["teamId"],
-                    reason,
-                    True
-                ])
-
-with open(OUT_FILE, "w", newline="", encoding="utf-8") as f:
-    writer = csv.writer(f)
-    writer.writerow([
-        "season",
-        "round",
-        "race_id",
-        "driver_id",
-        "team_id",
-        "dnf_reason",
-        "is_mechanical"
-    ])
-    writer.writerows(rows)
-
-print(f"✅ CSV CREATED → {OUT_FILE}")
-print(f"📊 Rows written: {len(rows)}")
+            race = data["races"]
+            race_id = race.get("raceId")
+
+            for r in race.get("results", []):
+                reason = r.get("retired")
+                if not reason:
+                    continue
+
+                if is_mechanical(reason):
+                    rows.append([
+                        season,
+                        rnd,
+                        race_id,
+                        r["driver"]["driverId"],
+                        r["team"]["teamId"],
+                        reason,
+                        True
+                    ])
+
+    with open(out, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow([
+            "season",
+            "round",
+            "race_id",
+            "driver_id",
+            "team_id",
+            "dnf_reason",
+            "is_mechanical"
+        ])
+        writer.writerows(rows)
+
+    telemetry.log(f"✅ CSV CREATED → {out}")
+    telemetry.log(f"📊 Rows written: {len(rows)}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -1,183 +1,194 @@
+import os
 import sys
 import time
-import requests
-import psycopg2
-from psycopg2.extras import execute_values
-import os
+import argparse
+
+import circuit_affinity
+import form_features
+import pipeline_state
+import telemetry
+import validation
+from telemetry import log
 
 # ---------------- CONFIG ----------------
-BASE_URL = "https://f1api.dev/api"
-SEASON = int(sys.argv[1])  # 2024 or 2025
-SLEEP = 1.2  # rate-limit safety
+BASE_URL = os.getenv("F1_API_BASE_URL", "https://f1api.dev/api")
+SLEEP = float(os.getenv("F1_API_SLEEP", "1.2"))  # rate-limit safety
 
-DATABASE_URL = os.environ["DATABASE_URL"]
+DATABASE_URL = os.getenv("DATABASE_URL")
+SOURCE = "backfill_season"
 
 # ----------------------------------------
 
-def log(msg):
-    print(msg, flush=True)
-
 def fetch(url):
+    import requests
+
+    start = time.perf_counter()
     r = requests.get(url, timeout=20)
+    telemetry.count("http_requests", status=r.status_code)
+    telemetry.observe("http_request_seconds", time.perf_counter() - start)
     if r.status_code != 200:
         return None
     return r.json()
 
 def connect():
+    import psycopg2
+
+    if not DATABASE_URL:
+        raise RuntimeError("DATABASE_URL not set")
     return psycopg2.connect(DATABASE_URL)
 
-def backfill_races(cur):
+def backfill_races(cur, season):
     log("🏁 Backfilling races metadata")
-    url = f"{BASE_URL}/{SEASON}/races"
+    url = f"{BASE_URL}/{season}/races"
     data = fetch(url)
     if not data:
         log("❌ Failed to fetch races list")
         return []
 
-    races = data["races"]
-    rounds = []
-
-    for r in races:
-        cur.execute("""
-        INSERT INTO f1_races (
-            race_id, season, round, race_name,
-            race_date, race_time,
-            circuit_name, circuit_country
-        )
-        VALUES (%s,%s,%s,%s,%s,%s,%s,%s)
-        ON CONFLICT (race_id) DO NOTHING
-        """, (
-            r["raceId"],
-            SEASON,
-            int(r["round"]),
-            r["raceName"],
-            r.get("date"),
-            r.get("time"),
-            r["circuit"]["circuitName"],
-            r["circuit"]["country"]
-        ))
-        rounds.append(int(r["round"]))
+    rows = []
+    for r in data["races"]:
+        circuit = r.get("circuit") or {}
+        rows.append({
+            "race_id": r.get("raceId"),
+            "season": season,
+            "round": r.get("round"),
+            "race_name": r.get("raceName"),
+            "race_date": r.get("date"),
+            "race_time": r.get("time"),
+            "circuit_name": circuit.get("circuitName"),
+            "circuit_country": circuit.get("country"),
+        })
+
+    validation.load(cur, "f1_races", rows, SOURCE)
+
+    # Rounds already stored count too, so re-runs fill in missing sessions
+    cur.execute("SELECT round FROM f1_races WHERE season = %s ORDER BY round", (season,))
+    rounds = [rnd for (rnd,) in cur.fetchall()]
 
     log(f"✅ Races loaded: {len(rounds)}")
     return rounds
 
-def backfill_fp(cur, round_no, session):
-    url = f"{BASE_URL}/{SEASON}/{round_no}/{session}"
+# Fetchers return a session's rows without touching the database
+def fetch_fp(season, round_no, session):
+    url = f"{BASE_URL}/{season}/{round_no}/{session}"
     data = fetch(url)
     if not data or "races" not in data:
-        return 0
+        return []
 
     key = f"{session}Results"
     if key not in data["races"]:
-        return 0
+        return []
 
     rows = []
     for r in data["races"][key]:
-        rows.append((
-            SEASON,
-            round_no,
-            data["races"]["raceId"],
-            r["driverId"],
-            r["teamId"],
-            r["time"]
-        ))
-
-    execute_values(cur, f"""
-        INSERT INTO f1_{session}_results
-        (season, round, race_id, driver_id, team_id, best_time)
-        VALUES %s
-        ON CONFLICT DO NOTHING
-    """, rows)
-
-    return len(rows)
-
-def backfill_qualy(cur, round_no):
-    url = f"{BASE_URL}/{SEASON}/{round_no}/qualy"
+        rows.append({
+            "season": season,
+            "round": round_no,
+            "race_id": data["races"].get("raceId"),
+            "driver_id": r.get("driverId"),
+            "team_id": r.get("teamId"),
+            "best_time": r.get("time"),
+        })
+
+    return rows
+
+def fetch_qualy(season, round_no):
+    url = f"{BASE_URL}/{season}/{round_no}/qualy"
     data = fetch(url)
     if not data or "qualyResults" not in data["races"]:
-        return 0
+        return []
 
     rows = []
     for q in data["races"]["qualyResults"]:
-        rows.append((
-            SEASON,
-            round_no,
-            data["races"]["raceId"],
-            q["driverId"],
-            q["teamId"],
-            q.get("q1"),
-            q.get("q2"),
-            q.get("q3"),
-            q["gridPosition"]
-        ))
-
-    execute_values(cur, """
-        INSERT INTO f1_qualifying_results
-        (season, round, race_id, driver_id, team_id, q1_time, q2_time, q3_time, grid_position)
-        VALUES %s
-        ON CONFLICT DO NOTHING
-    """, rows)
-
-    return len(rows)
-
-def backfill_race(cur, round_no):
-    url = f"{BASE_URL}/{SEASON}/{round_no}/race"
+        rows.append({
+            "season": season,
+            "round": round_no,
+            "race_id": data["races"].get("raceId"),
+            "driver_id": q.get("driverId"),
+            "team_id": q.get("teamId"),
+            "q1": q.get("q1"),
+            "q2": q.get("q2"),
+            "q3": q.get("q3"),
+            "grid_position": q.get("gridPosition"),
+        })
+
+    return rows
+
+def fetch_race(season, round_no):
+    url = f"{BASE_URL}/{season}/{round_no}/race"
     data = fetch(url)
     if not data or "results" not in data["races"]:
-        return 0
+        return []
 
     rows = []
     for r in data["races"]["results"]:
-        pos = r.get("position")
-        if isinstance(pos, str):
-            pos = None
-
-        rows.append((
-            SEASON,
-            round_no,
-            data["races"]["raceId"],
-            r["driver"]["driverId"],
-            r["team"]["teamId"],
-            pos,
-            r.get("retired")
-        ))
-
-    execute_values(cur, """
-        INSERT INTO f1_race_results
-        (season, round, race_id, driver_id, team_id, position, status)
-        VALUES %s
-        ON CONFLICT DO NOTHING
-    """, rows)
-
-    return len(rows)
+        rows.append({
+            "season": season,
+            "round": round_no,
+            "race_id": data["races"].get("raceId"),
+            "driver_id": (r.get("driver") or {}).get("driverId"),
+            "team_id": (r.get("team") or {}).get("teamId"),
+            "position": r.get("position"),
+            "grid": r.get("grid"),
+            "points": r.get("points"),
+            "race_time": r.get("time"),
+            "status": r.get("retired"),
+        })
+
+    return rows
 
 # ---------------- MAIN ----------------
 
-if __name__ == "__main__":
-    log(f"🚀 BACKFILL STARTED — Season {SEASON}")
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Backfill one past season from f1api.dev")
+    parser.add_argument("season", type=int, help="e.g. 2024 or 2025")
+    season = parser.parse_args(argv).season
+
+    log(f"🚀 BACKFILL STARTED — Season {season}")
 
     conn = connect()
     cur = conn.cursor()
-
-    rounds = backfill_races(cur)
+    pipeline_state.ensure_schema(cur)
+    validation.ensure_schema(cur)
     conn.commit()
 
+    with telemetry.span("backfill_races", season=season):
+        rounds = backfill_races(cur, season)
+        conn.commit()
+
     for rnd in rounds:
         log(f"🔁 Round {rnd}")
 
-        for fp in ["fp1", "fp2", "fp3"]:
-            n = backfill_fp(cur, rnd, fp)
-            log(f"   {fp.upper()}: {n}")
+        with telemetry.span("backfill_round", season=season) as span:
+            span["round"] = rnd
 
-        q = backfill_qualy(cur, rnd)
-        log(f"   QUALY: {q}")
+            # Every session is fetched and checked before the round's
+            # transaction opens
+            staged = [
+                (fp.upper(), validation.prepare(f"f1_{fp}_results", fetch_fp(season, rnd, fp)))
+                for fp in ["fp1", "fp2", "fp3"]
+            ]
+            staged.append(("QUALY", validation.prepare("f1_qualifying_results", fetch_qualy(season, rnd))))
+            staged.append(("RACE", validation.prepare("f1_race_results", fetch_race(season, rnd))))
 
-        r = backfill_race(cur, rnd)
-        log(f"   RACE: {r}")
+            with pipeline_state.round_transaction(conn, "backfill", season, rnd) as tx:
+                for label, batch in staged:
+                    n = validation.write(tx, batch, SOURCE)
+                    log(f"   {label}: {n}")
 
-        conn.commit()
         time.sleep(SLEEP)
 
+    pipeline_state.refresh_coverage(cur, season)
+    # An older season lands behind the form state, so recompute it
+    form_features.rebuild(conn)
+    # Circuit sums don't depend on order, so the new rounds just fold in
+    circuit_affinity.update(cur)
+    conn.commit()
+
     log("🎉 BACKFILL COMPLETE")
     cur.close()
-    conn.close()
\ No newline at end of file
+    conn.close()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,452 @@
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import platform
+import subprocess
+import tempfile
+from datetime import datetime, timezone
+
+from telemetry import log
+
+# =====================================================
+# CONFIG
+# =====================================================
+# End-to-end benchmark: for each data size, load synthetic seasons, then run
+# every pipeline stage in its own process against the local API stand-in.
+# Needs a scratch database in DATABASE_URL; its f1_* tables are replaced.
+# With an embedded duckdb:// URL (see storage.py) only the offline stages run.
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+DATABASE_URL = os.getenv("DATABASE_URL")
+
+DEFAULT_SIZES = [5, 20, 50]  # seasons of history
+BENCH_SEASON = 2026
+BENCH_AS_OF = "2026-07-01"   # fixed "today" for the API stand-in
+BENCH_SEED = 0
+
+STAGES = ["ingest", "features", "train", "predict", "dashboard"]
+EMBEDDED_STAGES = ["features", "train"]
+
+STAGE_SCRIPTS = {
+    "ingest": "auto_pipeline.py",
+    "features": "feature_builder.py",
+    "train": "train_model.py",
+    "predict": "predict_2026.py",
+}
+
+# Rows each stage is measured against, counted after it runs
+STAGE_ROWS = {
+    "ingest": """
+        SELECT (SELECT COUNT(*) FROM f1_races WHERE season = %(season)s)
+             + (SELECT COUNT(*) FROM f1_fp1_results WHERE season = %(season)s)
+             + (SELECT COUNT(*) FROM f1_fp2_results WHERE season = %(season)s)
+             + (SELECT COUNT(*) FROM f1_fp3_results WHERE season = %(season)s)
+             + (SELECT COUNT(*) FROM f1_qualifying_results WHERE season = %(season)s)
+             + (SELECT COUNT(*) FROM f1_race_results WHERE season = %(season)s)
+    """,
+    "features": "SELECT COUNT(*) FROM f1_race_results",
+    "train": "SELECT COUNT(*) FROM f1_race_results WHERE season < %(season)s",
+    "predict": "SELECT COUNT(*) FROM f1_predictions WHERE season = %(season)s",
+    "dashboard": "SELECT COUNT(*) FROM f1_round_coverage",
+}
+
+# Tables auto_pipeline fills for BENCH_SEASON; cleared so ingest does real work
+INGEST_TABLES = [
+    "f1_races", "f1_fp1_results", "f1_fp2_results", "f1_fp3_results",
+    "f1_qualifying_results", "f1_race_results", "f1_dnf", "f1_weather",
+]
+
+# Allowed growth over the baseline before a metric counts as a regression;
+# wall time also needs to move by more than WALL_FLOOR_S to rule out noise
+THRESHOLDS = {
+    "wall_s": 0.25,
+    "peak_rss_mb": 0.20,
+    "db_round_trips": 0.0,
+    "http_calls": 0.0,
+}
+WALL_FLOOR_S = 0.2
+
+
+# =====================================================
+# CHILD SIDE: COUNTING HOOKS
+# =====================================================
+def install_counters(counts):
+    # Count DB round trips (statements, COPYs, commits) and HTTP calls made
+    # by whatever runs in this process
+    import psycopg2
+    import psycopg2.extensions
+    import requests
+
+    class CountingCursor(psycopg2.extensions.cursor):
+        def execute(self, *args, **kwargs):
+            counts["db_round_trips"] += 1
+            return super().execute(*args, **kwargs)
+
+        def executemany(self, query, vars_list):
+            vars_list = list(vars_list)
+            counts["db_round_trips"] += len(vars_list)
+            return super().executemany(query, vars_list)
+
+        def copy_expert(self, *args, **kwargs):
+            counts["db_round_trips"] += 1
+            return super().copy_expert(*args, **kwargs)
+
+    class CountingConnection(psycopg2.extensions.connection):
+        def cursor(self, *args, **kwargs):
+            kwargs.setdefault("cursor_factory", CountingCursor)
+            return super().cursor(*args, **kwargs)
+
+        def commit(self):
+            counts["db_round_trips"] += 1
+            return super().commit()
+
+    connect = psycopg2.connect
+
+    def counting_connect(*args, **kwargs):
+        kwargs.setdefault("connection_factory", CountingConnection)
+        return connect(*args, **kwargs)
+
+    psycopg2.connect = counting_connect
+
+    import storage
+
+    embedded_execute = storage.EmbeddedCursor.execute
+    embedded_executemany = storage.EmbeddedCursor.executemany
+
+    def counting_execute(self, *args, **kwargs):
+        counts["db_round_trips"] += 1
+        return embedded_execute(self, *args, **kwargs)
+
+    def counting_executemany(self, query, vars_list):
+        vars_list = list(vars_list)
+        counts["db_round_trips"] += len(vars_list)
+        return embedded_executemany(self, query, vars_list)
+
+    storage.EmbeddedCursor.execute = counting_execute
+    storage.EmbeddedCursor.executemany = counting_executemany
+
+    send = requests.Session.request
+
+    def counting_request(self, *args, **kwargs):
+        counts["http_calls"] += 1
+        return send(self, *args, **kwargs)
+
+    requests.Session.request = counting_request
+
+
+def run_dashboard():
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(os.path.join(REPO_DIR, "app.py"), default_timeout=120).run()
+    at.sidebar.radio[0].set_value("🔮 Predictions").run()
+    if at.exception:
+        raise RuntimeError(at.exception[0].value)
+
+
+def child_main(stage, counters_path):
+    import runpy
+
+    sys.path.insert(0, REPO_DIR)
+    counts = {"db_round_trips": 0, "http_calls": 0}
+    install_counters(counts)
+
+    try:
+        if stage == "dashboard":
+            run_dashboard()
+        else:
+            script = os.path.join(REPO_DIR, STAGE_SCRIPTS[stage])
+            sys.argv = [script]
+            runpy.run_path(script, run_name="__main__")
+    finally:
+        with open(counters_path, "w") as f:
+            json.dump(counts, f)
+
+
+# =====================================================
+# PARENT SIDE
+# =====================================================
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_api_stub(workdir):
+    port = free_port()
+    proc = subprocess.Popen(
+        [sys.executable, os.path.join(REPO_DIR, "api_stub_server.py"),
+         "--port", str(port), "--as-of", BENCH_AS_OF, "--seed", str(BENCH_SEED)],
+        stdout=open(os.path.join(workdir, "api_stub.log"), "w"),
+        stderr=subprocess.STDOUT,
+    )
+
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return proc, f"http://127.0.0.1:{port}"
+        except OSError:
+            time.sleep(0.05)
+
+    proc.kill()
+    raise RuntimeError("API stand-in did not start")
+
+
+def run_stage(stage, workdir, env):
+    counters_path = os.path.join(workdir, f"{stage}.counters.json")
+    if os.path.exists(counters_path):
+        os.remove(counters_path)
+
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), "--child", stage, counters_path],
+        cwd=workdir,
+        env=env,
+        stdout=open(os.path.join(workdir, f"{stage}.log"), "w"),
+        stderr=subprocess.STDOUT,
+    )
+    # wait4 gives this child's own peak RSS (kilobytes on Linux)
+    _, status, usage = os.wait4(proc.pid, 0)
+    wall = time.perf_counter() - start
+    proc.returncode = os.waitstatus_to_exitcode(status)
+
+    counts = {"db_round_trips": None, "http_calls": None}
+    if os.path.exists(counters_path):
+        with open(counters_path) as f:
+            counts = json.load(f)
+
+    return {
+        "wall_s": round(wall, 3),
+        "peak_rss_mb": round(usage.ru_maxrss / 1024, 1),
+        "returncode": proc.returncode,
+        **counts,
+    }
+
+
+def reset_database(conn, seasons):
+    import circuit_affinity
+    import form_features
+    import pipeline_state
+    import storage
+    import synthetic_data
+
+    tables = synthetic_data.generate_tables(seasons=seasons, seed=BENCH_SEED)
+    if isinstance(conn, storage.EmbeddedConnection):
+        storage.ensure_source_schema(conn)
+        cur = conn.cursor()
+        for name in tables:
+            cur.execute(f"DELETE FROM {name}")
+        synthetic_data.load_tables(conn, tables)
+        for name in INGEST_TABLES:
+            cur.execute(f"DELETE FROM {name} WHERE season = %s", (BENCH_SEASON,))
+        return
+
+    cur = conn.cursor()
+    pipeline_state.ensure_schema(cur)
+    for name in tables:
+        cur.execute(f"DELETE FROM {name}")
+    cur.execute("DELETE FROM f1_predictions")
+    cur.execute("DELETE FROM f1_round_coverage")
+    conn.commit()
+    synthetic_data.load_tables(conn, tables)
+
+    # Leave the benchmark season to the ingest stage
+    cur = conn.cursor()
+    for name in INGEST_TABLES:
+        cur.execute(f"DELETE FROM {name} WHERE season = %s", (BENCH_SEASON,))
+    form_features.rebuild(conn)
+    circuit_affinity.rebuild(cur)
+    conn.commit()
+
+
+def count_rows(stage):
+    import storage
+
+    conn = storage.connect(DATABASE_URL)
+    try:
+        with conn.cursor() as cur:
+            cur.execute(STAGE_ROWS[stage], {"season": BENCH_SEASON})
+            return cur.fetchone()[0]
+    finally:
+        conn.close()
+
+
+def run_benchmark(sizes, stages):
+    import storage
+
+    results = []
+
+    with tempfile.TemporaryDirectory(prefix="f1-bench-") as workdir:
+        stub, base_url = start_api_stub(workdir)
+        env = {
+            **os.environ,
+            "F1_API_BASE_URL": f"{base_url}/api",
+            "OPEN_METEO_URL": f"{base_url}/v1/forecast",
+            "F1_API_SLEEP": "0",
+            "PYTHONPATH": REPO_DIR,
+        }
+
+        try:
+            for seasons in sizes:
+                log(f"📦 {seasons} seasons")
+                # Connections are opened per step: an embedded database
+                # file can only be open in one process at a time
+                conn = storage.connect(DATABASE_URL)
+                try:
+                    reset_database(conn, seasons)
+                finally:
+                    conn.close()
+
+                for stage in stages:
+                    stats = run_stage(stage, workdir, env)
+                    rows = count_rows(stage)
+                    stats.update({
+                        "size": seasons,
+                        "stage": stage,
+                        "rows": rows,
+                        "rows_per_s": round(rows / stats["wall_s"], 1) if stats["wall_s"] else None,
+                    })
+                    results.append(stats)
+
+                    status = "✅" if stats["returncode"] == 0 else f"❌ ({stats['returncode']})"
+                    log(
+                        f"   {status} {stage:<10} {stats['wall_s']:>8.2f}s "
+                        f"{rows:>8} rows  {stats['peak_rss_mb']:>7.1f} MB  "
+                        f"db={stats['db_round_trips']} http={stats['http_calls']}"
+                    )
+
+                    if stats["returncode"] != 0:
+                        with open(os.path.join(workdir, f"{stage}.log")) as f:
+                            log(f.read()[-2000:])
+                        break
+        finally:
+            stub.terminate()
+
+    return results
+
+
+# =====================================================
+# REPORT + REGRESSION CHECK
+# =====================================================
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=REPO_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, thresholds=THRESHOLDS):
+    old = {(r["size"], r["stage"]): r for r in baseline["results"]}
+    regressions = []
+
+    for r in results:
+        base = old.get((r["size"], r["stage"]))
+        if not base:
+            continue
+
+        for metric, tolerance in thresholds.items():
+            new_v, old_v = r.get(metric), base.get(metric)
+            if new_v is None or old_v is None:
+                continue
+            if new_v <= old_v * (1 + tolerance):
+                continue
+            if metric == "wall_s" and new_v - old_v < WALL_FLOOR_S:
+                continue
+            regressions.append({
+                "size": r["size"],
+                "stage": r["stage"],
+                "metric": metric,
+                "baseline": old_v,
+                "current": new_v,
+            })
+
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="End-to-end pipeline benchmark")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+                        help="comma-separated seasons of history")
+    parser.add_argument("--stages", help=f"default: {','.join(STAGES)} "
+                        f"({','.join(EMBEDDED_STAGES)} on an embedded database)")
+    parser.add_argument("--out", default="benchmark_results.json")
+    parser.add_argument("--compare", help="baseline results JSON to check against")
+    parser.add_argument("--wall-tolerance", type=float, default=THRESHOLDS["wall_s"])
+    parser.add_argument("--profile", metavar="MODES",
+                        help="profile every stage's spans (F1_PROFILE, e.g. cprofile,memory)")
+    parser.add_argument("--profile-dir", default="profiles")
+    parser.add_argument("--child", nargs=2, metavar=("STAGE", "COUNTERS"), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        child_main(*args.child)
+        return
+
+    if not DATABASE_URL:
+        raise RuntimeError("DATABASE_URL not set")
+
+    import storage
+
+    embedded = storage.is_embedded(DATABASE_URL)
+    sizes = [int(s) for s in args.sizes.split(",")]
+    if args.stages:
+        stages = [s for s in args.stages.split(",") if s]
+    else:
+        stages = EMBEDDED_STAGES if embedded else STAGES
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        raise ValueError(f"Unknown stages: {', '.join(sorted(unknown))}")
+
+    if embedded:
+        online = set(stages) - set(EMBEDDED_STAGES)
+        if online:
+            raise ValueError(f"Stages need Postgres: {', '.join(sorted(online))}")
+
+    if args.profile:
+        # Children inherit these; profiles land outside the temp workdir
+        os.environ["F1_PROFILE"] = args.profile
+        os.environ["F1_PROFILE_DIR"] = os.path.abspath(args.profile_dir)
+
+    log(f"🏁 Benchmarking {', '.join(stages)} at {sizes} seasons")
+    results = run_benchmark(sizes, stages)
+
+    report = {
+        "commit": git_commit(),
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "sizes": sizes,
+        "results": results,
+    }
+
+    failed = [r for r in results if r["returncode"] != 0]
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        thresholds = {**THRESHOLDS, "wall_s": args.wall_tolerance}
+        report["baseline_commit"] = baseline.get("commit")
+        report["regressions"] = compare(results, baseline, thresholds)
+
+        for r in report["regressions"]:
+            log(
+                f"📉 {r['stage']} @ {r['size']} seasons: {r['metric']} "
+                f"{r['baseline']} → {r['current']}"
+            )
+        if not report["regressions"]:
+            log(f"✅ No regressions against {report['baseline_commit']}")
+
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    log(f"💾 Results → {args.out}")
+
+    if failed or report.get("regressions"):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
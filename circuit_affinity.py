@@ -0,0 +1,344 @@
+import os
+import sys
+import argparse
+
+import telemetry
+from form_features import DNF_FINISH, ENTITIES
+
+# =====================================================
+# CONFIG
+# =====================================================
+# How each driver and team has done at each circuit: running sums per
+# (circuit, entity) with the means derived by Postgres, so a lookup is one
+# primary-key probe. f1_circuit_affinity_rounds records which rounds are
+# folded in, and with how many results; the sums commute, so rounds can
+# arrive in any order, and a round whose count changed (partly loaded, or
+# results added later) has its circuit's rows recomputed.
+DATABASE_URL = os.getenv("DATABASE_URL")
+
+STATS = {"mean_finish": "circuit_finish", "mean_gain": "circuit_gain", "dnf_rate": "circuit_dnf_rate"}
+
+SUM_COLUMNS = ["races", "finish_sum", "gain_sum", "gain_count", "dnfs"]
+
+AFFINITY_FEATURES = [f"{entity}_{name}" for entity in ENTITIES for name in STATS.values()]
+
+SCHEMA_DDL = """
+CREATE TABLE IF NOT EXISTS f1_circuit_affinity (
+    circuit_name TEXT NOT NULL,
+    entity_type  TEXT NOT NULL,
+    entity_id    TEXT NOT NULL,
+    races        INT NOT NULL,
+    finish_sum   DOUBLE PRECISION NOT NULL,
+    gain_sum     DOUBLE PRECISION NOT NULL,
+    gain_count   INT NOT NULL,
+    dnfs         INT NOT NULL,
+    mean_finish  DOUBLE PRECISION GENERATED ALWAYS AS (finish_sum / races) STORED,
+    mean_gain    DOUBLE PRECISION GENERATED ALWAYS AS (gain_sum / NULLIF(gain_count, 0)) STORED,
+    dnf_rate     DOUBLE PRECISION GENERATED ALWAYS AS (dnfs::float8 / races) STORED,
+    updated_at   TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (circuit_name, entity_type, entity_id)
+);
+
+CREATE TABLE IF NOT EXISTS f1_circuit_affinity_rounds (
+    season    INT NOT NULL,
+    round     INT NOT NULL,
+    results   INT,
+    folded_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (season, round)
+);
+
+-- Rounds folded before counts were kept have none, so are refolded once
+ALTER TABLE f1_circuit_affinity_rounds ADD COLUMN IF NOT EXISTS results INT;
+"""
+
+# One row per classified or retired driver: finish (DNFs at the back),
+# qualifying-to-race gain (grid minus finish, classified only), mechanical DNF
+OBSERVATIONS = """
+SELECT
+    r.season,
+    r.round,
+    r.circuit_name,
+    rr.driver_id,
+    rr.team_id,
+    COALESCE(rr.position, {dnf_finish})::float8 AS finish,
+    (q.grid_position - rr.position)::float8     AS gain,
+    (d.driver_id IS NOT NULL)::int              AS dnf
+FROM {rounds} r
+JOIN f1_race_results rr
+  ON rr.season = r.season
+ AND rr.round  = r.round
+LEFT JOIN f1_qualifying_results q
+  ON q.season = rr.season
+ AND q.round  = rr.round
+ AND q.driver_id = rr.driver_id
+LEFT JOIN f1_dnf d
+  ON d.season = rr.season
+ AND d.round  = rr.round
+ AND d.driver_id = rr.driver_id
+WHERE r.circuit_name IS NOT NULL
+"""
+
+# Circuits with a folded round whose result count has changed since: their
+# aggregates and folded rounds are dropped, so FOLD_SQL recomputes them
+UNFOLD_SQL = """
+WITH stale AS (
+    SELECT DISTINCT r.circuit_name
+    FROM f1_circuit_affinity_rounds f
+    JOIN f1_races r
+      ON r.season = f.season
+     AND r.round  = f.round
+    LEFT JOIN (
+        SELECT season, round, COUNT(*) AS results
+        FROM f1_race_results
+        GROUP BY season, round
+    ) c
+      ON c.season = f.season
+     AND c.round  = f.round
+    WHERE f.results IS DISTINCT FROM c.results
+      AND r.circuit_name IS NOT NULL
+),
+dropped AS (
+    DELETE FROM f1_circuit_affinity a
+    USING stale s
+    WHERE a.circuit_name = s.circuit_name
+    RETURNING 1
+),
+unfolded AS (
+    DELETE FROM f1_circuit_affinity_rounds f
+    USING f1_races r, stale s
+    WHERE r.season = f.season
+      AND r.round  = f.round
+      AND r.circuit_name = s.circuit_name
+    RETURNING 1
+)
+SELECT (SELECT COUNT(*) FROM stale), (SELECT COUNT(*) FROM unfolded)
+"""
+
+FOLD_SQL = """
+WITH new_rounds AS (
+    SELECT r.season, r.round, COUNT(*) AS results
+    FROM f1_races r
+    JOIN f1_race_results rr
+      ON rr.season = r.season
+     AND rr.round  = r.round
+    WHERE r.circuit_name IS NOT NULL
+      AND NOT EXISTS (
+          SELECT 1 FROM f1_circuit_affinity_rounds f
+          WHERE f.season = r.season AND f.round = r.round
+      )
+    GROUP BY r.season, r.round
+),
+folded AS (
+    INSERT INTO f1_circuit_affinity_rounds (season, round, results)
+    SELECT season, round, results FROM new_rounds
+    RETURNING season, round
+),
+obs AS (
+{observations}
+),
+agg AS (
+    SELECT circuit_name, 'driver' AS entity_type, driver_id AS entity_id,
+           COUNT(*) AS races, SUM(finish) AS finish_sum,
+           COALESCE(SUM(gain), 0) AS gain_sum, COUNT(gain) AS gain_count,
+           SUM(dnf) AS dnfs
+    FROM obs GROUP BY circuit_name, driver_id
+    UNION ALL
+    SELECT circuit_name, 'team', team_id,
+           COUNT(*), SUM(finish), COALESCE(SUM(gain), 0), COUNT(gain), SUM(dnf)
+    FROM obs WHERE team_id IS NOT NULL GROUP BY circuit_name, team_id
+),
+upserted AS (
+    INSERT INTO f1_circuit_affinity AS a
+    (circuit_name, entity_type, entity_id, races, finish_sum, gain_sum, gain_count, dnfs)
+    SELECT * FROM agg
+    ON CONFLICT (circuit_name, entity_type, entity_id) DO UPDATE SET
+        races      = a.races      + EXCLUDED.races,
+        finish_sum = a.finish_sum + EXCLUDED.finish_sum,
+        gain_sum   = a.gain_sum   + EXCLUDED.gain_sum,
+        gain_count = a.gain_count + EXCLUDED.gain_count,
+        dnfs       = a.dnfs       + EXCLUDED.dnfs,
+        updated_at = NOW()
+    RETURNING 1
+)
+SELECT (SELECT COUNT(*) FROM folded), (SELECT COUNT(*) FROM upserted)
+""".format(
+    observations=OBSERVATIONS.format(
+        dnf_finish=DNF_FINISH,
+        rounds="(SELECT f.season, f.round, x.circuit_name FROM folded f "
+               "JOIN f1_races x ON x.season = f.season AND x.round = f.round)",
+    )
+)
+
+
+def ensure_schema(cur):
+    cur.execute(SCHEMA_DDL)
+
+
+# =====================================================
+# REFRESH
+# =====================================================
+def update(cur):
+    # Folds in every round with results that isn't in the aggregates yet;
+    # touches only those rounds' rows, plus the circuits of any folded round
+    # whose results changed since. Returns the number of rounds folded.
+    import pipeline_state
+
+    ensure_schema(cur)
+    cur.execute(UNFOLD_SQL)
+    stale, unfolded = cur.fetchone()
+    if stale:
+        telemetry.log(f"♻️ Affinity: results changed at {stale} circuits, refolding {unfolded} rounds")
+
+    cur.execute(FOLD_SQL)
+    rounds, entities = cur.fetchone()
+    if rounds or stale:
+        pipeline_state.mark_updated(cur, "f1_circuit_affinity")
+        telemetry.count("rows_written", entities, table="f1_circuit_affinity")
+    return rounds
+
+
+def rebuild(cur):
+    # Recomputes everything, e.g. after qualifying or DNF rows were corrected
+    ensure_schema(cur)
+    cur.execute("DELETE FROM f1_circuit_affinity")
+    cur.execute("DELETE FROM f1_circuit_affinity_rounds")
+    with telemetry.span("affinity_rebuild") as span:
+        span["rounds"] = update(cur)
+    return span["rounds"]
+
+
+# =====================================================
+# FEATURES
+# =====================================================
+def load_observations(conn, before_season=None, from_season=None):
+    import pandas as pd
+
+    query = OBSERVATIONS.format(dnf_finish=DNF_FINISH, rounds="f1_races")
+    query += (
+        "  AND (%(before)s::int IS NULL OR r.season < %(before)s::int)\n"
+        "  AND (%(from)s::int IS NULL OR r.season >= %(from)s::int)\n"
+    )
+    return pd.read_sql(query, conn, params={"before": before_season, "from": from_season})
+
+
+def _round_sums(obs, column):
+    # Per (circuit, entity, round) contributions, in round order
+    return (
+        obs.groupby(["circuit_name", column, "season", "round"], sort=False)
+        .agg(
+            races=("finish", "size"),
+            finish_sum=("finish", "sum"),
+            gain_sum=("gain", "sum"),
+            gain_count=("gain", "count"),
+            dnfs=("dnf", "sum"),
+        )
+        .reset_index()
+        .sort_values(["circuit_name", column, "season", "round"], kind="stable")
+    )
+
+
+def _stats(sums, names):
+    return sums.assign(**{
+        names["mean_finish"]: sums["finish_sum"] / sums["races"],
+        names["mean_gain"]: sums["gain_sum"] / sums["gain_count"],
+        names["dnf_rate"]: sums["dnfs"] / sums["races"],
+    }).drop(columns=SUM_COLUMNS)
+
+
+def history_features(obs):
+    # Per result row: affinity from earlier visits only, in one grouped pass
+    # (cumulative sums minus the round's own contribution)
+    import pandas as pd
+
+    out = obs[["season", "round", "driver_id", "team_id"]].copy()
+
+    for entity, column in ENTITIES.items():
+        sums = _round_sums(obs, column)
+        prior = (
+            sums[SUM_COLUMNS].groupby([sums["circuit_name"], sums[column]], sort=False).cumsum()
+            - sums[SUM_COLUMNS]
+        )
+        prior = prior.where(prior["races"] > 0)
+        names = {stat: f"{entity}_{name}" for stat, name in STATS.items()}
+        keys = sums[["circuit_name", column, "season", "round"]]
+        features = _stats(pd.concat([keys, prior], axis=1), names)
+        out = out.merge(features.drop(columns="circuit_name"), on=["season", "round", column], how="left")
+    return out
+
+
+def attach_affinity(conn, df):
+    # Looks up each row's (circuit, driver) and (circuit, team) aggregates,
+    # minus what that round and any later ones contributed, so completed
+    # rounds see the same pre-race values training did
+    import pandas as pd
+
+    cur = conn.cursor()
+    ensure_schema(cur)
+    cur.close()
+    first = int(df["season"].min()) if len(df) else None
+
+    circuits = pd.read_sql("""
+    SELECT season, round, circuit_name FROM f1_races WHERE season >= %(first)s
+    """, conn, params={"first": first})
+    out = df.merge(circuits, on=["season", "round"], how="left")
+
+    totals = pd.read_sql("""
+    SELECT circuit_name, entity_type, entity_id,
+           races, finish_sum, gain_sum, gain_count, dnfs
+    FROM f1_circuit_affinity
+    WHERE circuit_name = ANY(%(circuits)s)
+    """, conn, params={"circuits": sorted(out["circuit_name"].dropna().unique())})
+
+    recent = load_observations(conn, from_season=first)
+    folded = pd.read_sql(
+        "SELECT season, round FROM f1_circuit_affinity_rounds WHERE season >= %(first)s",
+        conn, params={"first": first},
+    )
+    recent = recent.merge(folded, on=["season", "round"])
+
+    for entity, column in ENTITIES.items():
+        names = {stat: f"{entity}_{name}" for stat, name in STATS.items()}
+        base = totals[totals["entity_type"] == entity].rename(columns={"entity_id": column})
+        rows = out[["season", "round", "circuit_name", column]].merge(
+            base.drop(columns="entity_type"), on=["circuit_name", column], how="left"
+        )
+
+        # Contributions from this round onwards, per output row
+        onwards = _round_sums(recent, column).rename(columns={"season": "r_season", "round": "r_round"})
+        pairs = rows[["season", "round", "circuit_name", column]].reset_index().merge(
+            onwards, on=["circuit_name", column]
+        )
+        pairs = pairs[
+            (pairs["r_season"] > pairs["season"])
+            | ((pairs["r_season"] == pairs["season"]) & (pairs["r_round"] >= pairs["round"]))
+        ]
+        own = pairs.groupby("index")[SUM_COLUMNS].sum().reindex(rows.index, fill_value=0)
+
+        remaining = rows[SUM_COLUMNS].fillna(0) - own
+        remaining = remaining.where(remaining["races"] > 0)
+        stats = _stats(remaining, names)
+        out[list(names.values())] = stats[list(names.values())].to_numpy()
+
+    return out.drop(columns="circuit_name")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain the circuit affinity aggregates")
+    parser.add_argument("--rebuild", action="store_true", help="recompute from all results")
+    args = parser.parse_args(argv)
+
+    if not DATABASE_URL:
+        raise RuntimeError("DATABASE_URL not set")
+
+    import psycopg2
+
+    conn = psycopg2.connect(DATABASE_URL)
+    cur = conn.cursor()
+    rounds = rebuild(cur) if args.rebuild else update(cur)
+    conn.commit()
+    conn.close()
+    telemetry.log(f"✅ f1_circuit_affinity: {rounds} rounds folded in")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
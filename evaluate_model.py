@@ -0,0 +1,342 @@
+import os
+import sys
+import json
+import math
+import time
+import argparse
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+from threadpoolctl import threadpool_limits
+
+import model_backends
+import storage
+import telemetry
+from train_model import DATABASE_URL, FEATURES, load_training_frame, prepare_xy, race_keys
+
+# =====================================================
+# CONFIG
+# =====================================================
+ETA = 3
+MIN_FOLDS = 1
+LATENCY_REPEATS = 5
+
+
+def candidate_configs(backends):
+    configs = []
+    for backend in backends:
+        space = model_backends.SEARCH_SPACES[backend]
+        keys = list(space)
+        for values in itertools.product(*space.values()):
+            configs.append({"backend": backend, **dict(zip(keys, values))})
+    return configs
+
+
+# =====================================================
+# SHARED FEATURE MATRIX
+# =====================================================
+# The parent process owns the shared blocks; workers map them read-only
+# so the feature matrix is never pickled per task.
+_SHARED = {}
+_HANDLES = []
+
+
+def share_array(arr):
+    arr = np.ascontiguousarray(arr)
+    shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+    np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[...] = arr
+    return shm, (shm.name, arr.shape, arr.dtype.str)
+
+
+def _attach(specs):
+    # One core per worker: the pool already fans out across folds and configs
+    threadpool_limits(limits=1)
+    for key, (name, shape, dtype) in specs.items():
+        shm = shared_memory.SharedMemory(name=name)
+        _HANDLES.append(shm)
+        _SHARED[key] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+
+
+# =====================================================
+# FOLDS (SEASON-BLOCKED)
+# =====================================================
+def season_folds(seasons, scheme):
+    seasons = sorted(set(int(s) for s in seasons))
+    if scheme == "loso":
+        folds = [("loso", s) for s in seasons]
+    else:
+        # Rolling origin: train on every season before the test season
+        folds = [("rolling", s) for s in seasons[1:]]
+
+    # Most recent seasons first so early halving rungs score on current form
+    return folds[::-1]
+
+
+def fold_masks(season, fold):
+    scheme, test_season = fold
+    test = season == test_season
+    train = season < test_season if scheme == "rolling" else ~test
+    return train, test
+
+
+# =====================================================
+# METRICS
+# =====================================================
+def race_metrics(race_ids, y_true, y_pred):
+    df = pd.DataFrame({"race": race_ids, "y": y_true, "p": y_pred})
+    grouped = df.groupby("race", sort=False)
+
+    # Winner hit: the driver with the best predicted position actually won
+    best = df.loc[grouped["p"].idxmin()]
+    winner_hit = float((best["y"] == 1).mean())
+
+    # Spearman = Pearson on within-race ranks
+    df["ry"] = grouped["y"].rank()
+    df["rp"] = grouped["p"].rank()
+    df["ry"] -= df.groupby("race", sort=False)["ry"].transform("mean")
+    df["rp"] -= df.groupby("race", sort=False)["rp"].transform("mean")
+    num = (df["ry"] * df["rp"]).groupby(df["race"]).sum()
+    den = np.sqrt(
+        (df["ry"] ** 2).groupby(df["race"]).sum()
+        * (df["rp"] ** 2).groupby(df["race"]).sum()
+    )
+    spearman = float((num / den.replace(0, np.nan)).mean())
+
+    return winner_hit, spearman
+
+
+def fold_medians(X, train):
+    # Fill values from the training rows only, as train_model stores them in
+    # the artifact; a column with no values at all falls back to 0
+    return pd.DataFrame(X[train]).median().fillna(0).to_numpy()
+
+
+def fill_missing(X, medians):
+    missing = np.isnan(X)
+    X[missing] = np.broadcast_to(medians, X.shape)[missing]
+    return X
+
+
+def score_split(backend, params, X, y, race, train, test):
+    # The held-out season never shapes the values its training rows are filled with
+    medians = fold_medians(X, train)
+
+    start = time.perf_counter()
+    model = model_backends.fit(backend, fill_missing(X[train], medians), y[train], race[train], **params)
+    fit_s = time.perf_counter() - start
+
+    X_test, race_test = fill_missing(X[test], medians), race[test]
+    start = time.perf_counter()
+    y_pred = model_backends.predict_positions(backend, model, X_test, race_test)
+    predict_s = time.perf_counter() - start
+
+    # Serving latency: scoring one race grid, as the predictor does
+    one_race = race_test == race_test[0]
+    samples = []
+    for _ in range(LATENCY_REPEATS):
+        start = time.perf_counter()
+        model_backends.predict_positions(
+            backend, model, X_test[one_race], race_test[one_race]
+        )
+        samples.append(time.perf_counter() - start)
+
+    winner_hit, spearman = race_metrics(race_test, y[test], y_pred)
+
+    return model, {
+        "winner_hit": winner_hit,
+        "spearman": spearman,
+        "fit_s": fit_s,
+        "predict_ms_per_row": 1000 * predict_s / max(len(X_test), 1),
+        "predict_ms_per_race": 1000 * float(np.median(samples)),
+    }
+
+
+def evaluate_fold(task):
+    config_id, config, fold = task
+    params = dict(config)
+    backend = params.pop("backend")
+    train, test = fold_masks(_SHARED["season"], fold)
+
+    if backend == "rf":
+        params["n_jobs"] = 1
+
+    _, metrics = score_split(
+        backend, params, _SHARED["X"], _SHARED["y"], _SHARED["race"], train, test
+    )
+    return {"config_id": config_id, "fold": f"{fold[0]}:{fold[1]}", **metrics}
+
+
+# =====================================================
+# SUCCESSIVE HALVING
+# =====================================================
+def summarize(results, configs):
+    df = pd.DataFrame(results)
+    summary = (
+        df.groupby("config_id")
+        .agg(
+            folds=("fold", "count"),
+            winner_hit=("winner_hit", "mean"),
+            spearman=("spearman", "mean"),
+            fit_s=("fit_s", "mean"),
+            predict_ms_per_row=("predict_ms_per_row", "mean"),
+            predict_ms_per_race=("predict_ms_per_race", "mean"),
+        )
+        .reset_index()
+    )
+    summary["params"] = summary["config_id"].map(lambda i: json.dumps(configs[i]))
+    return summary.sort_values(
+        ["folds", "spearman", "winner_hit"], ascending=False
+    ).reset_index(drop=True)
+
+
+def successive_halving(pool, configs, folds, eta=ETA, min_folds=MIN_FOLDS):
+    alive = list(range(len(configs)))
+    results = []
+    done = set()
+    budget = min(min_folds, len(folds))
+    rung = 0
+
+    while True:
+        tasks = [
+            (i, configs[i], fold)
+            for i in alive
+            for fold in folds[:budget]
+            if (i, fold) not in done
+        ]
+        for res in pool.map(evaluate_fold, tasks):
+            results.append(res)
+        done.update((i, fold) for i, _, fold in tasks)
+
+        scores = summarize(
+            [r for r in results if r["config_id"] in alive], configs
+        )
+        telemetry.log(
+            f"🪜 Rung {rung}: {len(alive)} configs × {budget} folds "
+            f"→ best spearman {scores['spearman'].iloc[0]:.3f}"
+        )
+
+        if len(alive) == 1 or budget == len(folds):
+            break
+
+        keep = max(1, math.ceil(len(alive) / eta))
+        alive = scores["config_id"].head(keep).tolist()
+        budget = min(budget * eta, len(folds))
+        rung += 1
+
+    return summarize(results, configs)
+
+
+# =====================================================
+# BACKEND BENCHMARK
+# =====================================================
+def benchmark_backends(arrays, backends):
+    # Default settings of each backend on the latest rolling-origin split
+    X, y, season, race = arrays["X"], arrays["y"], arrays["season"], arrays["race"]
+    train, test = fold_masks(season, ("rolling", int(season.max())))
+    if not train.any():
+        train = test
+
+    rows = []
+    for backend in backends:
+        model, metrics = score_split(backend, {}, X, y, race, train, test)
+        artifact = model_backends.make_artifact(backend, model, FEATURES, {})
+        rows.append({
+            "backend": backend,
+            **metrics,
+            "artifact_kb": model_backends.artifact_size(artifact) / 1024,
+        })
+        telemetry.log(f"⏱️ {backend}: fit {metrics['fit_s']:.2f}s")
+
+    return pd.DataFrame(rows)
+
+
+# =====================================================
+# MAIN
+# =====================================================
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Season-blocked CV and hyperparameter search"
+    )
+    parser.add_argument("--cv", choices=["loso", "rolling"], default="rolling")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--eta", type=int, default=ETA)
+    parser.add_argument(
+        "--backends",
+        nargs="+",
+        choices=sorted(model_backends.BACKENDS),
+        default=[model_backends.DEFAULT_BACKEND],
+    )
+    parser.add_argument(
+        "--benchmark",
+        action="store_true",
+        help="compare backends on fit time, latency and artifact size instead of searching",
+    )
+    parser.add_argument("--out", help="write the per-config report as JSON")
+    args = parser.parse_args(argv)
+
+    if not DATABASE_URL:
+        raise RuntimeError("DATABASE_URL not set")
+
+    telemetry.log("🧪 EVALUATION STARTED")
+
+    conn = storage.connect(DATABASE_URL)
+    df = load_training_frame(conn)
+    conn.close()
+
+    X, y = prepare_xy(df)
+    meta = df.loc[X.index]
+
+    folds = season_folds(meta["season"], args.cv)
+    if not folds:
+        telemetry.log("⚠️ Not enough seasons for season-blocked CV")
+        return
+
+    arrays = {
+        "X": X[FEATURES].to_numpy(dtype=np.float64),
+        "y": y.to_numpy(dtype=np.float64),
+        "season": meta["season"].to_numpy(dtype=np.int64),
+        "race": race_keys(meta),
+    }
+
+    if args.benchmark:
+        report = benchmark_backends(arrays, args.backends)
+        write_report(report, args.out)
+        telemetry.log("✅ BENCHMARK COMPLETE")
+        return
+
+    handles, specs = [], {}
+    for key, arr in arrays.items():
+        shm, specs[key] = share_array(arr)
+        handles.append(shm)
+
+    configs = candidate_configs(args.backends)
+    telemetry.log(f"📐 {len(configs)} configs, {len(folds)} folds ({args.cv}), {len(X)} rows")
+
+    try:
+        with ProcessPoolExecutor(
+            max_workers=args.workers, initializer=_attach, initargs=(specs,)
+        ) as pool:
+            report = successive_halving(pool, configs, folds, eta=args.eta)
+    finally:
+        for shm in handles:
+            shm.close()
+            shm.unlink()
+
+    write_report(report, args.out)
+    telemetry.log("✅ EVALUATION COMPLETE")
+
+
+def write_report(report, out=None):
+    pd.set_option("display.width", 200)
+    telemetry.log("📊 Report\n" + report.to_string(index=False))
+
+    if out:
+        report.to_json(out, orient="records", indent=2)
+        telemetry.log(f"💾 Report written → {out}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
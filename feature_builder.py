@@ -1,17 +1,17 @@
 
 import os
-import psycopg2
-import pandas as pd
+import sys
+import argparse
+
+import telemetry
 
 # ====================================
-# DB CONNECTION
+# CONFIG
 # ====================================
 DATABASE_URL = os.getenv("DATABASE_URL")
-
-if not DATABASE_URL:
-    raise RuntimeError("DATABASE_URL not set")
-
-conn = psycopg2.connect(DATABASE_URL)
+OUT_DIR = "data"
+TRAIN_BEFORE_SEASON = 2026
+PREDICT_SEASON = 2026
 
 # ====================================
 # LOAD DATA
@@ -73,13 +73,22 @@ LEFT JOIN f1_sprint_race_results sr
  AND sr.driver_id = rr.driver_id
 """
 
-df = pd.read_sql(QUERY, conn)
-conn.close()
+
+def load_feature_rows(conn):
+    import pandas as pd
+
+    with telemetry.span("load_feature_rows") as span:
+        df = pd.read_sql(QUERY, conn)
+        span["rows"] = len(df)
+    return df
+
 
 # ====================================
 # TIME CONVERSION
 # ====================================
 def time_to_seconds(t):
+    import pandas as pd
+
     if pd.isna(t):
         return None
     try:
@@ -93,31 +102,6 @@ def time_to_seconds(t):
 
 TIME_COLS = ["q1", "q2", "q3", "fp1_time", "fp2_time", "fp3_time"]
 
-for col in TIME_COLS:
-    df[col] = df[col].apply(time_to_seconds)
-
-# ====================================
-# MISSING DATA HANDLING
-# ====================================
-df["grid_position"] = df["grid_position"].fillna(20)
-df["sprint_grid"] = df["sprint_grid"].fillna(df["grid_position"])
-df["sprint_finish"] = df["sprint_finish"].fillna(20)
-
-df["fp3_time"] = df["fp3_time"].fillna(df["fp2_time"])
-df["fp2_time"] = df["fp2_time"].fillna(df["fp1_time"])
-
-for col in ["fp1_time", "fp2_time", "fp3_time"]:
-    df[col] = df[col].fillna(df[col].median())
-
-# ====================================
-# ENCODE CATEGORIES
-# ====================================
-df["driver_code"] = df["driver_id"].astype("category").cat.codes
-df["team_code"]   = df["team_id"].astype("category").cat.codes
-
-# ====================================
-# SPLIT DATA
-# ====================================
 FEATURES = [
     "grid_position",
     "q1", "q2", "q3",
@@ -127,30 +111,80 @@ FEATURES = [
     "round"
 ]
 
-train_df = df[
-    (df["season"] <= 2025) &
-    (df["race_position"].notna())
-]
 
-predict_df = df[
-    (df["season"] == 2026) &
-    (df["race_position"].isna())
-]
+# ====================================
+# BUILD FEATURES
+# ====================================
+def build_features(df):
+    with telemetry.span("parse_times"):
+        for col in TIME_COLS:
+            df[col] = df[col].apply(time_to_seconds)
+
+    # Missing data handling
+    df["grid_position"] = df["grid_position"].fillna(20)
+    df["sprint_grid"] = df["sprint_grid"].fillna(df["grid_position"])
+    df["sprint_finish"] = df["sprint_finish"].fillna(20)
+
+    df["fp3_time"] = df["fp3_time"].fillna(df["fp2_time"])
+    df["fp2_time"] = df["fp2_time"].fillna(df["fp1_time"])
+
+    for col in ["fp1_time", "fp2_time", "fp3_time"]:
+        df[col] = df[col].fillna(df[col].median())
+
+    # Encode categories
+    df["driver_code"] = df["driver_id"].astype("category").cat.codes
+    df["team_code"]   = df["team_id"].astype("category").cat.codes
+    return df
+
+
+def split(df):
+    train_df = df[
+        (df["season"] < TRAIN_BEFORE_SEASON) &
+        (df["race_position"].notna())
+    ]
+
+    predict_df = df[
+        (df["season"] == PREDICT_SEASON) &
+        (df["race_position"].isna())
+    ]
 
-X_train = train_df[FEATURES]
-y_train = train_df["race_position"]
+    return train_df[FEATURES], train_df["race_position"], predict_df[FEATURES]
 
-X_pred = predict_df[FEATURES]
 
 # ====================================
 # EXPORT (OPTIONAL, SAFE)
 # ====================================
-os.makedirs("data", exist_ok=True)
+def export(X_train, y_train, X_pred, out_dir=OUT_DIR):
+    os.makedirs(out_dir, exist_ok=True)
+
+    X_train.to_csv(os.path.join(out_dir, "X_train.csv"), index=False)
+    y_train.to_csv(os.path.join(out_dir, "y_train.csv"), index=False)
+    X_pred.to_csv(os.path.join(out_dir, f"X_pred_{PREDICT_SEASON}.csv"), index=False)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export model feature CSVs")
+    parser.add_argument("--out", default=OUT_DIR, help="output directory")
+    args = parser.parse_args(argv)
+
+    if not DATABASE_URL:
+        raise RuntimeError("DATABASE_URL not set")
+
+    import storage
+
+    conn = storage.connect(DATABASE_URL)
+    try:
+        df = load_feature_rows(conn)
+    finally:
+        conn.close()
+
+    X_train, y_train, X_pred = split(build_features(df))
+    export(X_train, y_train, X_pred, args.out)
+
+    telemetry.log("✅ Feature engineering complete")
+    telemetry.log(f"Training rows: {len(X_train)}")
+    telemetry.log(f"Prediction rows ({PREDICT_SEASON}): {len(X_pred)}")
 
-X_train.to_csv("data/X_train.csv", index=False)
-y_train.to_csv("data/y_train.csv", index=False)
-X_pred.to_csv("data/X_pred_2026.csv", index=False)
 
-print("✅ Feature engineering complete")
-print(f"Training rows: {len(X_train)}")
-print(f"Prediction rows (2026): {len(X_pred)}")
\ No newline at end of file
+if __name__ == "__main__":
+    main(sys.argv[1:])
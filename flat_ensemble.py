@@ -0,0 +1,252 @@
+import sys
+import time
+import argparse
+import numpy as np
+
+# =====================================================
+# FLAT TREE ENSEMBLES
+# =====================================================
+# A fitted forest or boosted model is copied into one set of contiguous node
+# arrays (all trees back to back) and evaluated for a whole batch at once,
+# one tree level per step, with no input validation or thread dispatch.
+# (row, tree) pairs drop out of the working set as they reach a leaf, so
+# the work follows the actual path lengths. Results match sklearn exactly:
+#   - forests compare float32 inputs with float64 thresholds and sum the
+#     trees in order before dividing (sklearn's n_jobs=1 order)
+#   - boosting compares float64 inputs and adds the trees to the baseline
+#     in iteration order
+# Anything else (categorical splits, multi-output) is left to sklearn.
+
+
+def _pack(trees, kind, dtype, baseline=0.0):
+    # trees: (feature, threshold, left, right, missing_left, value, depth)
+    sizes = np.array([len(t[0]) for t in trees], dtype=np.int64)
+    offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+
+    feature, threshold, left, right, missing_left, value = (
+        np.concatenate([t[i] for t in trees]) for i in range(6)
+    )
+    # Child indices become global, interleaved as [left, right] per node;
+    # leaves loop back to themselves
+    left, right = left.astype(np.int64), right.astype(np.int64)
+    shift = np.repeat(offsets, sizes)
+    nodes = np.arange(len(feature), dtype=np.int64)
+    leaf = left < 0
+    children = np.stack([
+        np.where(leaf, nodes, left + shift),
+        np.where(leaf, nodes, right + shift),
+    ], axis=1).ravel()
+
+    return {
+        "kind": kind,
+        "dtype": dtype,
+        "baseline": float(baseline),
+        "roots": offsets.astype(np.int64),
+        "depth": int(max(t[6] for t in trees)),
+        "feature": np.where(leaf, 0, feature).astype(np.int64),
+        "threshold": threshold.astype(np.float64),
+        "children": children,
+        "missing_left": missing_left.astype(bool),
+        "is_leaf": leaf,
+        "value": value.astype(np.float64),
+    }
+
+
+def compile_model(model):
+    # Returns the flat form of a supported model, or None
+    if hasattr(model, "estimators_"):
+        trees = []
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            if tree.n_outputs != 1:
+                return None
+            trees.append((
+                tree.feature, tree.threshold,
+                tree.children_left, tree.children_right,
+                getattr(tree, "missing_go_to_left", np.zeros(tree.node_count, dtype=np.uint8)),
+                tree.value[:, 0, 0], tree.max_depth,
+            ))
+        return _pack(trees, "mean", np.float32)
+
+    predictors = getattr(model, "_predictors", None)
+    if predictors is not None:
+        if any(len(it) != 1 for it in predictors):
+            return None
+        trees = []
+        for (predictor,) in predictors:
+            nodes = predictor.nodes
+            if nodes["is_categorical"].any():
+                return None
+            leaf = nodes["is_leaf"].astype(bool)
+            trees.append((
+                nodes["feature_idx"], nodes["num_threshold"],
+                np.where(leaf, -1, nodes["left"].astype(np.int64)),
+                np.where(leaf, -1, nodes["right"].astype(np.int64)),
+                nodes["missing_go_to_left"], nodes["value"], nodes["depth"].max(),
+            ))
+        return _pack(trees, "sum", np.float64, model._baseline_prediction.item())
+
+    return None
+
+
+# =====================================================
+# EVALUATION
+# =====================================================
+def _walk(flat, X, visit=None):
+    # Leaf index per (row, tree), row-major; visit(offsets, nodes, children)
+    # sees every step taken, with offsets = row * n_features
+    X = np.ascontiguousarray(X, dtype=flat["dtype"])
+    n_rows, n_features = X.shape
+    n_trees = len(flat["roots"])
+    flat_X = X.ravel()
+
+    feature, threshold, children = flat["feature"], flat["threshold"], flat["children"]
+    missing_left, is_leaf = flat["missing_left"], flat["is_leaf"]
+    has_nan = np.isnan(flat_X).any()
+
+    # Working set of unfinished (row, tree) pairs, as the pair's output slot,
+    # its row's offset into X and its current node
+    slot = np.arange(n_rows * n_trees, dtype=np.int64)
+    offset = np.repeat(np.arange(n_rows, dtype=np.int64) * n_features, n_trees)
+    node = np.tile(flat["roots"], n_rows)
+    leaves = np.empty(n_rows * n_trees, dtype=np.int64)
+
+    for _ in range(flat["depth"]):
+        done = is_leaf[node]
+        if done.any():
+            leaves[slot[done]] = node[done]
+            keep = ~done
+            slot, offset, node = slot[keep], offset[keep], node[keep]
+        if not len(node):
+            break
+
+        x = flat_X[offset + feature[node]]
+        go_right = ~(x <= threshold[node])
+        if has_nan:
+            go_right = np.where(np.isnan(x), ~missing_left[node], go_right)
+        child = children[2 * node + go_right]
+        if visit is not None:
+            visit(offset, node, child)
+        node = child
+
+    leaves[slot] = node
+    return leaves
+
+
+def tree_values(flat, X):
+    # (n_rows, n_trees) leaf value each tree gives each row
+    leaves = _walk(flat, X)
+    return flat["value"][leaves].reshape(len(X), len(flat["roots"]))
+
+
+def predict(flat, X):
+    values = tree_values(flat, X)
+    # Sequential (not pairwise) summation, as sklearn accumulates
+    if flat["kind"] == "mean":
+        return np.cumsum(values, axis=1)[:, -1] / values.shape[1]
+
+    start = np.full((len(values), 1), flat["baseline"])
+    return np.cumsum(np.hstack([start, values]), axis=1)[:, -1]
+
+
+# =====================================================
+# PATH CONTRIBUTIONS
+# =====================================================
+def contributions(flat, X):
+    # Saabas decomposition of a forest prediction: each split on the path
+    # credits its feature with the change in node mean it causes, so
+    # prediction = bias + contributions.sum(axis=1) (up to rounding).
+    # Boosted trees only carry shrunk values at leaves, so forests only.
+    if flat["kind"] != "mean":
+        raise ValueError("path contributions need a forest")
+
+    n_rows, n_features = np.shape(X)
+    value, feature = flat["value"], flat["feature"]
+    keys, deltas = [], []
+
+    def visit(offset, node, child):
+        keys.append(offset + feature[node])
+        deltas.append(value[child] - value[node])
+
+    _walk(flat, X, visit)
+    n_trees = len(flat["roots"])
+    totals = np.bincount(
+        np.concatenate(keys) if keys else np.zeros(0, dtype=np.int64),
+        weights=np.concatenate(deltas) if deltas else None,
+        minlength=n_rows * n_features,
+    )
+    bias = value[flat["roots"]].sum() / n_trees
+    return bias, totals.reshape(n_rows, n_features) / n_trees
+
+
+# =====================================================
+# BENCHMARK
+# =====================================================
+def _time(fn, repeats):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def benchmark(model, X, sizes, repeats):
+    import pandas as pd
+
+    flat = compile_model(model)
+    if flat is None:
+        raise ValueError(f"{type(model).__name__} can't be flattened")
+
+    if "n_jobs" in model.get_params():
+        model.set_params(n_jobs=1)
+    columns = getattr(model, "feature_names_in_", None)
+
+    rows = []
+    for size in sizes:
+        batch = X[np.arange(size) % len(X)]
+        frame = pd.DataFrame(batch, columns=columns) if columns is not None else batch
+        expected = model.predict(frame)
+        got = predict(flat, batch)
+        rows.append({
+            "rows": size,
+            "sklearn_ms": _time(lambda: model.predict(frame), repeats) * 1000,
+            "flat_ms": _time(lambda: predict(flat, batch), repeats) * 1000,
+            "identical": bool(np.array_equal(expected, got)),
+        })
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare flat-array inference with model.predict")
+    parser.add_argument("--model", help="model artifact (default: fit a forest on random data)")
+    parser.add_argument("--sizes", default="1,20,480,5000")
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    import model_backends
+
+    rng = np.random.default_rng(0)
+    if args.model:
+        artifact = model_backends.load_artifact(args.model)
+        model = artifact["model"]
+        medians = artifact["medians"]
+        center = np.array([medians.get(f, 0.0) for f in artifact["features"]])
+        X = center * (1 + 0.1 * rng.standard_normal((5000, len(center))))
+    else:
+        X = rng.standard_normal((5000, 18))
+        y = X[:, 0] * 3 + rng.standard_normal(5000)
+        model = model_backends.fit("rf", X, y, np.zeros(5000))
+
+    sizes = [int(s) for s in args.sizes.split(",")]
+    print(f"{type(model).__name__}, best of {args.repeats}")
+    print(f"{'rows':>6} {'sklearn ms':>11} {'flat ms':>9} {'speedup':>8}  identical")
+    for r in benchmark(model, X, sizes, args.repeats):
+        print(
+            f"{r['rows']:>6} {r['sklearn_ms']:>11.3f} {r['flat_ms']:>9.3f} "
+            f"{r['sklearn_ms'] / r['flat_ms']:>7.1f}x  {'✅' if r['identical'] else '❌'}"
+        )
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
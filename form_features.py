@@ -0,0 +1,454 @@
+import os
+import sys
+import argparse
+
+import telemetry
+
+# =====================================================
+# CONFIG
+# =====================================================
+# Recent-form features per driver and per team, as of the start of a round.
+# f1_form_state holds each entity's last HISTORY round values, so a new
+# round is folded in from its own rows only; f1_form_features records the
+# pre-race values of every completed round so predictions for it are stable.
+# f1_form_rounds records which rounds are folded in, and with how many
+# results; the windows depend on round order, so a round arriving late (or
+# growing after it was folded) triggers a rebuild.
+DATABASE_URL = os.getenv("DATABASE_URL")
+
+FORM_WINDOW = 5
+RELIABILITY_WINDOW = 10
+HISTORY = max(FORM_WINDOW, RELIABILITY_WINDOW)
+
+# Unclassified finishers count as a back-of-grid result
+DNF_FINISH = 20
+
+# Used when a results row has no points (backfilled seasons)
+RACE_POINTS = [25, 18, 15, 12, 10, 8, 6, 4, 2, 1]
+
+ENTITIES = {"driver": "driver_id", "team": "team_id"}
+VALUES = ["finish", "points", "dnf"]
+WINDOWS = {"finish": FORM_WINDOW, "points": FORM_WINDOW, "dnf": RELIABILITY_WINDOW}
+STAT_COLUMNS = {"finish": "form_finish", "points": "form_points", "dnf": "dnf_rate"}
+
+FORM_FEATURES = [
+    f"{entity}_{STAT_COLUMNS[value]}" for entity in ENTITIES for value in VALUES
+]
+
+SCHEMA_DDL = """
+CREATE TABLE IF NOT EXISTS f1_form_state (
+    entity_type TEXT NOT NULL,
+    entity_id   TEXT NOT NULL,
+    last_season INT NOT NULL,
+    last_round  INT NOT NULL,
+    races       INT NOT NULL,
+    finishes    DOUBLE PRECISION[] NOT NULL,
+    points      DOUBLE PRECISION[] NOT NULL,
+    dnfs        DOUBLE PRECISION[] NOT NULL,
+    updated_at  TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (entity_type, entity_id)
+);
+
+CREATE TABLE IF NOT EXISTS f1_form_features (
+    season      INT NOT NULL,
+    round       INT NOT NULL,
+    entity_type TEXT NOT NULL,
+    entity_id   TEXT NOT NULL,
+    races       INT NOT NULL,
+    form_finish DOUBLE PRECISION,
+    form_points DOUBLE PRECISION,
+    dnf_rate    DOUBLE PRECISION,
+    PRIMARY KEY (season, round, entity_type, entity_id)
+);
+
+CREATE TABLE IF NOT EXISTS f1_form_rounds (
+    season    INT NOT NULL,
+    round     INT NOT NULL,
+    results   INT NOT NULL,
+    folded_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (season, round)
+);
+"""
+
+# Rounds whose results aren't (all) folded in yet, oldest first
+PENDING_QUERY = """
+SELECT rr.season, rr.round, COUNT(*)
+FROM f1_race_results rr
+LEFT JOIN f1_form_rounds f
+  ON f.season = rr.season
+ AND f.round  = rr.round
+GROUP BY rr.season, rr.round, f.results
+HAVING f.results IS DISTINCT FROM COUNT(*)
+ORDER BY rr.season, rr.round
+"""
+
+FOLDED_SQL = """
+INSERT INTO f1_form_rounds (season, round, results)
+VALUES %s
+ON CONFLICT (season, round) DO UPDATE SET
+    results   = EXCLUDED.results,
+    folded_at = NOW()
+"""
+
+RESULTS_QUERY = """
+SELECT
+    rr.season,
+    rr.round,
+    rr.driver_id,
+    rr.team_id,
+    rr.position,
+    rr.points,
+    d.driver_id IS NOT NULL AS dnf
+FROM f1_race_results rr
+LEFT JOIN f1_dnf d
+  ON d.season = rr.season
+ AND d.round  = rr.round
+ AND d.driver_id = rr.driver_id
+"""
+
+
+def ensure_schema(cur):
+    cur.execute(SCHEMA_DDL)
+
+
+def result_values(position, points, dnf):
+    # One driver's (finish, points, dnf) for a round
+    finish = DNF_FINISH if position is None else position
+    if points is None:
+        points = RACE_POINTS[position - 1] if position and position <= len(RACE_POINTS) else 0
+    return float(finish), float(points), 1.0 if dnf else 0.0
+
+
+def window_stats(finishes, points, dnfs):
+    # Pre-race features from an entity's stored history (oldest first)
+    stats = {}
+    for value, series in zip(VALUES, (finishes, points, dnfs)):
+        recent = series[-WINDOWS[value]:]
+        stats[STAT_COLUMNS[value]] = sum(recent) / len(recent) if recent else None
+    return stats
+
+
+# =====================================================
+# FULL REBUILD (VECTORIZED)
+# =====================================================
+def load_results(conn, before_season=None):
+    import pandas as pd
+
+    query = RESULTS_QUERY
+    if before_season is not None:
+        query += "WHERE rr.season < %(before_season)s\n"
+    return pd.read_sql(query, conn, params={"before_season": before_season})
+
+
+def round_values(results):
+    # One row per (entity, round) with that round's finish/points/dnf;
+    # a team's round is its drivers' mean finish, total points, DNF share
+    import numpy as np
+    import pandas as pd
+
+    position = pd.to_numeric(results["position"], errors="coerce")
+    fallback = pd.Series(
+        np.r_[RACE_POINTS, 0][np.clip(position.fillna(99).astype(int), 1, len(RACE_POINTS) + 1) - 1],
+        index=results.index,
+    )
+    drivers = pd.DataFrame({
+        "season": results["season"].astype("int64"),
+        "round": results["round"].astype("int64"),
+        "driver_id": results["driver_id"],
+        "team_id": results["team_id"],
+        "finish": position.fillna(DNF_FINISH).astype("float64"),
+        "points": pd.to_numeric(results["points"], errors="coerce").fillna(fallback).astype("float64"),
+        "dnf": results["dnf"].astype("float64"),
+    })
+
+    frames = []
+    for entity, column in ENTITIES.items():
+        grouped = drivers.groupby([column, "season", "round"], sort=False)
+        values = grouped.agg(finish=("finish", "mean"), points=("points", "sum"), dnf=("dnf", "mean"))
+        values = values.reset_index().rename(columns={column: "entity_id"})
+        values.insert(0, "entity_type", entity)
+        frames.append(values)
+
+    return (
+        pd.concat(frames, ignore_index=True)
+        .sort_values(["entity_type", "entity_id", "season", "round"], kind="stable")
+        .reset_index(drop=True)
+    )
+
+
+def pre_race_stats(values):
+    # Windowed means over each entity's previous rounds in one grouped pass:
+    # the sum of the last w rounds is a difference of shifted cumsums
+    import numpy as np
+
+    keys = [values["entity_type"], values["entity_id"]]
+    prior = values.groupby(keys, sort=False).cumcount()
+
+    stats = values[["season", "round", "entity_type", "entity_id"]].copy()
+    stats["races"] = prior
+    for value in VALUES:
+        window = WINDOWS[value]
+        total = values[value].groupby(keys, sort=False).cumsum()
+        before = total - values[value]
+        dropped = total.groupby(keys, sort=False).shift(window + 1).fillna(0)
+        count = np.minimum(prior, window)
+        stats[STAT_COLUMNS[value]] = ((before - dropped) / count).where(count > 0)
+    return stats
+
+
+def history_features(results):
+    # Per result row: the driver's and team's form going into that round
+    stats = pre_race_stats(round_values(results))
+    out = results[["season", "round", "driver_id", "team_id"]].copy()
+
+    for entity, column in ENTITIES.items():
+        part = stats[stats["entity_type"] == entity].drop(columns=["entity_type", "races"])
+        part = part.rename(columns={
+            "entity_id": column,
+            **{stat: f"{entity}_{stat}" for stat in STAT_COLUMNS.values()},
+        })
+        out = out.merge(part, on=["season", "round", column], how="left")
+    return out
+
+
+def rebuild(conn):
+    # Recomputes both tables from all results; run after backfilling old rounds
+    from psycopg2.extras import execute_values
+    import pipeline_state
+
+    with telemetry.span("form_rebuild") as span:
+        values = round_values(load_results(conn))
+        stats = pre_race_stats(values)
+
+        tail = values.groupby(["entity_type", "entity_id"], sort=False).tail(HISTORY)
+        state = tail.groupby(["entity_type", "entity_id"], sort=False).agg(
+            last_season=("season", "last"),
+            last_round=("round", "last"),
+            finishes=("finish", list),
+            points=("points", list),
+            dnfs=("dnf", list),
+        ).reset_index()
+        state.insert(4, "races", values.groupby(["entity_type", "entity_id"], sort=False).size().to_numpy())
+
+        cur = conn.cursor()
+        ensure_schema(cur)
+        cur.execute("DELETE FROM f1_form_state")
+        cur.execute("DELETE FROM f1_form_features")
+        cur.execute("DELETE FROM f1_form_rounds")
+        execute_values(
+            cur,
+            """
+            INSERT INTO f1_form_state
+            (entity_type, entity_id, last_season, last_round, races, finishes, points, dnfs)
+            VALUES %s
+            """,
+            list(state.astype(object).itertuples(index=False, name=None)),
+            page_size=1000,
+        )
+        execute_values(
+            cur,
+            """
+            INSERT INTO f1_form_features
+            (season, round, entity_type, entity_id, races, form_finish, form_points, dnf_rate)
+            VALUES %s
+            """,
+            list(stats.astype(object).where(stats.notna(), None).itertuples(index=False, name=None)),
+            page_size=1000,
+        )
+        folded = values[values["entity_type"] == "driver"].groupby(["season", "round"]).size()
+        if len(folded):
+            execute_values(
+                cur, FOLDED_SQL,
+                [(int(season), int(rnd), int(n)) for (season, rnd), n in folded.items()],
+                page_size=1000,
+            )
+        pipeline_state.mark_updated(cur, "f1_form_state")
+        cur.close()
+
+        span["entities"] = len(state)
+        span["rows"] = len(stats)
+    return len(state)
+
+
+# =====================================================
+# INCREMENTAL UPDATE
+# =====================================================
+def update(cur):
+    # Folds pending rounds into the state. When they all come after it,
+    # reads and writes only their rows and the entities racing in them;
+    # a round at or before the state (late, retried, or grown since it was
+    # folded) falls back to rebuild(). Returns the result rows folded.
+    from psycopg2.extras import execute_values
+    import pipeline_state
+
+    ensure_schema(cur)
+    cur.execute(PENDING_QUERY)
+    pending = cur.fetchall()
+    if not pending:
+        return 0
+
+    cur.execute("SELECT MAX(ARRAY[last_season, last_round]) FROM f1_form_state")
+    watermark = cur.fetchone()[0] or [0, 0]
+    if [pending[0][0], pending[0][1]] <= watermark:
+        telemetry.log(f"♻️ Form: {pending[0][0]} R{pending[0][1]} arrived out of order, rebuilding")
+        rebuild(cur.connection)
+        return sum(n for _, _, n in pending)
+
+    cur.execute(
+        RESULTS_QUERY + "WHERE (rr.season, rr.round) > (%s, %s)\nORDER BY rr.season, rr.round",
+        watermark,
+    )
+    rows = cur.fetchall()
+
+    types = [e for _, _, d, t, *_ in rows for e in ("driver", "team")]
+    ids = [e for _, _, d, t, *_ in rows for e in (d, t)]
+    cur.execute(
+        """
+        SELECT entity_type, entity_id, races, finishes, points, dnfs
+        FROM f1_form_state
+        WHERE (entity_type, entity_id) IN (SELECT * FROM unnest(%s::text[], %s::text[]))
+        """,
+        (types, ids),
+    )
+    state = {(t, i): (races, f, p, d) for t, i, races, f, p, d in cur.fetchall()}
+
+    # Group the new rows into rounds, oldest first
+    rounds = {}
+    for season, rnd, driver_id, team_id, position, points, dnf in rows:
+        values = result_values(position, points, dnf)
+        entry = rounds.setdefault((season, rnd), {"driver": {}, "team": {}})
+        entry["driver"][driver_id] = values
+        entry["team"].setdefault(team_id, []).append(values)
+
+    snapshots = []
+    last_round = {}
+    for (season, rnd), entry in rounds.items():
+        teams = {
+            team_id: (
+                sum(v[0] for v in drivers) / len(drivers),
+                sum(v[1] for v in drivers),
+                sum(v[2] for v in drivers) / len(drivers),
+            )
+            for team_id, drivers in entry["team"].items()
+        }
+        for entity_type, current in (("driver", entry["driver"]), ("team", teams)):
+            for entity_id, values in current.items():
+                key = (entity_type, entity_id)
+                races, *series = state.get(key, (0, [], [], []))
+                stats = window_stats(*series)
+                snapshots.append((
+                    season, rnd, entity_type, entity_id, races,
+                    stats["form_finish"], stats["form_points"], stats["dnf_rate"],
+                ))
+                state[key] = (races + 1, *[(s + [v])[-HISTORY:] for s, v in zip(series, values)])
+                last_round[key] = (season, rnd)
+
+    touched = [(*key, *last_round[key], *state[key]) for key in last_round]
+    execute_values(
+        cur,
+        """
+        INSERT INTO f1_form_state
+        (entity_type, entity_id, last_season, last_round, races, finishes, points, dnfs)
+        VALUES %s
+        ON CONFLICT (entity_type, entity_id) DO UPDATE SET
+            last_season = EXCLUDED.last_season,
+            last_round  = EXCLUDED.last_round,
+            races       = EXCLUDED.races,
+            finishes    = EXCLUDED.finishes,
+            points      = EXCLUDED.points,
+            dnfs        = EXCLUDED.dnfs,
+            updated_at  = NOW()
+        """,
+        touched,
+        template="(%s, %s, %s, %s, %s, %s::float8[], %s::float8[], %s::float8[])",
+    )
+    execute_values(
+        cur,
+        """
+        INSERT INTO f1_form_features
+        (season, round, entity_type, entity_id, races, form_finish, form_points, dnf_rate)
+        VALUES %s
+        ON CONFLICT (season, round, entity_type, entity_id) DO UPDATE SET
+            races       = EXCLUDED.races,
+            form_finish = EXCLUDED.form_finish,
+            form_points = EXCLUDED.form_points,
+            dnf_rate    = EXCLUDED.dnf_rate
+        """,
+        snapshots,
+    )
+    execute_values(cur, FOLDED_SQL, pending)
+    pipeline_state.mark_updated(cur, "f1_form_state")
+    telemetry.count("rows_written", len(touched), table="f1_form_state")
+    telemetry.count("rows_written", len(snapshots), table="f1_form_features")
+    return len(rows)
+
+
+# =====================================================
+# PREDICTION INPUTS
+# =====================================================
+def attach_form(conn, df):
+    # Completed rounds get their recorded pre-race form; upcoming rounds get
+    # each entity's current state
+    import pandas as pd
+
+    cur = conn.cursor()
+    ensure_schema(cur)
+    cur.close()
+    seasons = sorted(int(s) for s in df["season"].unique())
+
+    recorded = pd.read_sql("""
+    SELECT season, round, entity_type, entity_id, form_finish, form_points, dnf_rate
+    FROM f1_form_features
+    WHERE season = ANY(%(seasons)s)
+    """, conn, params={"seasons": seasons})
+
+    current = pd.read_sql("""
+    SELECT entity_type, entity_id, finishes, points, dnfs
+    FROM f1_form_state
+    """, conn)
+    current = pd.concat([
+        current[["entity_type", "entity_id"]],
+        pd.DataFrame(
+            [window_stats(f, p, d) for f, p, d in zip(current["finishes"], current["points"], current["dnfs"])],
+            columns=list(STAT_COLUMNS.values()),
+        ),
+    ], axis=1)
+
+    out = df
+    for entity, column in ENTITIES.items():
+        names = {stat: f"{entity}_{stat}" for stat in STAT_COLUMNS.values()}
+        past = recorded[recorded["entity_type"] == entity].drop(columns="entity_type")
+        past = past.rename(columns={"entity_id": column, **names})
+        now = current[current["entity_type"] == entity].drop(columns="entity_type")
+        now = now.rename(columns={"entity_id": column, **names})
+
+        out = out.merge(past, on=["season", "round", column], how="left", indicator=True)
+        upcoming = (out.pop("_merge") == "left_only").to_numpy()
+        filled = out.loc[upcoming, [column]].merge(now, on=column, how="left")
+        out.loc[upcoming, list(names.values())] = filled[list(names.values())].to_numpy()
+    return out
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain the driver/team form feature store")
+    parser.add_argument("--rebuild", action="store_true", help="recompute from all results")
+    args = parser.parse_args(argv)
+
+    if not DATABASE_URL:
+        raise RuntimeError("DATABASE_URL not set")
+
+    import psycopg2
+
+    conn = psycopg2.connect(DATABASE_URL)
+    if args.rebuild:
+        entities = rebuild(conn)
+        telemetry.log(f"✅ f1_form_state rebuilt: {entities} entities")
+    else:
+        rows = update(conn.cursor())
+        telemetry.log(f"✅ f1_form_state: {rows} new result rows folded in")
+    conn.commit()
+    conn.close()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,168 @@
+import io
+import importlib
+import numpy as np
+
+# =====================================================
+# ESTIMATOR BACKENDS
+# =====================================================
+# "target" selects what the estimator regresses on:
+#   position        – raw finishing position (1 = winner)
+#   race_percentile – position rescaled to [0, 1] within each race, so the
+#                     model only learns the ordering inside a grid
+# Estimators are named, not imported: scikit-learn takes over a second to
+# import, and only fitting needs it.
+DEFAULT_BACKEND = "rf"
+
+# Up to this many rows, predictions go through the flat-array copy of the
+# model (flat_ensemble.py): identical output without sklearn's per-call
+# overhead. Larger batches are faster in sklearn's compiled loop.
+FLAT_MAX_ROWS = 256
+
+BACKENDS = {
+    "rf": {
+        "estimator": "sklearn.ensemble.RandomForestRegressor",
+        "defaults": {"n_estimators": 250, "random_state": 42, "n_jobs": -1},
+        "target": "position",
+    },
+    "hgb": {
+        "estimator": "sklearn.ensemble.HistGradientBoostingRegressor",
+        "defaults": {"max_iter": 200, "learning_rate": 0.05, "random_state": 42},
+        "target": "position",
+    },
+    "hgb_rank": {
+        "estimator": "sklearn.ensemble.HistGradientBoostingRegressor",
+        "defaults": {
+            "max_iter": 200,
+            "learning_rate": 0.05,
+            "loss": "absolute_error",
+            "random_state": 42,
+        },
+        "target": "race_percentile",
+    },
+}
+
+SEARCH_SPACES = {
+    "rf": {
+        "n_estimators": [50, 100, 250],
+        "max_depth": [None, 8, 16],
+        "min_samples_leaf": [1, 5],
+    },
+    "hgb": {
+        "max_iter": [100, 200, 400],
+        "learning_rate": [0.05, 0.1],
+        "max_leaf_nodes": [15, 31],
+    },
+    "hgb_rank": {
+        "max_iter": [100, 200, 400],
+        "learning_rate": [0.05, 0.1],
+        "max_leaf_nodes": [15, 31],
+    },
+}
+
+
+def get_backend(name):
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown model backend '{name}' (choose from {sorted(BACKENDS)})")
+    return BACKENDS[name]
+
+
+def estimator_class(name):
+    module, _, cls = get_backend(name)["estimator"].rpartition(".")
+    return getattr(importlib.import_module(module), cls)
+
+
+def make_estimator(name=DEFAULT_BACKEND, **params):
+    spec = get_backend(name)
+    kwargs = dict(spec["defaults"])
+    kwargs.update(params)
+
+    # n_jobs is a forest setting; boosting parallelises through OpenMP
+    if not spec["estimator"].endswith("RandomForestRegressor"):
+        kwargs.pop("n_jobs", None)
+
+    return estimator_class(name)(**kwargs)
+
+
+# =====================================================
+# TARGET TRANSFORMS
+# =====================================================
+def _race_sizes(races):
+    _, inverse, counts = np.unique(races, return_inverse=True, return_counts=True)
+    return counts[inverse].astype(np.float64)
+
+
+def to_target(name, y, races):
+    y = np.asarray(y, dtype=np.float64)
+    if get_backend(name)["target"] == "race_percentile":
+        return (y - 1) / np.maximum(_race_sizes(races) - 1, 1)
+    return y
+
+
+def from_target(name, pred, races):
+    pred = np.asarray(pred, dtype=np.float64)
+    if get_backend(name)["target"] == "race_percentile":
+        return 1 + pred * np.maximum(_race_sizes(races) - 1, 1)
+    return pred
+
+
+def fit(name, X, y, races, **params):
+    model = make_estimator(name, **params)
+    model.fit(X, to_target(name, y, races))
+    return model
+
+
+def predict_positions(name, model, X, races, flat=None):
+    if flat is not None and len(X) <= FLAT_MAX_ROWS:
+        import flat_ensemble
+
+        return from_target(name, flat_ensemble.predict(flat, X), races)
+    return from_target(name, model.predict(X), races)
+
+
+# =====================================================
+# ARTIFACT
+# =====================================================
+def make_artifact(name, model, features, medians, residual_std=None):
+    return {
+        "backend": name,
+        "model": model,
+        "features": list(features),
+        "medians": {k: float(v) for k, v in medians.items()},
+        # Spread of training errors in position units, used by the simulator
+        "residual_std": residual_std,
+    }
+
+
+def save_artifact(artifact, path):
+    import joblib
+
+    # The flat copy is rebuilt on load
+    joblib.dump({k: v for k, v in artifact.items() if k != "flat"}, path)
+
+
+def load_artifact(path):
+    import joblib
+
+    artifact = joblib.load(path)
+
+    # model.pkl files from before backends existed hold a bare forest
+    if not isinstance(artifact, dict):
+        artifact = {
+            "backend": DEFAULT_BACKEND,
+            "model": artifact,
+            "features": list(getattr(artifact, "feature_names_in_", [])),
+            "medians": {},
+        }
+
+    import flat_ensemble
+
+    artifact["flat"] = flat_ensemble.compile_model(artifact["model"])
+    return artifact
+
+
+def artifact_size(artifact):
+    import joblib
+
+    buf = io.BytesIO()
+    joblib.dump(artifact, buf)
+    return buf.tell()
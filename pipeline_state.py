@@ -0,0 +1,172 @@
+import time
+import select
+from contextlib import contextmanager
+
+import telemetry
+
+# =====================================================
+# PIPELINE STATE
+# =====================================================
+# One row per stage (usually the table it writes), bumped in the same
+# transaction as the data. Readers key their caches on updated_at,
+# and the stage name is NOTIFYed on CHANNEL when that transaction commits.
+CHANNEL = "f1_pipeline"
+
+SCHEMA_DDL = """
+CREATE TABLE IF NOT EXISTS f1_pipeline_state (
+    stage      TEXT PRIMARY KEY,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+)
+"""
+
+STAGE_VERSIONS_QUERY = "SELECT stage, updated_at::text FROM f1_pipeline_state"
+
+
+def ensure_schema(cur):
+    cur.execute(SCHEMA_DDL)
+    cur.execute(COVERAGE_DDL)
+
+
+def mark_updated(cur, stage):
+    # NOTIFY is transactional: listeners hear it only once the data commits
+    cur.execute(
+        """
+        WITH bumped AS (
+            INSERT INTO f1_pipeline_state (stage, updated_at)
+            VALUES (%s, NOW())
+            ON CONFLICT (stage) DO UPDATE SET updated_at = EXCLUDED.updated_at
+            RETURNING stage
+        )
+        SELECT pg_notify(%s, stage) FROM bumped
+        """,
+        (stage, CHANNEL),
+    )
+
+
+# =====================================================
+# ROUND TRANSACTIONS
+# =====================================================
+# Writers fetch a round into memory first and only then open a transaction
+# for it, so no API call or sleep runs while locks are held. The round's
+# statements sit behind a savepoint: if one fails, that round is rolled
+# back and logged, and the caller carries on with the next.
+@contextmanager
+def round_transaction(conn, stage, season, rnd):
+    cur = conn.cursor()
+    status = "ok"
+    start = time.perf_counter()
+    cur.execute("SAVEPOINT round_write")
+    try:
+        yield cur
+        cur.execute("RELEASE SAVEPOINT round_write")
+    except Exception as e:
+        status = "error"
+        cur.execute("ROLLBACK TO SAVEPOINT round_write")
+        telemetry.count("round_write_errors", stage=stage)
+        telemetry.log(f"❌ {stage} {season} R{rnd} rolled back: {str(e).strip()}", stage=stage)
+    conn.commit()
+    cur.close()
+
+    held = time.perf_counter() - start
+    telemetry.observe("lock_hold_seconds", held, stage=stage)
+    telemetry.log(
+        f"🔒 {stage} {season} R{rnd}: {held * 1000:.1f} ms in transaction",
+        event="round_write", stage=stage, season=season, round=rnd,
+        status=status, lock_hold_ms=round(held * 1000, 3),
+    )
+
+
+# =====================================================
+# LISTEN
+# =====================================================
+def listen(conn):
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute(f"LISTEN {CHANNEL}")
+
+
+def wait_for_stages(conn, timeout):
+    # Blocks up to `timeout` seconds; returns the set of stages notified
+    if select.select([conn], [], [], timeout) == ([], [], []):
+        return set()
+
+    conn.poll()
+    stages = {n.payload for n in conn.notifies}
+    conn.notifies.clear()
+    return stages
+
+
+# =====================================================
+# ROUND COVERAGE SUMMARY
+# =====================================================
+# Row counts per (season, round, source), maintained by the writers so the
+# dashboard reads one small table instead of scanning every f1_* table.
+# updated_at only moves when a count actually changes.
+COVERAGE_SOURCES = {
+    "calendar": "f1_races",
+    "fp1": "f1_fp1_results",
+    "fp2": "f1_fp2_results",
+    "fp3": "f1_fp3_results",
+    "qualy": "f1_qualifying_results",
+    "sprint_qualy": "f1_sprint_qualy_results",
+    "sprint": "f1_sprint_race_results",
+    "results": "f1_race_results",
+    "weather": "f1_weather",
+    "predictions": "f1_predictions",
+}
+
+COVERAGE_DDL = """
+CREATE TABLE IF NOT EXISTS f1_round_coverage (
+    season     INT NOT NULL,
+    round      INT NOT NULL,
+    source     TEXT NOT NULL,
+    row_count  INT NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (season, round, source)
+)
+"""
+
+
+def refresh_coverage(cur, season=None):
+    counts = "\n        UNION ALL\n".join(
+        f"""        SELECT season, round, '{source}' AS source, COUNT(*) AS row_count
+        FROM {table}
+        WHERE %(season)s::int IS NULL OR season = %(season)s::int
+        GROUP BY season, round"""
+        for source, table in COVERAGE_SOURCES.items()
+    )
+
+    cur.execute(
+        f"""
+        WITH counts AS (
+{counts}
+        ),
+        emptied AS (
+            UPDATE f1_round_coverage c
+            SET row_count = 0, updated_at = NOW()
+            WHERE (%(season)s::int IS NULL OR c.season = %(season)s::int)
+              AND c.row_count > 0
+              AND NOT EXISTS (
+                  SELECT 1 FROM counts n
+                  WHERE n.season = c.season AND n.round = c.round
+                    AND n.source = c.source
+              )
+            RETURNING 1
+        ),
+        upserted AS (
+            INSERT INTO f1_round_coverage (season, round, source, row_count)
+            SELECT season, round, source, row_count FROM counts
+            ON CONFLICT (season, round, source) DO UPDATE
+            SET row_count = EXCLUDED.row_count, updated_at = NOW()
+            WHERE f1_round_coverage.row_count IS DISTINCT FROM EXCLUDED.row_count
+            RETURNING 1
+        )
+        SELECT (SELECT COUNT(*) FROM emptied) + (SELECT COUNT(*) FROM upserted)
+        """,
+        {"season": season},
+    )
+    changed = cur.fetchone()[0]
+
+    if changed:
+        mark_updated(cur, "f1_round_coverage")
+    return changed
@@ -1,35 +1,24 @@
 import os
-import pickle
-import psycopg2
-import pandas as pd
-from sklearn.preprocessing import StandardScaler
-
-print("🔮 PREDICTION PIPELINE STARTED (2026)")
+import sys
+import json
+import argparse
+
+import circuit_affinity
+import form_features
+import model_backends
+import pipeline_state
+import prediction_store
+import telemetry
+from train_model import prepare_features, race_keys
 
 DB_URL = os.getenv("DATABASE_URL")
 MODEL_PATH = "model.pkl"
 SEASON = 2026
 
-# ------------------------
-# Load model
-# ------------------------
-if not os.path.exists(MODEL_PATH):
-    raise FileNotFoundError("❌ model.pkl not found")
-
-with open(MODEL_PATH, "rb") as f:
-    model = pickle.load(f)
-
-print("✅ Model loaded")
-
-# ------------------------
-# DB connect
-# ------------------------
-conn = psycopg2.connect(DB_URL)
-
 # ------------------------
 # Load feature data (NO race result)
 # ------------------------
-query = """
+PREDICTION_QUERY = """
 SELECT
     r.season,
     r.round,
@@ -69,73 +58,159 @@ LEFT JOIN f1_sprint_qualy_results sq
 LEFT JOIN f1_sprint_race_results sr
   ON sr.season = q.season AND sr.round = q.round AND sr.driver_id = q.driver_id
 
-WHERE r.season = 2026;
+WHERE r.season = %(season)s;
 """
 
-df = pd.read_sql(query, conn)
-print(f"📊 Rows loaded for prediction: {len(df)}")
 
-if df.empty:
-    print("⚠️ No data available yet for predictions")
-    exit()
+def load_prediction_frame(conn, season=SEASON):
+    import pandas as pd
+
+    with telemetry.span("load_features") as span:
+        df = pd.read_sql(PREDICTION_QUERY, conn, params={"season": season})
+        span["rows"] = len(df)
+
+    # Rounds without qualifying come back as a single driver-less row
+    df = df[df["driver_id"].notna()].reset_index(drop=True)
+    df = form_features.attach_form(conn, df)
+    return circuit_affinity.attach_affinity(conn, df)
+
 
 # ------------------------
-# Prepare features
+# Predict
 # ------------------------
-meta_cols = ["season", "round", "race_id", "driver_id", "team_id"]
-X = df.drop(columns=meta_cols)
+def score(df, artifact):
+    from race_ranking import rank_within_races
+
+    # Same columns and fill values as training
+    X, _ = prepare_features(
+        df, medians=artifact["medians"] or None, features=artifact["features"]
+    )
+
+    with telemetry.span("predict", backend=artifact["backend"]) as span:
+        pred_positions = model_backends.predict_positions(
+            artifact["backend"], artifact["model"], X, race_keys(df), artifact["flat"]
+        )
+
+        df["predicted_score"] = pred_positions
+
+        # Unique finishing order per round (ties → better grid slot)
+        df["predicted_position"] = rank_within_races(df)
+        df["predicted_points"] = (21 - df["predicted_position"]).clip(lower=0)
+        span["rows"] = len(df)
+
+    with telemetry.span("explain"):
+        df["base_score"], df["contributions"] = explain(artifact, X)
+
+    return df, X
+
+
+def explain(artifact, X):
+    # Why each driver scored what they did: one extra pass over the forest,
+    # stored with the prediction so the dashboard never recomputes it
+    import flat_ensemble
 
-# Convert times to numeric safely
-for col in X.columns:
-    X[col] = pd.to_numeric(X[col], errors="coerce")
+    flat = artifact["flat"]
+    target = model_backends.get_backend(artifact["backend"])["target"]
+    if flat is None or flat["kind"] != "mean" or target != "position":
+        return None, None
 
-X = X.fillna(X.median(numeric_only=True))
+    bias, contrib = flat_ensemble.contributions(flat, X)
+    features = artifact["features"]
+    # Rounded so an unchanged prediction serialises identically
+    rows = [
+        json.dumps({f: round(float(v), 4) for f, v in zip(features, row)})
+        for row in contrib
+    ]
+    return round(float(bias), 4), rows
 
-scaler = StandardScaler()
-X_scaled = scaler.fit_transform(X)
 
 # ------------------------
-# Predict
+# Simulate races → win / podium probabilities
 # ------------------------
-pred_positions = model.predict(X_scaled)
+def simulate(conn, df, artifact, X):
+    import race_simulator
+
+    with telemetry.span("simulate") as span:
+        dnf_rates, field_rate = race_simulator.load_dnf_rates(conn)
+
+        probs = race_simulator.simulate_season(df, artifact, X, dnf_rates, field_rate)
+        probs["n_sims"] = race_simulator.N_SIMS
+        span["n_sims"] = race_simulator.N_SIMS
+    return probs
 
-df["predicted_position"] = pred_positions
-df["predicted_points"] = (21 - df["predicted_position"]).clip(lower=0)
 
 # ------------------------
-# Save to DB
+# Save to DB (only rounds whose output changed)
 # ------------------------
-cur = conn.cursor()
-
-rows = [
-    (
-        row.season,
-        row.round,
-        row.race_id,
-        row.driver_id,
-        row.team_id,
-        int(row.predicted_position),
-        float(row.predicted_points),
-    )
-    for row in df.itertuples()
-]
-
-cur.executemany(
-    """
-    INSERT INTO f1_predictions
-    (season, round, race_id, driver_id, team_id, predicted_position, predicted_points)
-    VALUES (%s,%s,%s,%s,%s,%s,%s)
-    ON CONFLICT (season, round, driver_id)
-    DO UPDATE SET
-        predicted_position = EXCLUDED.predicted_position,
-        predicted_points   = EXCLUDED.predicted_points,
-        created_at = NOW()
-    """,
-    rows,
-)
-
-conn.commit()
-cur.close()
-conn.close()
-
-print("🎉 PREDICTIONS SAVED FOR 2026")
\ No newline at end of file
+def save(conn, df, probs, backend, season=SEASON):
+    with telemetry.span("save_predictions"):
+        cur = conn.cursor()
+        prediction_store.ensure_schema(cur)
+        run_id = prediction_store.start_run(cur, season, backend)
+
+        rounds, written, removed = prediction_store.upsert_rounds(
+            cur, "f1_predictions", df, run_id
+        )
+        telemetry.log(f"✅ f1_predictions: {len(rounds)} rounds changed, {written} rows written, {removed} removed")
+
+        prob_rounds, prob_written, _ = prediction_store.upsert_rounds(
+            cur, "f1_race_probabilities", probs, run_id
+        )
+        telemetry.log(f"✅ f1_race_probabilities: {len(prob_rounds)} rounds changed, {prob_written} rows written")
+
+        prediction_store.finish_run(
+            cur, run_id, len(set(rounds) | set(prob_rounds)), written + prob_written
+        )
+
+        pipeline_state.ensure_schema(cur)
+        if rounds:
+            pipeline_state.mark_updated(cur, "f1_predictions")
+        if prob_rounds:
+            pipeline_state.mark_updated(cur, "f1_race_probabilities")
+        pipeline_state.refresh_coverage(cur, season)
+
+        conn.commit()
+        cur.close()
+        telemetry.count("rows_written", written, table="f1_predictions")
+        telemetry.count("rows_written", prob_written, table="f1_race_probabilities")
+    return run_id
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Predict and simulate the season's races")
+    parser.add_argument("--season", type=int, default=SEASON)
+    parser.add_argument("--model", default=MODEL_PATH)
+    args = parser.parse_args(argv)
+
+    telemetry.log(f"🔮 PREDICTION PIPELINE STARTED ({args.season})")
+
+    if not os.path.exists(args.model):
+        raise FileNotFoundError(f"❌ {args.model} not found")
+
+    with telemetry.span("load_model"):
+        artifact = model_backends.load_artifact(args.model)
+
+    telemetry.log(f"✅ Model loaded ({artifact['backend']})")
+
+    import psycopg2
+
+    conn = psycopg2.connect(DB_URL)
+    try:
+        df = load_prediction_frame(conn, args.season)
+        telemetry.log(f"📊 Rows loaded for prediction: {len(df)}")
+
+        if df.empty:
+            telemetry.log("⚠️ No data available yet for predictions")
+            return
+
+        df, X = score(df, artifact)
+        probs = simulate(conn, df, artifact, X)
+        run_id = save(conn, df, probs, artifact["backend"], args.season)
+    finally:
+        conn.close()
+
+    telemetry.log(f"🎉 PREDICTIONS SAVED FOR {args.season} (run {run_id})")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
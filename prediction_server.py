@@ -0,0 +1,272 @@
+import os
+import sys
+import json
+import time
+import queue
+import argparse
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+import model_backends
+import telemetry
+
+# =====================================================
+# CONFIG
+# =====================================================
+MODEL_PATH = "model.pkl"
+HOST = os.getenv("PREDICTION_HOST", "127.0.0.1")
+PORT = int(os.getenv("PREDICTION_PORT", "8502"))
+
+# A batch closes when it holds MAX_BATCH_ROWS or its first request has
+# waited MAX_WAIT_MS, whichever comes first
+MAX_BATCH_ROWS = 512
+MAX_WAIT_MS = 2.0
+LATENCY_WINDOW = 10000
+
+# Pending connections the listening socket holds. The stdlib default of 5
+# resets bursts of concurrent clients before the batcher ever sees them.
+BACKLOG = int(os.getenv("PREDICTION_BACKLOG", "256"))
+
+
+# =====================================================
+# MODEL (LOADED ONCE)
+# =====================================================
+class LoadedModel:
+    def __init__(self, path):
+        artifact = model_backends.load_artifact(path)
+        self.backend = artifact["backend"]
+        self.model = artifact["model"]
+        self.flat = artifact["flat"]
+        self.features = artifact["features"]
+        medians = artifact["medians"]
+        self.fill = np.array([medians.get(f, 0.0) for f in self.features], dtype=np.float64)
+
+        # Batches here are small; thread fan-out would cost more than it saves
+        if "n_jobs" in self.model.get_params():
+            self.model.set_params(n_jobs=1)
+
+    def to_matrix(self, drivers):
+        X = np.array(
+            [[d.get(f) for f in self.features] for d in drivers], dtype=np.float64
+        )
+        missing = np.isnan(X)
+        X[missing] = np.broadcast_to(self.fill, X.shape)[missing]
+        return X
+
+    def predict(self, X, races):
+        if self.flat is None or len(X) > model_backends.FLAT_MAX_ROWS:
+            X = pd.DataFrame(X, columns=self.features)
+        return model_backends.predict_positions(self.backend, self.model, X, races, self.flat)
+
+
+# =====================================================
+# MICRO-BATCHER
+# =====================================================
+class MicroBatcher:
+    def __init__(self, model):
+        self.model = model
+        self.requests = queue.Queue()
+        self.batches = 0
+        self.batched_rows = 0
+        threading.Thread(target=self._run, name="batcher", daemon=True).start()
+
+    def submit(self, X):
+        slot = {"X": X, "done": threading.Event()}
+        self.requests.put(slot)
+        slot["done"].wait()
+        if "error" in slot:
+            raise slot["error"]
+        return slot["pred"]
+
+    def _collect(self):
+        batch = [self.requests.get()]
+        rows = len(batch[0]["X"])
+        deadline = time.perf_counter() + MAX_WAIT_MS / 1000
+
+        while rows < MAX_BATCH_ROWS:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                slot = self.requests.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(slot)
+            rows += len(slot["X"])
+
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            sizes = [len(slot["X"]) for slot in batch]
+            try:
+                # Each request is its own race group for per-race targets
+                X = np.vstack([slot["X"] for slot in batch])
+                races = np.repeat(np.arange(len(batch)), sizes)
+                pred = self.model.predict(X, races)
+
+                offset = 0
+                for slot, n in zip(batch, sizes):
+                    slot["pred"] = pred[offset:offset + n]
+                    offset += n
+            except Exception as e:
+                for slot in batch:
+                    slot["error"] = e
+
+            self.batches += 1
+            self.batched_rows += sum(sizes)
+            for slot in batch:
+                slot["done"].set()
+
+
+# =====================================================
+# METRICS
+# =====================================================
+class LatencyStats:
+    def __init__(self):
+        self.samples = deque(maxlen=LATENCY_WINDOW)
+        self.requests = 0
+        self.errors = 0
+        self.lock = threading.Lock()
+
+    def observe(self, seconds, ok=True):
+        with self.lock:
+            self.samples.append(seconds)
+            self.requests += 1
+            self.errors += 0 if ok else 1
+
+    def snapshot(self):
+        with self.lock:
+            samples = np.array(self.samples)
+            requests, errors = self.requests, self.errors
+
+        out = {"requests": requests, "errors": errors}
+        if len(samples):
+            p50, p99 = np.percentile(samples, [50, 99]) * 1000
+            out.update({"p50_ms": round(p50, 3), "p99_ms": round(p99, 3)})
+        return out
+
+
+# =====================================================
+# HTTP
+# =====================================================
+def make_handler(model, batcher, stats):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, code, payload):
+            body = json.dumps(payload).encode()
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/health":
+                self._send(200, {"status": "ok", "backend": model.backend})
+            elif self.path == "/metrics":
+                self._send(200, {
+                    **stats.snapshot(),
+                    "batches": batcher.batches,
+                    "avg_batch_rows": round(batcher.batched_rows / max(batcher.batches, 1), 2),
+                })
+            else:
+                self._send(404, {"error": "not found"})
+
+        def do_POST(self):
+            if self.path != "/predict":
+                self._send(404, {"error": "not found"})
+                return
+
+            start = time.perf_counter()
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(length) or b"{}")
+
+                # One driver object, a list of drivers, or {"drivers": [...]}
+                if isinstance(payload, dict):
+                    drivers = payload.get("drivers", [payload])
+                else:
+                    drivers = payload
+                if not drivers:
+                    raise ValueError("no drivers in payload")
+                if not isinstance(drivers, list) or not all(isinstance(d, dict) for d in drivers):
+                    raise ValueError("drivers must be a list of objects")
+
+                pred = batcher.submit(model.to_matrix(drivers))
+            except (ValueError, TypeError, json.JSONDecodeError) as e:
+                stats.observe(time.perf_counter() - start, ok=False)
+                self._send(400, {"error": str(e)})
+                return
+
+            # Unique order within the request; ties go to the better grid slot
+            grid = np.array(
+                [d.get("grid_position") if d.get("grid_position") is not None else np.inf for d in drivers],
+                dtype=np.float64,
+            )
+            order = np.lexsort((grid, pred))
+            rank = np.empty(len(pred), dtype=np.int64)
+            rank[order] = np.arange(1, len(pred) + 1)
+
+            result = [
+                {
+                    "driver_id": d.get("driver_id"),
+                    "predicted_score": float(p),
+                    "predicted_position": int(r),
+                }
+                for d, p, r in zip(drivers, pred, rank)
+            ]
+
+            elapsed = time.perf_counter() - start
+            stats.observe(elapsed)
+            self._send(200, {"predictions": result, "latency_ms": round(elapsed * 1000, 3)})
+
+        def log_message(self, fmt, *args):
+            # Per-request access logs would dominate latency at this scale
+            pass
+
+    return Handler
+
+
+class PredictionServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, handler, backlog=BACKLOG):
+        # Read by server_activate(), inside the base __init__
+        self.request_queue_size = backlog
+        super().__init__(address, handler)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve race position predictions over HTTP")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--backlog", type=int, default=BACKLOG,
+                        help="pending connections queued by the listening socket")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.model):
+        raise FileNotFoundError(f"❌ {args.model} not found")
+
+    model = LoadedModel(args.model)
+    batcher = MicroBatcher(model)
+    stats = LatencyStats()
+
+    server = PredictionServer((args.host, args.port), make_handler(model, batcher, stats), args.backlog)
+    telemetry.log(f"🛰️ Serving {model.backend} model on http://{args.host}:{args.port}")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,170 @@
+from psycopg2.extras import execute_values
+
+# =====================================================
+# SCHEMA
+# =====================================================
+SCHEMA_DDL = """
+CREATE TABLE IF NOT EXISTS f1_prediction_runs (
+    prediction_run_id BIGSERIAL PRIMARY KEY,
+    season            INT NOT NULL,
+    backend           TEXT,
+    started_at        TIMESTAMPTZ DEFAULT NOW(),
+    finished_at       TIMESTAMPTZ,
+    rounds_changed    INT,
+    rows_written      INT
+);
+
+ALTER TABLE f1_predictions
+    ADD COLUMN IF NOT EXISTS prediction_run_id BIGINT,
+    ADD COLUMN IF NOT EXISTS base_score DOUBLE PRECISION,
+    ADD COLUMN IF NOT EXISTS contributions JSONB;
+
+CREATE TABLE IF NOT EXISTS f1_race_probabilities (
+    season            INT NOT NULL,
+    round             INT NOT NULL,
+    race_id           TEXT,
+    driver_id         TEXT NOT NULL,
+    team_id           TEXT,
+    p_win             DOUBLE PRECISION,
+    p_podium          DOUBLE PRECISION,
+    expected_points   DOUBLE PRECISION,
+    n_sims            INT,
+    prediction_run_id BIGINT,
+    created_at        TIMESTAMPTZ DEFAULT NOW(),
+    PRIMARY KEY (season, round, driver_id)
+);
+"""
+
+KEY_COLS = [("season", "int"), ("round", "int"), ("driver_id", "text")]
+META_COLS = [("race_id", "text"), ("team_id", "text")]
+
+# Value columns per target table; a round is rewritten only when one of
+# these (or its driver list) differs from what is stored
+TABLES = {
+    "f1_predictions": [
+        ("predicted_position", "int"),
+        ("predicted_points", "float8"),
+        # Per-feature path contributions ({feature: score delta}) on top of
+        # base_score; NULL when the model isn't a forest
+        ("base_score", "float8"),
+        ("contributions", "jsonb"),
+    ],
+    "f1_race_probabilities": [
+        ("p_win", "float8"),
+        ("p_podium", "float8"),
+        ("expected_points", "float8"),
+        ("n_sims", "int"),
+    ],
+}
+
+
+def ensure_schema(cur):
+    cur.execute(SCHEMA_DDL)
+
+
+# =====================================================
+# RUNS
+# =====================================================
+def start_run(cur, season, backend):
+    cur.execute(
+        "INSERT INTO f1_prediction_runs (season, backend) VALUES (%s, %s) "
+        "RETURNING prediction_run_id",
+        (season, backend),
+    )
+    return cur.fetchone()[0]
+
+
+def finish_run(cur, run_id, rounds_changed, rows_written):
+    cur.execute(
+        """
+        UPDATE f1_prediction_runs
+        SET finished_at = NOW(), rounds_changed = %s, rows_written = %s
+        WHERE prediction_run_id = %s
+        """,
+        (rounds_changed, rows_written, run_id),
+    )
+
+
+# =====================================================
+# ROUND-SCOPED BULK UPSERT
+# =====================================================
+def upsert_rounds(cur, table, df, run_id):
+    # One statement for the whole season: the rows travel as a VALUES list,
+    # unchanged rounds are filtered out server-side, and changed rounds are
+    # replaced as a unit (stale drivers deleted, the rest upserted)
+    if df.empty:
+        return [], 0, 0
+
+    value_cols = TABLES[table]
+    stage_cols = KEY_COLS + META_COLS + value_cols + [("prediction_run_id", "bigint")]
+    names = [c for c, _ in stage_cols]
+    compare = [c for c, _ in META_COLS + value_cols]
+    insert_cols = ", ".join(names)
+
+    template = "(" + ", ".join(f"%s::{t}" for _, t in stage_cols) + ")"
+    values = df[names[:-1]].astype(object)
+    values = values.where(values.notna(), None)
+    rows = [tuple(r) + (run_id,) for r in values.itertuples(index=False)]
+
+    sql = f"""
+    WITH stage ({insert_cols}) AS (
+        VALUES %s
+    ),
+    stored AS (
+        SELECT t.*
+        FROM {table} t
+        WHERE (t.season, t.round) IN (SELECT DISTINCT season, round FROM stage)
+    ),
+    changed AS (
+        SELECT s.season, s.round
+        FROM stage s
+        LEFT JOIN stored c
+          ON c.season = s.season AND c.round = s.round AND c.driver_id = s.driver_id
+        WHERE c.driver_id IS NULL
+           OR ({", ".join("c." + c for c in compare)})
+              IS DISTINCT FROM ({", ".join("s." + c for c in compare)})
+        UNION
+        SELECT c.season, c.round
+        FROM stored c
+        LEFT JOIN stage s
+          ON s.season = c.season AND s.round = c.round AND s.driver_id = c.driver_id
+        WHERE s.driver_id IS NULL
+    ),
+    removed AS (
+        DELETE FROM {table} t
+        USING changed ch
+        WHERE t.season = ch.season AND t.round = ch.round
+          AND NOT EXISTS (
+              SELECT 1 FROM stage s
+              WHERE s.season = t.season AND s.round = t.round
+                AND s.driver_id = t.driver_id
+          )
+        RETURNING 1
+    ),
+    written AS (
+        INSERT INTO {table} ({insert_cols})
+        SELECT {", ".join("s." + c for c in names)}
+        FROM stage s
+        JOIN changed ch ON ch.season = s.season AND ch.round = s.round
+        ON CONFLICT (season, round, driver_id)
+        DO UPDATE SET
+            {", ".join(f"{c} = EXCLUDED.{c}" for c in compare)},
+            prediction_run_id = EXCLUDED.prediction_run_id,
+            created_at = NOW()
+        RETURNING 1
+    )
+    SELECT ch.season, ch.round,
+           (SELECT COUNT(*) FROM written),
+           (SELECT COUNT(*) FROM removed)
+    FROM changed ch
+    ORDER BY ch.season, ch.round
+    """
+
+    result = execute_values(
+        cur, sql, rows, template=template, page_size=len(rows), fetch=True
+    )
+    if not result:
+        return [], 0, 0
+
+    rounds = [(season, rnd) for season, rnd, _, _ in result]
+    return rounds, result[0][2], result[0][3]
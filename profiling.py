@@ -0,0 +1,162 @@
+import os
+import sys
+import pstats
+import fnmatch
+import cProfile
+import threading
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+
+# =====================================================
+# CONFIG
+# =====================================================
+# Opt-in profiling of telemetry spans. Off unless F1_PROFILE is set:
+#   F1_PROFILE=cprofile          deterministic profile (.prof + top functions)
+#   F1_PROFILE=sample            stack sampling, low overhead (.folded)
+#   F1_PROFILE=cprofile,memory   either of the above plus tracemalloc
+# F1_PROFILE_SPANS limits it to matching span names (e.g. "fit,import_*").
+MODES = {m.strip() for m in os.getenv("F1_PROFILE", "").split(",") if m.strip()}
+SPAN_PATTERNS = [p.strip() for p in os.getenv("F1_PROFILE_SPANS", "*").split(",") if p.strip()]
+PROFILE_DIR = os.getenv("F1_PROFILE_DIR", "profiles")
+
+SAMPLE_INTERVAL_S = float(os.getenv("F1_PROFILE_INTERVAL_MS", "5")) / 1000
+# The report groups by allocating line, which needs one frame; deeper
+# tracebacks make tracemalloc far slower on allocation-heavy fits
+MEMORY_FRAMES = int(os.getenv("F1_PROFILE_MEMORY_FRAMES", "1"))
+TOP_N = 30
+
+KNOWN_MODES = {"cprofile", "sample", "memory"}
+if MODES - KNOWN_MODES:
+    raise ValueError(f"Unknown F1_PROFILE modes: {', '.join(sorted(MODES - KNOWN_MODES))}")
+
+_state = threading.local()
+_seq = 0
+_seq_lock = threading.Lock()
+_run_dir = None
+
+
+def run_dir(job):
+    # One directory per process run, created on first use
+    global _run_dir
+    if _run_dir is None:
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        _run_dir = os.path.join(PROFILE_DIR, f"{job}-{stamp}-{os.getpid()}")
+        os.makedirs(_run_dir, exist_ok=True)
+    return _run_dir
+
+
+# =====================================================
+# SAMPLING PROFILER
+# =====================================================
+class StackSampler:
+    # Samples one thread's stack from a background thread; output is in
+    # folded format (frame;frame;frame count) for flamegraph tools
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL_S):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="f1-sampler", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def write(self, path):
+        with open(path, "w") as f:
+            for stack, hits in self.stacks.most_common():
+                f.write(f"{stack} {hits}\n")
+
+
+# =====================================================
+# SPAN HOOKS
+# =====================================================
+def start(job, span_name):
+    # Returns a handle for stop(), or None when this span isn't profiled.
+    # Only the outermost profiled span per thread is captured, since
+    # profilers don't nest.
+    if not MODES or getattr(_state, "active", False):
+        return None
+    if not any(fnmatch.fnmatch(span_name, p) for p in SPAN_PATTERNS):
+        return None
+
+    global _seq
+    with _seq_lock:
+        _seq += 1
+        seq = _seq
+
+    _state.active = True
+    handle = {"path": os.path.join(run_dir(job), f"{seq:02d}-{span_name}")}
+
+    if "memory" in MODES:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(MEMORY_FRAMES)
+        tracemalloc.reset_peak()
+        handle["snapshot"] = tracemalloc.take_snapshot()
+
+    if "sample" in MODES:
+        handle["sampler"] = StackSampler(threading.get_ident())
+        handle["sampler"].start()
+
+    if "cprofile" in MODES:
+        handle["profiler"] = cProfile.Profile()
+        handle["profiler"].enable()
+
+    return handle
+
+
+def stop(handle):
+    # Writes this span's outputs and returns their paths
+    written = []
+    path = handle["path"]
+
+    try:
+        if "profiler" in handle:
+            profiler = handle["profiler"]
+            profiler.disable()
+            profiler.dump_stats(f"{path}.prof")
+            with open(f"{path}.txt", "w") as f:
+                stats = pstats.Stats(profiler, stream=f)
+                stats.sort_stats("cumulative").print_stats(TOP_N)
+                stats.sort_stats("tottime").print_stats(TOP_N)
+            written += [f"{path}.prof", f"{path}.txt"]
+
+        if "sampler" in handle:
+            handle["sampler"].stop()
+            handle["sampler"].write(f"{path}.folded")
+            written.append(f"{path}.folded")
+
+        if "snapshot" in handle:
+            _, peak = tracemalloc.get_traced_memory()
+            # Leave out what the profilers themselves allocated
+            ignore = [
+                tracemalloc.Filter(False, f)
+                for f in (cProfile.__file__, tracemalloc.__file__, __file__)
+            ]
+            after = tracemalloc.take_snapshot().filter_traces(ignore)
+            diff = after.compare_to(handle["snapshot"].filter_traces(ignore), "lineno")
+            with open(f"{path}.alloc.txt", "w") as f:
+                f.write(f"peak traced: {peak / 1024 / 1024:.1f} MiB\n")
+                f.write(f"top {TOP_N} allocation sites by growth:\n")
+                for stat in diff[:TOP_N]:
+                    f.write(f"{stat}\n")
+            written.append(f"{path}.alloc.txt")
+    finally:
+        _state.active = False
+
+    return written
@@ -0,0 +1,23 @@
+import pandas as pd
+
+RACE_KEYS = ["season", "round"]
+
+
+# =====================================================
+# RACE-LEVEL RANKING
+# =====================================================
+def rank_within_races(df, score_col="predicted_score", tiebreak_col="grid_position"):
+    # Unique 1..N finishing order per (season, round): lower score first,
+    # ties go to the better grid slot, then driver_id for determinism
+    tiebreak = pd.to_numeric(df[tiebreak_col], errors="coerce")
+    order = (
+        df[RACE_KEYS + ["driver_id", score_col]]
+        .assign(_tiebreak=tiebreak)
+        .sort_values(
+            RACE_KEYS + [score_col, "_tiebreak", "driver_id"],
+            na_position="last",
+            kind="mergesort",
+        )
+    )
+    ranks = order.groupby(RACE_KEYS, sort=False).cumcount() + 1
+    return ranks.reindex(df.index).astype("int64")
@@ -0,0 +1,215 @@
+import os
+import time
+import numpy as np
+import pandas as pd
+
+import flat_ensemble
+import model_backends
+import telemetry
+from train_model import race_keys
+
+# =====================================================
+# CONFIG
+# =====================================================
+N_SIMS = int(os.getenv("RACE_SIMS", "100000"))
+SEED = 42
+
+POINTS = np.array([25, 18, 15, 12, 10, 8, 6, 4, 2, 1], dtype=np.float64)
+
+# Beta prior on DNF rates: drivers with few starts shrink to the field rate
+DNF_PRIOR_RACES = 10
+
+
+# =====================================================
+# PREDICTIVE DISTRIBUTIONS
+# =====================================================
+def predictive_samples(artifact, X, races):
+    # Rows are draws, columns are drivers (in the order of X)
+    backend, model = artifact["backend"], artifact["model"]
+
+    if hasattr(model, "estimators_"):
+        # Forest: every tree is one draw from the ensemble's spread. Trees
+        # split on float32, so casting once up front changes nothing.
+        X = np.asarray(X, dtype=np.float32)
+        flat = artifact.get("flat")
+        if flat is not None and len(X) <= model_backends.FLAT_MAX_ROWS:
+            draws = flat_ensemble.tree_values(flat, X).T
+        else:
+            draws = np.stack([tree.predict(X) for tree in model.estimators_])
+        return np.stack([
+            model_backends.from_target(backend, d, races) for d in draws
+        ])
+
+    # Boosting has no per-tree spread; use the training residual scale.
+    # X goes in as given, so the point matches predict_2026 and scenarios.
+    point = model_backends.predict_positions(backend, model, X, races, artifact.get("flat"))
+    std = artifact.get("residual_std") or 1.0
+    offsets = np.random.default_rng(SEED).standard_normal((64, 1)) * std
+    return point[None, :] + offsets
+
+
+def load_dnf_rates(conn):
+    rates = pd.read_sql("""
+    SELECT
+        rr.driver_id,
+        COUNT(*)           AS races,
+        COUNT(d.driver_id) AS dnfs
+    FROM f1_race_results rr
+    LEFT JOIN f1_dnf d
+      ON d.season = rr.season
+     AND d.round  = rr.round
+     AND d.driver_id = rr.driver_id
+    GROUP BY rr.driver_id
+    """, conn)
+
+    field_rate = rates["dnfs"].sum() / max(rates["races"].sum(), 1)
+    rates["dnf_rate"] = (
+        (rates["dnfs"] + DNF_PRIOR_RACES * field_rate)
+        / (rates["races"] + DNF_PRIOR_RACES)
+    )
+    return rates.set_index("driver_id")["dnf_rate"], float(field_rate)
+
+
+# =====================================================
+# SIMULATION
+# =====================================================
+# Each driver's distribution is laid out as a lookup table of packed int32
+# sort keys:  [ score | random jitter | driver index ].  A simulated race is
+# then one random slot per driver, a gather and a plain integer row sort,
+# which is several times cheaper than argsort over float scores.
+TABLE_SLOTS = 8192
+SIM_BATCH = 8192
+JITTER_BITS = 12
+
+
+def _key_layout(n_drivers):
+    driver_bits = max(1, (n_drivers - 1).bit_length())
+    score_bits = 31 - JITTER_BITS - driver_bits
+    if score_bits < 8:
+        raise ValueError(f"Too many drivers for packed sort keys: {n_drivers}")
+    return driver_bits, score_bits
+
+
+def build_slot_table(samples, dnf_rate, rng):
+    samples = np.asarray(samples, dtype=np.float64)
+    n_draws, n_drivers = samples.shape
+    driver_bits, score_bits = _key_layout(n_drivers)
+
+    # Quantize scores; the top code is reserved for retirements
+    dnf_code = (1 << score_bits) - 1
+    lo, hi = samples.min(), samples.max()
+    span = hi - lo if hi > lo else 1.0
+    codes = np.rint((samples - lo) / span * (dnf_code - 1)).astype(np.int32)
+
+    # The first round(rate × slots) slots of a driver are retirements; the
+    # rest cover that driver's draws uniformly
+    n_dnf = np.rint(np.clip(dnf_rate, 0, 1) * TABLE_SLOTS).astype(np.int64)
+    n_dnf = np.minimum(n_dnf, TABLE_SLOTS - 1)
+    rel = np.arange(TABLE_SLOTS)[:, None] - n_dnf[None, :]
+    draw = (np.maximum(rel, 0) * n_draws) // (TABLE_SLOTS - n_dnf)[None, :]
+    table = codes[draw, np.arange(n_drivers)]
+    table[rel < 0] = dnf_code
+
+    # Random low bits break ties between equal draws without favouring
+    # any driver; the driver index sits underneath
+    keys = rng.integers(0, 1 << JITTER_BITS, size=table.shape, dtype=np.int32)
+    keys |= table << JITTER_BITS
+    keys <<= driver_bits
+    keys |= np.arange(n_drivers, dtype=np.int32)
+
+    # Driver-major so slot s of driver i lives at i * TABLE_SLOTS + s
+    return np.ascontiguousarray(keys.T).ravel()
+
+
+def simulate_round(samples, dnf_rate, n_sims=N_SIMS, rng=None):
+    rng = rng or np.random.default_rng(SEED)
+    n_drivers = np.shape(samples)[1]
+    driver_bits, score_bits = _key_layout(n_drivers)
+    table = build_slot_table(samples, dnf_rate, rng)
+
+    offsets = np.arange(n_drivers, dtype=np.int32) * TABLE_SLOTS
+    k = min(len(POINTS), n_drivers)
+    pos_base = np.arange(k, dtype=np.int32) * n_drivers
+    dnf_floor = ((1 << score_bits) - 1) << (JITTER_BITS + driver_bits)
+    counts = np.zeros(k * n_drivers + 1, dtype=np.int64)
+
+    # Cache-sized batches keep every intermediate in L2
+    for start in range(0, n_sims, SIM_BATCH):
+        batch = min(SIM_BATCH, n_sims - start)
+
+        # One sampled finishing key per (simulation, driver), then order each race
+        slots = rng.integers(0, TABLE_SLOTS, size=(batch, n_drivers), dtype=np.int32)
+        slots += offsets
+        keys = table[slots]
+        keys.sort(axis=1)
+
+        # Only the points places matter; retirements go to an overflow bin
+        top = keys[:, :k]
+        cells = top & np.int32((1 << driver_bits) - 1)
+        cells += pos_base
+        cells[top >= dnf_floor] = k * n_drivers
+        counts += np.bincount(cells.ravel(), minlength=k * n_drivers + 1)
+
+    # counts[pos, driver] over classified finishes
+    counts = counts[: k * n_drivers].reshape(k, n_drivers)
+
+    wins = counts[0]
+    podiums = counts[: min(3, k)].sum(axis=0)
+    points = POINTS[:k] @ counts
+
+    return wins / n_sims, podiums / n_sims, points / n_sims
+
+
+def simulate_wins(samples, dnf_rate, n_sims, rng=None):
+    # Win odds for many variants of one grid at once: samples is
+    # (draws, n_variants, n_drivers). Every variant sees the same random
+    # draws and retirements, so differences between them are not noise.
+    rng = rng or np.random.default_rng(SEED)
+    n_draws, n_variants, n_drivers = samples.shape
+    samples = np.asarray(samples, dtype=np.float32)
+
+    draw = rng.integers(0, n_draws, size=(n_sims, n_drivers))
+    retired = rng.random((n_sims, n_drivers)) < np.asarray(dnf_rate)[None, :]
+    # Tiny jitter breaks ties between equal leaf values at random
+    jitter = rng.random((n_sims, n_drivers), dtype=np.float32) * np.float32(1e-4)
+    cols = np.arange(n_drivers)
+
+    wins = np.zeros((n_variants, n_drivers))
+    for v in range(n_variants):
+        finish = samples[draw, v, cols] + jitter
+        finish[retired] = np.inf
+        # A race where everyone retires has no winner
+        winner = np.argmin(finish, axis=1)[~retired.all(axis=1)]
+        wins[v] = np.bincount(winner, minlength=n_drivers)
+    return wins / n_sims
+
+
+def simulate_season(df, artifact, X, dnf_rates, field_rate, n_sims=N_SIMS):
+    races = race_keys(df)
+    samples = predictive_samples(artifact, X, races)
+    rates = df["driver_id"].map(dnf_rates).fillna(field_rate).to_numpy()
+
+    out = df[["season", "round", "race_id", "driver_id", "team_id"]].copy()
+    out["p_win"] = 0.0
+    out["p_podium"] = 0.0
+    out["expected_points"] = 0.0
+
+    start = time.perf_counter()
+    for race in np.unique(races):
+        idx = np.flatnonzero(races == race)
+
+        # Seeded per round, so unchanged rounds reproduce identical odds
+        rng = np.random.default_rng([SEED, int(race)])
+        p_win, p_podium, exp_pts = simulate_round(
+            samples[:, idx], rates[idx], n_sims=n_sims, rng=rng
+        )
+        out.iloc[idx, out.columns.get_loc("p_win")] = p_win
+        out.iloc[idx, out.columns.get_loc("p_podium")] = p_podium
+        out.iloc[idx, out.columns.get_loc("expected_points")] = exp_pts
+    elapsed = time.perf_counter() - start
+
+    telemetry.log(
+        f"🎲 Simulated {len(np.unique(races))} rounds × {n_sims:,} races "
+        f"in {elapsed:.2f}s"
+    )
+    return out
@@ -0,0 +1,261 @@
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+
+import model_backends
+import telemetry
+
+# =====================================================
+# CONFIG
+# =====================================================
+# What-if scoring for one round. A scenario is a dict of perturbations
+# applied to the round's feature block:
+#   {"name": "VER +5",
+#    "grid_drops": {"max_verstappen": 5, "leclerc": "back"},
+#    "missing":    ["fp3"]  or  {"norris": ["fp1", "fp2"]},
+#    "deltas":     {"fp3_time": 0.4}  or  {"fp3_time": {"piastri": -0.2}}}
+# Every scenario's matrix is built with stacked array ops, all of them are
+# scored in one predict call, and the rankings come back per scenario next
+# to the unperturbed baseline (always scenario 0).
+DATABASE_URL = os.getenv("DATABASE_URL")
+MODEL_PATH = "model.pkl"
+SEASON = 2026
+
+# Simulated races per scenario for win odds; 0 = rankings only
+N_SIMS = int(os.getenv("SCENARIO_SIMS", "2000"))
+
+GRID_FEATURE = "grid_position"
+
+# Session shorthands for "missing"
+SESSIONS = {
+    "fp1": ["fp1_time"],
+    "fp2": ["fp2_time"],
+    "fp3": ["fp3_time"],
+    "qualy": ["grid_position"],
+    "sprint": ["sprint_grid", "sprint_finish"],
+}
+
+BASELINE = {"name": "baseline"}
+
+
+# =====================================================
+# SCENARIO MATRICES
+# =====================================================
+def _columns(names, features):
+    cols = []
+    for name in names:
+        for feature in SESSIONS.get(name, [name]):
+            if feature not in features:
+                raise ValueError(f"'{feature}' is not a model input (inputs: {', '.join(features)})")
+            cols.append(features.index(feature))
+    return cols
+
+
+def _rows(target, drivers):
+    # "*" or a missing key means every driver
+    if target in (None, "*"):
+        return list(range(len(drivers)))
+    if target not in drivers:
+        raise ValueError(f"Unknown driver '{target}'")
+    return [drivers.index(target)]
+
+
+def build_matrices(X, drivers, features, medians, scenarios):
+    # (n_scenarios, n_drivers, n_features) inputs, one block per scenario
+    X = np.asarray(X, dtype=np.float64)
+    n_drivers = len(drivers)
+    M = np.repeat(X[None], len(scenarios), axis=0)
+
+    fill = np.array([medians.get(f, 0.0) for f in features], dtype=np.float64)
+    set_idx, add_idx, add_val = [], [], []
+    drops = np.zeros((len(scenarios), n_drivers))
+    back = np.zeros((len(scenarios), n_drivers), dtype=bool)
+
+    # Specs are parsed row by row; the edits are applied in bulk below
+    for s, spec in enumerate(scenarios):
+        missing = spec.get("missing", {})
+        if isinstance(missing, list):
+            missing = {"*": missing}
+        for target, names in missing.items():
+            for r in _rows(target, drivers):
+                set_idx += [(s, r, c) for c in _columns(names, features)]
+
+        for name, change in spec.get("deltas", {}).items():
+            (c,) = _columns([name], features)
+            per_driver = change if isinstance(change, dict) else {"*": change}
+            for target, value in per_driver.items():
+                for r in _rows(target, drivers):
+                    add_idx.append((s, r, c))
+                    add_val.append(float(value))
+
+        for target, places in spec.get("grid_drops", {}).items():
+            for r in _rows(target, drivers):
+                if places == "back":
+                    back[s, r] = True
+                else:
+                    drops[s, r] += float(places)
+
+    # Missing sessions take the training fill value, as in prepare_features
+    if set_idx:
+        s, r, c = np.array(set_idx).T
+        M[s, r, c] = fill[c]
+    if add_idx:
+        s, r, c = np.array(add_idx).T
+        np.add.at(M, (s, r, c), add_val)
+
+    # Penalised drivers slot in just behind whoever held their new place and
+    # everyone between moves up; the grid is re-ranked per scenario
+    moved = (drops > 0).any(axis=1) | back.any(axis=1)
+    if GRID_FEATURE in features and moved.any():
+        g = features.index(GRID_FEATURE)
+        grid = M[moved, :, g]
+        keys = grid + drops[moved] + 0.5 * (drops[moved] > 0)
+        keys = np.where(back[moved], 1e6 + grid, keys)
+        order = np.argsort(keys, axis=1, kind="stable")
+        ranks = np.empty_like(order)
+        np.put_along_axis(ranks, order, np.arange(1, n_drivers + 1)[None, :], axis=1)
+        M[moved, :, g] = ranks
+
+    return M
+
+
+# =====================================================
+# EVALUATION
+# =====================================================
+def rank(pred, grid, drivers):
+    # Unique finishing order per scenario, with the same tie-breaks as
+    # race_ranking.rank_within_races: score, then grid, then driver_id
+    name_order = np.argsort(np.argsort(np.array(drivers, dtype=object)))
+    tiebreak = np.broadcast_to(name_order, pred.shape)
+    order = np.lexsort((tiebreak, grid, pred), axis=-1)
+    positions = np.empty_like(order)
+    np.put_along_axis(positions, order, np.arange(1, pred.shape[1] + 1)[None, :], axis=1)
+    return positions
+
+
+def evaluate(artifact, df, scenarios, dnf_rates=None, field_rate=0.0, n_sims=N_SIMS):
+    # df: one round's prediction rows (driver_id, team_id and model inputs).
+    # Returns one row per (scenario, driver).
+    import pandas as pd
+    from train_model import prepare_features
+
+    scenarios = [BASELINE] + list(scenarios)
+    drivers = df["driver_id"].tolist()
+    features = artifact["features"]
+    X, medians = prepare_features(df, medians=artifact["medians"] or None, features=features)
+
+    M = build_matrices(X.to_numpy(), drivers, features, dict(medians), scenarios)
+    n_scen, n_drivers, _ = M.shape
+    flat_X = M.reshape(-1, len(features))
+    races = np.repeat(np.arange(n_scen), n_drivers)
+
+    # One batched call for every scenario. Past FLAT_MAX_ROWS sklearn scores
+    # it, and the model was fitted on named columns.
+    if artifact.get("flat") is not None and len(flat_X) <= model_backends.FLAT_MAX_ROWS:
+        model_X = flat_X
+    else:
+        model_X = pd.DataFrame(flat_X, columns=features)
+    pred = model_backends.predict_positions(
+        artifact["backend"], artifact["model"], model_X, races, artifact.get("flat")
+    ).reshape(n_scen, n_drivers)
+
+    grid = M[:, :, features.index(GRID_FEATURE)] if GRID_FEATURE in features else np.zeros_like(pred)
+    positions = rank(pred, grid, drivers)
+
+    out = pd.DataFrame({
+        "scenario": np.repeat([s.get("name", f"scenario {i}") for i, s in enumerate(scenarios)], n_drivers),
+        "driver_id": np.tile(drivers, n_scen),
+        "team_id": np.tile(df["team_id"].to_numpy(), n_scen),
+        "grid_position": grid.ravel(),
+        "predicted_score": pred.ravel(),
+        "predicted_position": positions.ravel(),
+        "position_change": (positions[0][None, :] - positions).ravel(),
+    })
+
+    if n_sims:
+        import race_simulator
+
+        samples = race_simulator.predictive_samples(artifact, model_X, races)
+        if dnf_rates is None:
+            rates = np.full(n_drivers, field_rate)
+        else:
+            rates = df["driver_id"].map(dnf_rates).fillna(field_rate).to_numpy()
+
+        p_win = race_simulator.simulate_wins(
+            samples.reshape(len(samples), n_scen, n_drivers), rates, n_sims
+        )
+
+        out["p_win"] = p_win.ravel()
+        out["p_win_change"] = (p_win - p_win[0][None, :]).ravel()
+
+    return out
+
+
+# =====================================================
+# CLI
+# =====================================================
+def grid_drop_sweep(drivers, drops):
+    # Every driver × every penalty size
+    return [
+        {"name": f"{driver} +{d}" if d != "back" else f"{driver} back", "grid_drops": {driver: d}}
+        for driver in drivers
+        for d in drops
+    ]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score what-if scenarios for one round")
+    parser.add_argument("--season", type=int, default=SEASON)
+    parser.add_argument("--round", type=int, required=True)
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--file", help="JSON list of scenarios")
+    parser.add_argument("--sweep-grid-drops", metavar="DROPS",
+                        help="add a scenario per driver and drop, e.g. 3,5,10,back")
+    parser.add_argument("--sims", type=int, default=N_SIMS)
+    args = parser.parse_args(argv)
+
+    if not DATABASE_URL:
+        raise RuntimeError("DATABASE_URL not set")
+
+    import psycopg2
+    import race_simulator
+    from predict_2026 import load_prediction_frame
+
+    artifact = model_backends.load_artifact(args.model)
+    conn = psycopg2.connect(DATABASE_URL)
+    try:
+        df = load_prediction_frame(conn, args.season)
+        dnf_rates, field_rate = race_simulator.load_dnf_rates(conn)
+    finally:
+        conn.close()
+
+    df = df[df["round"] == args.round].reset_index(drop=True)
+    if df.empty:
+        raise SystemExit(f"❌ No qualifying data for {args.season} round {args.round}")
+
+    scenarios = []
+    if args.file:
+        with open(args.file) as f:
+            scenarios += json.load(f)
+    if args.sweep_grid_drops:
+        drops = [d if d == "back" else int(d) for d in args.sweep_grid_drops.split(",")]
+        scenarios += grid_drop_sweep(df["driver_id"].tolist(), drops)
+
+    start = time.perf_counter()
+    with telemetry.span("scenarios", round=args.round) as span:
+        out = evaluate(artifact, df, scenarios, dnf_rates, field_rate, n_sims=args.sims)
+        span["scenarios"] = len(scenarios) + 1
+    elapsed = time.perf_counter() - start
+
+    winners = out[out["predicted_position"] == 1]
+    for row in winners.itertuples():
+        odds = f"  p_win {row.p_win:.1%} ({row.p_win_change:+.1%})" if args.sims else ""
+        telemetry.log(f"{row.scenario:<28} 🏆 {row.driver_id}{odds}")
+    telemetry.log(f"✅ {len(scenarios) + 1} scenarios in {elapsed:.3f}s")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
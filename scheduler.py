@@ -0,0 +1,128 @@
+import os
+import sys
+import time
+import importlib
+import subprocess
+import psycopg2
+
+import pipeline_state
+import telemetry
+from telemetry import log
+
+# =====================================================
+# CONFIG
+# =====================================================
+DATABASE_URL = os.getenv("DATABASE_URL")
+
+# Wait this long after the last notification before running downstream
+# work, so one ingestion run (many stage commits) triggers one retrain
+DEBOUNCE_SECONDS = float(os.getenv("SCHEDULER_DEBOUNCE", "30"))
+RECONNECT_SECONDS = 5
+
+# Jobs run in this process by default (pandas/sklearn are imported once and
+# stay warm); set to 1 to isolate each job in its own interpreter instead
+SUBPROCESS = os.getenv("SCHEDULER_SUBPROCESS", "0") == "1"
+
+# Which downstream jobs a committed stage makes stale
+DOWNSTREAM = {
+    "f1_race_results": ["train", "predict"],
+    "f1_dnf": ["predict"],
+    "f1_races": ["predict"],
+    "f1_fp1_results": ["predict"],
+    "f1_fp2_results": ["predict"],
+    "f1_fp3_results": ["predict"],
+    "f1_qualifying_results": ["predict"],
+    "f1_sprint_qualy_results": ["predict"],
+    "f1_sprint_race_results": ["predict"],
+    "f1_form_state": ["predict"],
+    "f1_circuit_affinity": ["predict"],
+}
+
+JOB_ORDER = ["train", "predict"]
+
+# Job -> module with a main(argv)
+JOBS = {
+    "train": "train_model",
+    "predict": "predict_2026",
+}
+
+
+def jobs_for(stages):
+    wanted = {job for stage in stages for job in DOWNSTREAM.get(stage, [])}
+    return [job for job in JOB_ORDER if job in wanted]
+
+
+def run_job(job):
+    # Returns an exit status like a subprocess would
+    module = JOBS[job]
+    if SUBPROCESS:
+        return subprocess.run([sys.executable, f"{module}.py"]).returncode
+
+    try:
+        importlib.import_module(module).main([])
+        return 0
+    except SystemExit as e:
+        return e.code if isinstance(e.code, int) else 1
+    except Exception as e:
+        log(f"❌ {job} raised {type(e).__name__}: {e}")
+        return 1
+
+
+def run_jobs(jobs):
+    for job in jobs:
+        log(f"▶️ Running {job}")
+        start = time.perf_counter()
+        returncode = run_job(job)
+        elapsed = time.perf_counter() - start
+
+        telemetry.count("scheduler_jobs", job=job, status="ok" if returncode == 0 else "failed")
+        telemetry.observe("scheduler_job_seconds", elapsed, job=job)
+
+        if returncode != 0:
+            # Later jobs would only work from stale inputs
+            log(f"❌ {job} failed ({returncode}) after {elapsed:.1f}s")
+            return False
+
+        log(f"✅ {job} done in {elapsed:.1f}s")
+    return True
+
+
+# =====================================================
+# EVENT LOOP
+# =====================================================
+def serve():
+    pending = set()
+
+    while True:
+        try:
+            conn = psycopg2.connect(DATABASE_URL)
+            pipeline_state.listen(conn)
+            log(f"👂 Listening on '{pipeline_state.CHANNEL}'")
+
+            while True:
+                # Block until something commits; once work is pending, wait
+                # only for the debounce window to go quiet
+                timeout = DEBOUNCE_SECONDS if pending else None
+                stages = pipeline_state.wait_for_stages(conn, timeout)
+
+                if stages:
+                    log(f"🔔 {', '.join(sorted(stages))}")
+                    pending |= stages
+                    continue
+
+                if pending:
+                    run_jobs(jobs_for(pending))
+                    pending.clear()
+                    # Long-lived process: publish metrics after every batch
+                    telemetry.write_textfile()
+
+        except psycopg2.OperationalError as e:
+            log(f"❌ Listener connection lost: {e}")
+            time.sleep(RECONNECT_SECONDS)
+
+
+if __name__ == "__main__":
+    if not DATABASE_URL:
+        raise RuntimeError("DATABASE_URL not set")
+
+    serve()
@@ -0,0 +1,237 @@
+import os
+import re
+
+# =====================================================
+# CONFIG
+# =====================================================
+# DATABASE_URL picks where the f1_* tables live:
+#   postgresql://user@host/db     production Postgres (psycopg2)
+#   duckdb:///path/to/f1.duckdb   embedded, columnar, no server
+#   duckdb://                     embedded, in memory
+# The embedded store holds the same source tables and answers the same
+# read queries (psycopg2's %s / %(name)s parameters are rewritten), so
+# synthetic loads, feature builds, training, evaluation and their
+# benchmark stages run offline. Ingestion, predictions and the dashboard
+# stay on Postgres: they rely on COPY, data-modifying CTEs and NOTIFY.
+DATABASE_URL = os.getenv("DATABASE_URL")
+EMBEDDED_SCHEME = "duckdb://"
+
+# Source tables as the ingest writes them; portable to both backends
+SOURCE_SCHEMA_DDL = """
+CREATE TABLE IF NOT EXISTS f1_races (
+    race_id         TEXT UNIQUE,
+    season          INT NOT NULL,
+    round           INT NOT NULL,
+    race_name       TEXT,
+    race_date       DATE,
+    race_time       TIME,
+    qualy_date      DATE,
+    qualy_time      TIME,
+    circuit_name    TEXT,
+    circuit_country TEXT,
+    laps            INT,
+    PRIMARY KEY (season, round)
+);
+
+CREATE TABLE IF NOT EXISTS f1_fp1_results (
+    season INT NOT NULL, round INT NOT NULL, race_id TEXT,
+    driver_id TEXT NOT NULL, team_id TEXT, best_time TEXT,
+    PRIMARY KEY (season, round, driver_id)
+);
+
+CREATE TABLE IF NOT EXISTS f1_fp2_results (
+    season INT NOT NULL, round INT NOT NULL, race_id TEXT,
+    driver_id TEXT NOT NULL, team_id TEXT, best_time TEXT,
+    PRIMARY KEY (season, round, driver_id)
+);
+
+CREATE TABLE IF NOT EXISTS f1_fp3_results (
+    season INT NOT NULL, round INT NOT NULL, race_id TEXT,
+    driver_id TEXT NOT NULL, team_id TEXT, best_time TEXT,
+    PRIMARY KEY (season, round, driver_id)
+);
+
+CREATE TABLE IF NOT EXISTS f1_qualifying_results (
+    season INT NOT NULL, round INT NOT NULL, race_id TEXT,
+    driver_id TEXT NOT NULL, team_id TEXT,
+    q1 TEXT, q2 TEXT, q3 TEXT, grid_position INT,
+    PRIMARY KEY (season, round, driver_id)
+);
+
+CREATE TABLE IF NOT EXISTS f1_sprint_qualy_results (
+    season INT NOT NULL, round INT NOT NULL, race_id TEXT,
+    driver_id TEXT NOT NULL, team_id TEXT, grid_position INT,
+    PRIMARY KEY (season, round, driver_id)
+);
+
+CREATE TABLE IF NOT EXISTS f1_sprint_race_results (
+    season INT NOT NULL, round INT NOT NULL, race_id TEXT,
+    driver_id TEXT NOT NULL, team_id TEXT, position INT,
+    PRIMARY KEY (season, round, driver_id)
+);
+
+CREATE TABLE IF NOT EXISTS f1_race_results (
+    season INT NOT NULL, round INT NOT NULL, race_id TEXT,
+    driver_id TEXT NOT NULL, team_id TEXT,
+    position INT, grid INT, points FLOAT8, race_time TEXT, status TEXT,
+    PRIMARY KEY (season, round, driver_id)
+);
+
+CREATE TABLE IF NOT EXISTS f1_dnf (
+    season INT NOT NULL, round INT NOT NULL, race_id TEXT,
+    driver_id TEXT NOT NULL, team_id TEXT, dnf_reason TEXT,
+    PRIMARY KEY (season, round, driver_id)
+);
+
+CREATE TABLE IF NOT EXISTS f1_weather (
+    season INT NOT NULL, round INT NOT NULL, race_id TEXT,
+    weather_date DATE,
+    temp_avg FLOAT8, temp_max FLOAT8, temp_min FLOAT8,
+    precipitation FLOAT8, wind_speed FLOAT8,
+    PRIMARY KEY (season, round)
+);
+"""
+
+# psycopg2 placeholders: %(name)s, %s and the %% escape
+PARAM = re.compile(r"%(?:\((\w+)\)s|s|%)")
+
+
+def is_embedded(url):
+    return bool(url) and url.startswith(EMBEDDED_SCHEME)
+
+
+def connect(url=None):
+    url = url or DATABASE_URL
+    if not url:
+        raise RuntimeError("DATABASE_URL not set")
+
+    if is_embedded(url):
+        return EmbeddedConnection(url[len(EMBEDDED_SCHEME):])
+
+    import psycopg2
+    return psycopg2.connect(url)
+
+
+def backend_name(conn):
+    return "DuckDB" if isinstance(conn, EmbeddedConnection) else "Postgres"
+
+
+# =====================================================
+# EMBEDDED BACKEND (DUCKDB)
+# =====================================================
+def translate(query, params):
+    # psycopg2 paramstyle -> DuckDB ($name / ?). Only the named parameters
+    # the query uses are passed on; DuckDB rejects unused ones.
+    names = []
+
+    def swap(match):
+        if match.group(0) == "%%":
+            return "%"
+        if match.group(1):
+            names.append(match.group(1))
+            return f"${match.group(1)}"
+        return "?"
+
+    query = PARAM.sub(swap, query)
+    if isinstance(params, dict):
+        params = {name: params[name] for name in names}
+    else:
+        params = list(params)
+    return query, params
+
+
+class EmbeddedCursor:
+    # The psycopg2 cursor surface the pipeline (and pd.read_sql) uses
+    def __init__(self, db):
+        self._cur = db.cursor()
+
+    def execute(self, query, params=None):
+        # Like psycopg2, % is only special when parameters are given
+        if params is not None:
+            query, params = translate(query, params)
+        self._cur.execute(query, params)
+        return self
+
+    def executemany(self, query, vars_list):
+        vars_list = list(vars_list)
+        if not vars_list:
+            return self
+        sql = translate(query, vars_list[0])[0]
+        self._cur.executemany(sql, [translate(query, v)[1] for v in vars_list])
+        return self
+
+    @property
+    def description(self):
+        return self._cur.description
+
+    @property
+    def rowcount(self):
+        return self._cur.rowcount
+
+    def fetchone(self):
+        return self._cur.fetchone()
+
+    def fetchmany(self, size=1):
+        return self._cur.fetchmany(size)
+
+    def fetchall(self):
+        return self._cur.fetchall()
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def close(self):
+        self._cur.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class EmbeddedConnection:
+    # Statements autocommit, so commit/rollback have nothing to do
+    def __init__(self, path):
+        try:
+            import duckdb
+        except ImportError:
+            raise RuntimeError("The embedded backend needs duckdb (pip install -r requirements-offline.txt)") from None
+        self.db = duckdb.connect(path or ":memory:")
+        self.closed = False
+
+    def cursor(self):
+        return EmbeddedCursor(self.db)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.db.close()
+        self.closed = True
+
+
+def ensure_source_schema(conn):
+    with conn.cursor() as cur:
+        cur.execute(SOURCE_SCHEMA_DDL)
+
+
+def load_frames(conn, tables, replace=False):
+    # Whole DataFrames in one INSERT each, scanned straight from pandas
+    ensure_source_schema(conn)
+    seasons = sorted(int(s) for s in tables["f1_races"]["season"].unique())
+
+    for name, df in tables.items():
+        if replace:
+            conn.db.execute(
+                f"DELETE FROM {name} WHERE season IN ({', '.join(map(str, seasons))})"
+            )
+        columns = ", ".join(df.columns)
+        conn.db.register("frame", df)
+        try:
+            conn.db.execute(f"INSERT INTO {name} ({columns}) SELECT {columns} FROM frame")
+        finally:
+            conn.db.unregister("frame")
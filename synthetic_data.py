@@ -0,0 +1,336 @@
+import io
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from api_stub_server import CIRCUITS, DNF_REASONS, POINTS
+from telemetry import log
+
+# =====================================================
+# CONFIG
+# =====================================================
+# Fills the f1_* tables with synthetic seasons for scaling runs. Every table
+# is built as whole (race x driver) arrays, so 50+ seasons take seconds.
+LAST_SEASON = 2026
+DRIVER_TURNOVER = 0.15     # share of seats changing hands each winter
+SPRINT_SHARE = 0.25        # share of weekends run in sprint format
+MISSING_SESSION_RATE = 0.03
+MISSING_TIME_RATE = 0.01   # driver set no time in a session that ran
+DNF_RATE = 0.08
+MECHANICAL_REASONS = {"Engine", "Gearbox", "Hydraulics", "Brakes"}
+
+TABLE_COLUMNS = {
+    "f1_races": [
+        "race_id", "season", "round", "race_name", "race_date", "race_time",
+        "qualy_date", "qualy_time", "circuit_name", "circuit_country", "laps",
+    ],
+    "f1_fp1_results": ["season", "round", "race_id", "driver_id", "team_id", "best_time"],
+    "f1_fp2_results": ["season", "round", "race_id", "driver_id", "team_id", "best_time"],
+    "f1_fp3_results": ["season", "round", "race_id", "driver_id", "team_id", "best_time"],
+    "f1_qualifying_results": [
+        "season", "round", "race_id", "driver_id", "team_id", "q1", "q2", "q3", "grid_position",
+    ],
+    "f1_sprint_qualy_results": ["season", "round", "race_id", "driver_id", "team_id", "grid_position"],
+    "f1_sprint_race_results": ["season", "round", "race_id", "driver_id", "team_id", "position"],
+    "f1_race_results": [
+        "season", "round", "race_id", "driver_id", "team_id",
+        "position", "grid", "points", "race_time", "status",
+    ],
+    "f1_dnf": ["season", "round", "race_id", "driver_id", "team_id", "dnf_reason"],
+    "f1_weather": [
+        "season", "round", "race_id", "weather_date",
+        "temp_avg", "temp_max", "temp_min", "precipitation", "wind_speed",
+    ],
+}
+
+
+# =====================================================
+# TIMING STRINGS
+# =====================================================
+def lap_strings(seconds):
+    # 89.708 -> "1:29.708", as f1api.dev reports session times
+    minutes = (seconds // 60).astype(np.int64)
+    secs = np.char.zfill(np.char.mod("%.3f", seconds - minutes * 60), 6)
+    return np.char.add(np.char.add(minutes.astype(str), ":"), secs)
+
+
+def race_time_strings(total, gap):
+    # Winner gets the race clock ("1:31:44.742"), everyone else "+gap"
+    hours = (total // 3600).astype(np.int64)
+    minutes = ((total % 3600) // 60).astype(np.int64)
+    clock = np.char.add(
+        np.char.add(hours.astype(str), ":"),
+        np.char.add(
+            np.char.add(np.char.zfill(minutes.astype(str), 2), ":"),
+            np.char.zfill(np.char.mod("%.3f", total % 60), 6),
+        ),
+    )
+    return np.where(gap == 0, clock, np.char.add("+", np.char.mod("%.3f", gap)))
+
+
+def ranks(values):
+    # 1-based rank along the driver axis
+    return values.argsort(axis=1).argsort(axis=1) + 1
+
+
+# =====================================================
+# GENERATOR
+# =====================================================
+def generate_tables(seasons=50, rounds=24, drivers=20, first_season=None,
+                    unraced_rounds=0, seed=0):
+    rng = np.random.default_rng(seed)
+    first_season = first_season or LAST_SEASON - seasons + 1
+    season_list = np.arange(first_season, first_season + seasons)
+    n_races = seasons * rounds
+    n_teams = (drivers + 1) // 2
+
+    # Seat -> driver identity per season, with winter turnover
+    seat_driver = np.empty((seasons, drivers), dtype=np.int64)
+    seat_driver[0] = np.arange(drivers)
+    next_id = drivers
+    for s in range(1, seasons):
+        seat_driver[s] = seat_driver[s - 1]
+        moved = rng.random(drivers) < DRIVER_TURNOVER
+        seat_driver[s, moved] = np.arange(next_id, next_id + moved.sum())
+        next_id += moved.sum()
+
+    driver_skill = rng.normal(0, 0.3, next_id)
+    # Car pace drifts season to season
+    team_pace = np.cumsum(rng.normal(0, 0.35, (seasons, n_teams)), axis=0)
+    team_pace -= team_pace.mean(axis=1, keepdims=True)
+
+    # Race-level axes
+    season_idx = np.repeat(np.arange(seasons), rounds)
+    season = season_list[season_idx]
+    rnd = np.tile(np.arange(1, rounds + 1), seasons)
+    circuit_idx = (rnd - 1) % len(CIRCUITS)
+    spacing = min(12, 270 // max(rounds, 1))
+    race_date = (
+        pd.to_datetime(pd.Series(season).astype(str) + "-03-01")
+        + pd.to_timedelta((rnd - 1) * spacing, unit="D")
+    )
+    race_id = np.char.add(
+        np.char.add(season.astype(str), "_"),
+        np.char.zfill(rnd.astype(str), 2),
+    )
+    base_lap = 75 + circuit_idx % 7 * 2.5 + rng.normal(0, 0.4, n_races)
+    laps = 50 + (circuit_idx * 7) % 21
+    sprint = rng.random(n_races) < SPRINT_SHARE
+    raced = ~((season_idx == seasons - 1) & (rnd > rounds - unraced_rounds))
+
+    # Race x driver axes
+    seats = np.arange(drivers)
+    driver_num = seat_driver[season_idx]
+    team_num = np.broadcast_to(seats // 2, (n_races, drivers))
+    pace = (
+        team_pace[season_idx][:, seats // 2]
+        + driver_skill[driver_num]
+        + rng.normal(0, 0.15, (n_races, drivers))
+    )
+    driver_id = np.char.add("driver_", np.char.zfill(driver_num.astype(str), 4))
+    team_id = np.char.add("team_", np.char.zfill(team_num.astype(str), 2))
+
+    def frame(mask, **cols):
+        # Flatten (race x driver) arrays through a row mask
+        flat = mask.ravel()
+        out = {
+            "season": np.repeat(season, drivers)[flat],
+            "round": np.repeat(rnd, drivers)[flat],
+            "race_id": np.repeat(race_id, drivers)[flat],
+            "driver_id": driver_id.ravel()[flat],
+            "team_id": team_id.ravel()[flat],
+        }
+        for name, values in cols.items():
+            out[name] = np.asarray(values).ravel()[flat]
+        return pd.DataFrame(out)
+
+    def session_held(skip=None):
+        held = rng.random(n_races) >= MISSING_SESSION_RATE
+        if skip is not None:
+            held &= ~skip
+        return np.repeat(held[:, None], drivers, axis=1)
+
+    def timed(seconds, held):
+        times = lap_strings(seconds).astype(object)
+        times[rng.random(seconds.shape) < MISSING_TIME_RATE] = None
+        return frame(held, best_time=times)
+
+    tables = {}
+
+    # Calendar
+    tables["f1_races"] = pd.DataFrame({
+        "race_id": race_id,
+        "season": season,
+        "round": rnd,
+        "race_name": np.array([c for _, c in CIRCUITS])[circuit_idx],
+        "race_date": race_date.dt.date,
+        "race_time": "14:00:00",
+        "qualy_date": (race_date - pd.Timedelta(days=1)).dt.date,
+        "qualy_time": "15:00:00",
+        "circuit_name": np.array([c for c, _ in CIRCUITS])[circuit_idx],
+        "circuit_country": np.array([c for _, c in CIRCUITS])[circuit_idx],
+        "laps": laps,
+    })
+    tables["f1_races"]["race_name"] += " Grand Prix"
+
+    # Practice: sprint weekends run FP1 only
+    lap_base = base_lap[:, None] + 1.5 + pace
+    tables["f1_fp1_results"] = timed(lap_base + rng.normal(0, 0.3, pace.shape), session_held())
+    tables["f1_fp2_results"] = timed(lap_base + rng.normal(0, 0.25, pace.shape), session_held(sprint))
+    tables["f1_fp3_results"] = timed(lap_base + rng.normal(0, 0.2, pace.shape), session_held(sprint))
+
+    # Qualifying: knockout leaves q2/q3 empty below the cut
+    q_time = base_lap[:, None] + pace + rng.normal(0, 0.1, pace.shape)
+    grid = ranks(q_time)
+    q2_cut, q3_cut = drivers * 3 // 4, drivers // 2
+    q1 = lap_strings(q_time + 0.4).astype(object)
+    q2 = lap_strings(q_time + 0.2).astype(object)
+    q3 = lap_strings(q_time).astype(object)
+    q2[grid > q2_cut] = None
+    q3[grid > q3_cut] = None
+    all_rows = np.ones(pace.shape, dtype=bool)
+    tables["f1_qualifying_results"] = frame(all_rows, q1=q1, q2=q2, q3=q3, grid_position=grid)
+
+    # Sprint weekends
+    sprint_rows = np.repeat(sprint[:, None], drivers, axis=1)
+    sprint_grid = ranks(q_time + rng.normal(0, 0.1, pace.shape))
+    sprint_finish = ranks(pace * 20 + sprint_grid * 0.8 + rng.normal(0, 3, pace.shape))
+    tables["f1_sprint_qualy_results"] = frame(sprint_rows, grid_position=sprint_grid)
+    tables["f1_sprint_race_results"] = frame(sprint_rows, position=sprint_finish)
+
+    # Race: DNFs are classified behind the finishers with no position
+    dnf = rng.random(pace.shape) < DNF_RATE
+    race_score = pace * 60 + grid * 1.5 + rng.normal(0, 6, pace.shape)
+    race_score[dnf] = np.inf
+    finish = ranks(race_score)
+    position = np.where(dnf, None, finish)
+    points_table = np.zeros(drivers + 1, dtype=np.int64)
+    scoring = min(len(POINTS), drivers)
+    points_table[1:scoring + 1] = POINTS[:scoring]
+    points = np.where(dnf, 0, points_table[finish])
+    winner = np.where(dnf, np.inf, race_score).min(axis=1, keepdims=True)
+    gap = np.where(dnf, 0, race_score - winner)
+    total = (laps * (base_lap + 4))[:, None] * np.ones(pace.shape)
+    race_time = race_time_strings(total, gap).astype(object)
+    race_time[dnf] = None
+
+    reason = np.array(DNF_REASONS)[rng.integers(0, len(DNF_REASONS), pace.shape)]
+    status = np.where(dnf, np.char.lower(reason), "").astype(object)
+    raced_rows = np.repeat(raced[:, None], drivers, axis=1)
+
+    tables["f1_race_results"] = frame(
+        raced_rows,
+        position=position,
+        grid=grid, points=points, race_time=race_time, status=status,
+    )
+    mechanical = dnf & np.isin(reason, list(MECHANICAL_REASONS)) & raced_rows
+    tables["f1_dnf"] = frame(mechanical, dnf_reason=np.char.lower(reason))
+
+    # Race-day weather
+    t_max = 22 + rng.normal(0, 5, n_races)
+    t_min = t_max - 6 - rng.random(n_races) * 4
+    tables["f1_weather"] = pd.DataFrame({
+        "season": season,
+        "round": rnd,
+        "race_id": race_id,
+        "weather_date": race_date.dt.date,
+        "temp_avg": (t_max + t_min) / 2,
+        "temp_max": t_max,
+        "temp_min": t_min,
+        "precipitation": np.maximum(0, rng.normal(0, 3, n_races)).round(1),
+        "wind_speed": (8 + rng.random(n_races) * 20).round(1),
+    })
+
+    return {name: df[TABLE_COLUMNS[name]] for name, df in tables.items()}
+
+
+# =====================================================
+# OUTPUT
+# =====================================================
+def write_csv(tables, out_dir):
+    os.makedirs(out_dir, exist_ok=True)
+    for name, df in tables.items():
+        df.to_csv(os.path.join(out_dir, f"{name}.csv"), index=False)
+
+
+def load_tables(conn, tables, replace=False):
+    # COPY each table in one round trip; `replace` clears the seasons first
+    import circuit_affinity
+    import form_features
+    import pipeline_state
+    import storage
+
+    if isinstance(conn, storage.EmbeddedConnection):
+        # Source tables only: the derived Postgres tables (form state,
+        # affinity, coverage) aren't kept offline, training rebuilds those
+        # features from the source rows
+        storage.load_frames(conn, tables, replace)
+        return
+
+    cur = conn.cursor()
+    pipeline_state.ensure_schema(cur)
+    seasons = sorted(int(s) for s in tables["f1_races"]["season"].unique())
+
+    for name, df in tables.items():
+        if replace:
+            cur.execute(f"DELETE FROM {name} WHERE season = ANY(%s)", (seasons,))
+
+        buf = io.StringIO()
+        df.to_csv(buf, index=False, header=False)
+        buf.seek(0)
+        cur.copy_expert(
+            f"COPY {name} ({', '.join(df.columns)}) FROM STDIN WITH (FORMAT csv)", buf
+        )
+        pipeline_state.mark_updated(cur, name)
+
+    pipeline_state.refresh_coverage(cur)
+    form_features.rebuild(conn)
+    circuit_affinity.update(cur)
+    conn.commit()
+    cur.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate synthetic F1 seasons for scaling runs")
+    parser.add_argument("--seasons", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=24)
+    parser.add_argument("--drivers", type=int, default=20)
+    parser.add_argument("--first-season", type=int, help=f"default: ends at {LAST_SEASON}")
+    parser.add_argument("--unraced-rounds", type=int, default=0,
+                        help="final rounds of the last season left without results")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out-dir", help="write one CSV per table instead of loading")
+    parser.add_argument("--replace", action="store_true",
+                        help="delete existing rows for the generated seasons first")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    tables = generate_tables(
+        args.seasons, args.rounds, args.drivers,
+        args.first_season, args.unraced_rounds, args.seed,
+    )
+    rows = sum(len(df) for df in tables.values())
+    log(f"🧬 Generated {rows:,} rows in {time.perf_counter() - start:.2f}s")
+
+    start = time.perf_counter()
+    if args.out_dir:
+        write_csv(tables, args.out_dir)
+        log(f"💾 CSVs written to {args.out_dir} in {time.perf_counter() - start:.2f}s")
+        return
+
+    import storage
+
+    conn = storage.connect()
+    try:
+        load_tables(conn, tables, args.replace)
+    finally:
+        conn.close()
+    log(f"✅ Loaded into {storage.backend_name(conn)} in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
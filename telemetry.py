@@ -0,0 +1,188 @@
+import os
+import sys
+import json
+import time
+import atexit
+import bisect
+import threading
+import functools
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import profiling
+
+# =====================================================
+# CONFIG
+# =====================================================
+# Shared logging and metrics for the pipeline scripts. Everything is kept
+# in-process; counters are a dict increment under one lock, so they are
+# safe to call from hot loops (prefer one count(n) per batch over n calls).
+JOB = os.getenv("F1_JOB") or os.path.splitext(os.path.basename(sys.argv[0] or "f1"))[0]
+
+# "json" = one object per line for log shippers; "text" = the plain messages.
+# Default: text on a terminal, JSON under cron/systemd.
+LOG_FORMAT = os.getenv("F1_LOG_FORMAT") or ("text" if sys.stdout.isatty() else "json")
+
+# File or directory for a Prometheus textfile (node-exporter textfile
+# collector); written when the process exits
+TEXTFILE = os.getenv("F1_METRICS_TEXTFILE")
+
+METRIC_PREFIX = "f1_"
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+# Span bookkeeping already present in the text message
+TEXT_HIDDEN_FIELDS = {"event", "span", "status", "duration_ms"}
+
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+_started = time.time()
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+# =====================================================
+# LOGGING
+# =====================================================
+def log(msg, **fields):
+    if LOG_FORMAT == "json":
+        record = {
+            "ts": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+            "job": JOB,
+            "msg": msg,
+            **fields,
+        }
+        print(json.dumps(record, default=str, ensure_ascii=False), flush=True)
+        return
+
+    extras = " ".join(f"{k}={v}" for k, v in fields.items() if k not in TEXT_HIDDEN_FIELDS)
+    print(f"{msg} ({extras})" if extras else msg, flush=True)
+
+
+# =====================================================
+# METRICS
+# =====================================================
+def count(name, value=1, **labels):
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name, value, **labels):
+    key = _key(name, labels)
+    slot = bisect.bisect_left(BUCKETS, value)
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = [0] * (len(BUCKETS) + 1) + [0.0]
+        hist[slot] += 1
+        hist[-1] += value
+
+
+@contextmanager
+def span(name, quiet=False, **labels):
+    # Times a block into the span_seconds histogram and logs it on exit;
+    # the yielded dict lets the block attach fields (rows=..., etc.)
+    fields = {}
+    status = "ok"
+    # No-op unless F1_PROFILE is set (see profiling.py)
+    profile = profiling.start(JOB, name) if profiling.MODES else None
+    start = time.perf_counter()
+    try:
+        yield fields
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        if profile:
+            fields["profile"] = profiling.stop(profile)
+        observe("span_seconds", elapsed, span=name, **labels)
+        if status == "error":
+            count("span_errors", span=name, **labels)
+        if not quiet or status == "error":
+            log(
+                f"⏱️ {name} {elapsed:.3f}s",
+                event="span", span=name, status=status,
+                duration_ms=round(elapsed * 1000, 3), **labels, **fields,
+            )
+
+
+def timed(name=None):
+    # Decorator form of span() for whole stages (importers, fit, ...)
+    def wrap(fn):
+        span_name = name or fn.__name__
+
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            with span(span_name):
+                return fn(*args, **kwargs)
+        return inner
+    return wrap
+
+
+# =====================================================
+# PROMETHEUS TEXTFILE
+# =====================================================
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(pairs, extra=()):
+    pairs = [("job", JOB)] + list(pairs) + list(extra)
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def render_prometheus():
+    with _lock:
+        counters = dict(_counters)
+        histograms = {k: list(v) for k, v in _histograms.items()}
+
+    lines = []
+
+    for name in sorted({n for n, _ in counters}):
+        metric = f"{METRIC_PREFIX}{name}_total"
+        lines.append(f"# TYPE {metric} counter")
+        for (n, pairs), value in sorted(counters.items()):
+            if n == name:
+                lines.append(f"{metric}{_labels(pairs)} {value}")
+
+    for name in sorted({n for n, _ in histograms}):
+        metric = f"{METRIC_PREFIX}{name}"
+        lines.append(f"# TYPE {metric} histogram")
+        for (n, pairs), hist in sorted(histograms.items()):
+            if n != name:
+                continue
+            cumulative = 0
+            for bound, hits in zip(BUCKETS + ("+Inf",), hist[:-1]):
+                cumulative += hits
+                lines.append(f"{metric}_bucket{_labels(pairs, [('le', bound)])} {cumulative}")
+            lines.append(f"{metric}_sum{_labels(pairs)} {hist[-1]:.6f}")
+            lines.append(f"{metric}_count{_labels(pairs)} {cumulative}")
+
+    lines.append(f"# TYPE {METRIC_PREFIX}last_run_timestamp_seconds gauge")
+    lines.append(f"{METRIC_PREFIX}last_run_timestamp_seconds{_labels([])} {time.time():.0f}")
+    lines.append(f"# TYPE {METRIC_PREFIX}run_duration_seconds gauge")
+    lines.append(f"{METRIC_PREFIX}run_duration_seconds{_labels([])} {time.time() - _started:.3f}")
+    return "\n".join(lines) + "\n"
+
+
+def write_textfile(path=None):
+    path = path or TEXTFILE
+    if not path:
+        return None
+    if os.path.isdir(path):
+        path = os.path.join(path, f"f1_{JOB}.prom")
+
+    # Write-then-rename so the collector never reads a half-written file
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        f.write(render_prometheus())
+    os.replace(tmp, path)
+    return path
+
+
+if TEXTFILE:
+    atexit.register(write_textfile)
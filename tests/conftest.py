@@ -0,0 +1,38 @@
+import os
+import sys
+import uuid
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Database tests run against TEST_DATABASE_URL (never DATABASE_URL), each in
+# a throwaway schema holding the source tables; skipped when it isn't set
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+
+
+@pytest.fixture
+def db():
+    if not TEST_DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL not set")
+
+    import psycopg2
+    import pipeline_state
+    import storage
+
+    schema = f"test_{uuid.uuid4().hex[:12]}"
+    conn = psycopg2.connect(TEST_DATABASE_URL)
+    cur = conn.cursor()
+    cur.execute(f"CREATE SCHEMA {schema}")
+    cur.execute(f"SET search_path TO {schema}")
+    cur.execute(storage.SOURCE_SCHEMA_DDL)
+    pipeline_state.ensure_schema(cur)
+    conn.commit()
+    try:
+        yield conn
+    finally:
+        conn.rollback()
+        cur = conn.cursor()
+        cur.execute(f"DROP SCHEMA {schema} CASCADE")
+        conn.commit()
+        conn.close()
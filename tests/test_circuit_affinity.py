@@ -0,0 +1,102 @@
+import numpy as np
+import pytest
+
+import circuit_affinity
+
+CIRCUITS = ["monza", "spa", "suzuka"]
+
+
+def season_rows(seasons=(2024, 2025), rounds=6, seed=0):
+    # Each circuit is visited twice a season; qualifying and DNFs on the side
+    rng = np.random.default_rng(seed)
+    teams = {"a": "red", "b": "red", "c": "blue", "d": "blue"}
+    races, results, qualifying, dnfs = [], [], [], []
+    for season in seasons:
+        for rnd in range(1, rounds + 1):
+            races.append((season, rnd, CIRCUITS[rnd % len(CIRCUITS)]))
+            for driver, team in teams.items():
+                dnf = rng.random() < 0.2
+                position = None if dnf else int(rng.integers(1, 21))
+                results.append((season, rnd, driver, team, position))
+                if rng.random() < 0.8:
+                    qualifying.append((season, rnd, driver, team, int(rng.integers(1, 21))))
+                if dnf:
+                    dnfs.append((season, rnd, driver, team))
+    return races, results, qualifying, dnfs
+
+
+def insert(cur, table, columns, rows):
+    from psycopg2.extras import execute_values
+
+    if rows:
+        execute_values(cur, f"INSERT INTO {table} ({columns}) VALUES %s", rows)
+
+
+def load(cur, races, results, qualifying, dnfs, keep=lambda season, rnd: True):
+    insert(cur, "f1_races", "season, round, circuit_name", [r for r in races if keep(*r[:2])])
+    insert(cur, "f1_race_results", "season, round, driver_id, team_id, position",
+           [r for r in results if keep(*r[:2])])
+    insert(cur, "f1_qualifying_results", "season, round, driver_id, team_id, grid_position",
+           [r for r in qualifying if keep(*r[:2])])
+    insert(cur, "f1_dnf", "season, round, driver_id, team_id", [r for r in dnfs if keep(*r[:2])])
+
+
+def snapshot(cur):
+    cur.execute("""
+        SELECT circuit_name, entity_type, entity_id, races, finish_sum, gain_sum, gain_count, dnfs
+        FROM f1_circuit_affinity ORDER BY 1, 2, 3
+    """)
+    return cur.fetchall()
+
+
+@pytest.fixture
+def expected(db):
+    cur = db.cursor()
+    load(cur, *season_rows())
+    circuit_affinity.rebuild(cur)
+    state = snapshot(cur)
+    for table in ("f1_races", "f1_race_results", "f1_qualifying_results", "f1_dnf"):
+        cur.execute(f"DELETE FROM {table}")
+    circuit_affinity.rebuild(cur)
+    return state
+
+
+def test_rounds_in_any_order_fold_to_the_rebuild(db, expected):
+    cur = db.cursor()
+    data = season_rows()
+
+    load(cur, *data, keep=lambda season, rnd: season == 2025)
+    assert circuit_affinity.update(cur) == 6
+    load(cur, *data, keep=lambda season, rnd: season == 2024)
+    assert circuit_affinity.update(cur) == 6
+    assert circuit_affinity.update(cur) == 0
+    assert snapshot(cur) == expected
+
+
+def test_partly_loaded_rounds_are_refolded(db, expected):
+    cur = db.cursor()
+    races, results, qualifying, dnfs = season_rows()
+    split = (2025, 3)
+
+    # Round 3 lands with half its results; the rest follow a run later
+    first = [r for r in results if r[:2] != split or r[2] in ("a", "b")]
+    load(cur, races, first, qualifying, dnfs)
+    circuit_affinity.update(cur)
+    assert snapshot(cur) != expected
+
+    insert(cur, "f1_race_results", "season, round, driver_id, team_id, position",
+           [r for r in results if r not in first])
+    # Every round at that circuit is refolded
+    assert circuit_affinity.update(cur) == 4
+    assert snapshot(cur) == expected
+
+
+def test_rounds_folded_without_counts_are_refolded_once(db, expected):
+    cur = db.cursor()
+    load(cur, *season_rows())
+    circuit_affinity.update(cur)
+    cur.execute("UPDATE f1_circuit_affinity_rounds SET results = NULL WHERE round = 1")
+
+    assert circuit_affinity.update(cur) == 4
+    assert circuit_affinity.update(cur) == 0
+    assert snapshot(cur) == expected
@@ -0,0 +1,39 @@
+import numpy as np
+
+import evaluate_model
+
+
+def season_data(seed=0):
+    rng = np.random.default_rng(seed)
+    season = np.repeat([2023, 2024, 2025], 100)
+    race = season * 100 + np.tile(np.repeat(np.arange(5), 20), 3)
+    X = rng.standard_normal((300, 3))
+    X[rng.random(X.shape) < 0.2] = np.nan
+    y = np.tile(np.arange(1, 21), 15).astype(np.float64)
+    return X, y, season, race
+
+
+def test_fold_medians_ignore_the_test_rows():
+    X, _, season, _ = season_data()
+    X[:, 2] = np.nan
+    train, _ = evaluate_model.fold_masks(season, ("loso", 2025))
+
+    medians = evaluate_model.fold_medians(X, train)
+    np.testing.assert_array_equal(medians[:2], np.nanmedian(X[train][:, :2], axis=0))
+    assert medians[2] == 0
+
+
+def test_held_out_season_does_not_shape_the_fold():
+    X, y, season, race = season_data()
+    train, test = evaluate_model.fold_masks(season, ("loso", 2025))
+    params = {"n_estimators": 10, "n_jobs": 1}
+    model, _ = evaluate_model.score_split("rf", params, X, y, race, train, test)
+
+    # Shift every held-out value: the fitted model must not move
+    shifted = X.copy()
+    shifted[test] += 100
+    other, _ = evaluate_model.score_split("rf", params, shifted, y, race, train, test)
+
+    probe = np.nan_to_num(X[train])
+    np.testing.assert_array_equal(model.predict(probe), other.predict(probe))
+    assert np.isnan(X).any()
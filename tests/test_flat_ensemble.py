@@ -0,0 +1,98 @@
+import numpy as np
+import pytest
+
+import flat_ensemble
+import model_backends
+
+
+def data(n=400, n_features=6, seed=0, nan_share=0.0):
+    rng = np.random.default_rng(seed)
+    X = rng.standard_normal((n, n_features))
+    y = 3 * X[:, 0] - X[:, 1] * X[:, 2] + rng.standard_normal(n)
+    if nan_share:
+        X[rng.random(X.shape) < nan_share] = np.nan
+    return X, y
+
+
+def fitted(backend, X, y, **params):
+    return model_backends.fit(backend, X, y, np.zeros(len(X)), **params)
+
+
+@pytest.mark.parametrize("backend, params", [
+    ("rf", {"n_estimators": 30, "n_jobs": 1}),
+    ("rf", {"n_estimators": 30, "max_depth": 4, "n_jobs": 1}),
+    ("hgb", {"max_iter": 40}),
+])
+def test_predictions_match_sklearn_exactly(backend, params):
+    X, y = data()
+    # n_jobs=1: sklearn then sums the trees in order, as the flat copy does
+    model = fitted(backend, X, y, **params)
+    flat = flat_ensemble.compile_model(model)
+
+    X_new, _ = data(n=257, seed=1)
+    for rows in (X_new[:1], X_new[:20], X_new):
+        assert np.array_equal(flat_ensemble.predict(flat, rows), model.predict(rows))
+
+
+@pytest.mark.parametrize("backend", ["rf", "hgb"])
+def test_missing_values_follow_sklearn(backend):
+    X, y = data(nan_share=0.1)
+    model = fitted(backend, X, y, **({"n_estimators": 20, "n_jobs": 1} if backend == "rf" else {"max_iter": 30}))
+    flat = flat_ensemble.compile_model(model)
+
+    X_new, _ = data(n=200, seed=2, nan_share=0.2)
+    assert np.array_equal(flat_ensemble.predict(flat, X_new), model.predict(X_new))
+
+
+def test_tree_values_are_the_per_tree_predictions():
+    X, y = data()
+    model = fitted("rf", X, y, n_estimators=10)
+    flat = flat_ensemble.compile_model(model)
+
+    values = flat_ensemble.tree_values(flat, X[:50])
+    expected = np.stack([tree.predict(X[:50].astype(np.float32)) for tree in model.estimators_], axis=1)
+    assert values.shape == (50, 10)
+    assert np.array_equal(values, expected)
+
+
+def test_unsupported_models_are_left_to_sklearn():
+    from sklearn.linear_model import LinearRegression
+
+    X, y = data()
+    assert flat_ensemble.compile_model(LinearRegression().fit(X, y)) is None
+    two_outputs = fitted("rf", X, np.c_[y, -y], n_estimators=5)
+    assert flat_ensemble.compile_model(two_outputs) is None
+
+
+# =====================================================
+# PATH CONTRIBUTIONS
+# =====================================================
+@pytest.mark.parametrize("nan_share", [0.0, 0.1])
+def test_contributions_sum_to_the_prediction(nan_share):
+    X, y = data(nan_share=nan_share)
+    model = fitted("rf", X, y, n_estimators=25, n_jobs=1)
+    flat = flat_ensemble.compile_model(model)
+
+    bias, contrib = flat_ensemble.contributions(flat, X[:60])
+    assert contrib.shape == (60, X.shape[1])
+    np.testing.assert_allclose(bias + contrib.sum(axis=1), model.predict(X[:60]), rtol=0, atol=1e-9)
+
+
+def test_contributions_credit_only_the_features_split_on():
+    rng = np.random.default_rng(3)
+    X = rng.standard_normal((300, 4))
+    y = 5 * X[:, 2]
+    model = fitted("rf", X, y, n_estimators=10, n_jobs=1, max_features=None, max_depth=3)
+    flat = flat_ensemble.compile_model(model)
+
+    bias, contrib = flat_ensemble.contributions(flat, X[:20])
+    assert bias == pytest.approx(np.mean([t.tree_.value[0, 0, 0] for t in model.estimators_]))
+    assert np.abs(contrib[:, [0, 1, 3]]).max() == 0
+    assert np.sign(contrib[:, 2]).tolist() == np.sign(model.predict(X[:20]) - bias).tolist()
+
+
+def test_contributions_need_a_forest():
+    X, y = data()
+    flat = flat_ensemble.compile_model(fitted("hgb", X, y, max_iter=5))
+    with pytest.raises(ValueError):
+        flat_ensemble.contributions(flat, X[:5])
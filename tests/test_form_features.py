@@ -0,0 +1,173 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import form_features
+from form_features import DNF_FINISH, FORM_WINDOW, RELIABILITY_WINDOW
+
+
+def results_frame(n_rounds=14, seed=0):
+    # Two teams of two over one season and the start of the next; every
+    # driver misses a few rounds so windows and team means differ
+    rng = np.random.default_rng(seed)
+    teams = {"a": "red", "b": "red", "c": "blue", "d": "blue"}
+    rows = []
+    for i in range(n_rounds):
+        season, rnd = (2024, i + 1) if i < 10 else (2025, i - 9)
+        for driver, team in teams.items():
+            if rng.random() < 0.15:
+                continue
+            dnf = rng.random() < 0.2
+            position = None if dnf else int(rng.integers(1, 21))
+            points = None if rng.random() < 0.3 else float(rng.integers(0, 26))
+            rows.append((season, rnd, driver, team, position, points, dnf))
+    return pd.DataFrame(rows, columns=["season", "round", "driver_id", "team_id", "position", "points", "dnf"])
+
+
+def naive_stats(results):
+    # Straightforward per-entity replay with result_values/window_stats
+    history, out = {}, {}
+    for (season, rnd), race in results.groupby(["season", "round"], sort=True):
+        values = {
+            row.driver_id: (row.team_id, form_features.result_values(
+                None if pd.isna(row.position) else int(row.position),
+                None if pd.isna(row.points) else row.points,
+                row.dnf,
+            ))
+            for row in race.itertuples()
+        }
+        teams = {}
+        for team, v in values.values():
+            teams.setdefault(team, []).append(v)
+        current = {("driver", d): v for d, (_, v) in values.items()}
+        current.update({
+            ("team", t): (np.mean([v[0] for v in vs]), sum(v[1] for v in vs), np.mean([v[2] for v in vs]))
+            for t, vs in teams.items()
+        })
+        for key, v in current.items():
+            past = history.setdefault(key, [])
+            out[(season, rnd, *key)] = (len(past), form_features.window_stats(*map(list, zip(*past))) if past
+                                        else form_features.window_stats([], [], []))
+            past.append(v)
+    return out
+
+
+def test_result_values():
+    assert form_features.result_values(3, None, False) == (3.0, 15.0, 0.0)
+    assert form_features.result_values(11, None, False) == (11.0, 0.0, 0.0)
+    assert form_features.result_values(None, None, True) == (float(DNF_FINISH), 0.0, 1.0)
+    assert form_features.result_values(1, 4.5, False) == (1.0, 4.5, 0.0)
+
+
+def test_window_stats_use_each_window():
+    finishes = [float(f) for f in range(1, 13)]
+    dnfs = [1.0] * 2 + [0.0] * 10
+    stats = form_features.window_stats(finishes, finishes, dnfs)
+    assert stats["form_finish"] == np.mean(finishes[-FORM_WINDOW:])
+    assert stats["form_points"] == np.mean(finishes[-FORM_WINDOW:])
+    assert stats["dnf_rate"] == np.mean(dnfs[-RELIABILITY_WINDOW:])
+    assert form_features.window_stats([], [], []) == {
+        "form_finish": None, "form_points": None, "dnf_rate": None,
+    }
+
+
+def test_pre_race_stats_match_a_naive_replay():
+    results = results_frame()
+    stats = form_features.pre_race_stats(form_features.round_values(results))
+    expected = naive_stats(results)
+
+    assert len(stats) == len(expected)
+    for row in stats.itertuples():
+        races, want = expected[(row.season, row.round, row.entity_type, row.entity_id)]
+        assert row.races == races
+        for column, value in want.items():
+            got = getattr(row, column)
+            if value is None:
+                assert np.isnan(got)
+            else:
+                assert got == pytest.approx(value)
+
+
+def test_first_appearance_has_no_form():
+    features = form_features.history_features(results_frame())
+    first = features.groupby("driver_id").head(1)
+    assert first[["driver_form_finish", "driver_form_points", "driver_dnf_rate"]].isna().all().all()
+
+
+# =====================================================
+# INCREMENTAL UPDATE (DATABASE)
+# =====================================================
+def insert_results(cur, results):
+    from psycopg2.extras import execute_values
+
+    execute_values(cur, """
+        INSERT INTO f1_race_results (season, round, driver_id, team_id, position, points)
+        VALUES %s
+    """, [
+        (r.season, r.round, r.driver_id, r.team_id,
+         None if pd.isna(r.position) else int(r.position),
+         None if pd.isna(r.points) else r.points)
+        for r in results.itertuples()
+    ])
+    dnfs = results[results["dnf"]]
+    if len(dnfs):
+        execute_values(cur, "INSERT INTO f1_dnf (season, round, driver_id, team_id) VALUES %s",
+                       list(dnfs[["season", "round", "driver_id", "team_id"]].itertuples(index=False)))
+
+
+def snapshot(cur):
+    cur.execute("SELECT * FROM f1_form_features ORDER BY 1, 2, 3, 4")
+    features = cur.fetchall()
+    cur.execute("SELECT entity_type, entity_id, last_season, last_round, races, finishes, points, dnfs "
+                "FROM f1_form_state ORDER BY 1, 2")
+    return features, cur.fetchall()
+
+
+def rebuilt(db, results):
+    cur = db.cursor()
+    insert_results(cur, results)
+    form_features.rebuild(db)
+    state = snapshot(cur)
+    cur.execute("DELETE FROM f1_race_results")
+    cur.execute("DELETE FROM f1_dnf")
+    form_features.rebuild(db)
+    return state
+
+
+def test_in_order_rounds_fold_incrementally(db):
+    results = results_frame()
+    expected = rebuilt(db, results)
+    cur = db.cursor()
+
+    for _, race in results.groupby(["season", "round"], sort=True):
+        insert_results(cur, race)
+        assert form_features.update(cur) == len(race)
+    assert form_features.update(cur) == 0
+    assert snapshot(cur) == expected
+
+
+def test_late_and_partial_rounds_are_not_lost(db):
+    results = results_frame()
+    expected = rebuilt(db, results)
+    cur = db.cursor()
+    key = list(zip(results["season"], results["round"]))
+    late, split = (2024, 4), (2024, 7)
+
+    # Round 4 fails to fetch and is retried after round 5 landed
+    insert_results(cur, results[[k < late for k in key]])
+    form_features.update(cur)
+    insert_results(cur, results[[late < k < split for k in key]])
+    form_features.update(cur)
+    insert_results(cur, results[[k == late for k in key]])
+    form_features.update(cur)
+
+    # Round 7 arrives in two batches
+    part = results[[k == split for k in key]]
+    insert_results(cur, part.head(2))
+    form_features.update(cur)
+    insert_results(cur, part.iloc[2:])
+    form_features.update(cur)
+
+    insert_results(cur, results[[k > split for k in key]])
+    form_features.update(cur)
+    assert snapshot(cur) == expected
@@ -0,0 +1,65 @@
+import json
+import threading
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import model_backends
+import prediction_server
+
+FEATURES = ["grid_position", "driver_form_finish", "team_form_points"]
+
+
+@pytest.fixture
+def server(tmp_path):
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame(rng.uniform(1, 20, (400, len(FEATURES))), columns=FEATURES)
+    y = X["grid_position"] + rng.standard_normal(400)
+    model = model_backends.fit("rf", X, y, np.zeros(len(X)), n_estimators=20)
+    path = tmp_path / "model.pkl"
+    model_backends.save_artifact(model_backends.make_artifact("rf", model, FEATURES, X.median()), path)
+
+    model = prediction_server.LoadedModel(path)
+    batcher = prediction_server.MicroBatcher(model)
+    stats = prediction_server.LatencyStats()
+    server = prediction_server.PredictionServer(
+        ("127.0.0.1", 0), prediction_server.make_handler(model, batcher, stats)
+    )
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def post(url, drivers):
+    request = urllib.request.Request(
+        url, data=json.dumps(drivers).encode(), headers={"Content-Type": "application/json"}
+    )
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return response.status, json.loads(response.read())
+
+
+def test_listen_backlog_is_raised():
+    assert prediction_server.BACKLOG >= 128
+
+
+def test_concurrent_clients_all_get_answers(server):
+    url = f"http://127.0.0.1:{server.server_address[1]}/predict"
+    clients = 64
+    start = threading.Barrier(clients)
+
+    def client(i):
+        drivers = [{"driver_id": f"d{j}", "grid_position": j + 1, "driver_form_finish": i % 20}
+                   for j in range(20)]
+        start.wait()
+        return post(url, drivers)
+
+    with ThreadPoolExecutor(clients) as pool:
+        replies = list(pool.map(client, range(clients)))
+
+    assert [status for status, _ in replies] == [200] * clients
+    for _, body in replies:
+        assert sorted(p["predicted_position"] for p in body["predictions"]) == list(range(1, 21))
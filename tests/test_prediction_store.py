@@ -0,0 +1,77 @@
+import pandas as pd
+import pytest
+
+import prediction_store
+
+
+@pytest.fixture
+def cur(db):
+    cur = db.cursor()
+    # Created by the deployment; the store only adds columns to it
+    cur.execute("""
+        CREATE TABLE f1_predictions (
+            season INT, round INT, race_id TEXT, driver_id TEXT, team_id TEXT,
+            predicted_position INT, predicted_points DOUBLE PRECISION,
+            created_at TIMESTAMPTZ DEFAULT NOW(),
+            PRIMARY KEY (season, round, driver_id)
+        )
+    """)
+    prediction_store.ensure_schema(cur)
+    return cur
+
+
+def probabilities(rows):
+    df = pd.DataFrame(rows, columns=["round", "driver_id", "p_win"])
+    return df.assign(
+        season=2026, race_id=df["round"].map(lambda r: f"2026_{r:02d}"), team_id="t",
+        p_podium=df["p_win"] * 2, expected_points=df["p_win"] * 25, n_sims=1000,
+    )
+
+
+def stored(cur):
+    cur.execute("SELECT round, driver_id, p_win, prediction_run_id FROM f1_race_probabilities ORDER BY 1, 2")
+    return cur.fetchall()
+
+
+def test_only_changed_rounds_are_rewritten(cur):
+    season = [(1, "a", 0.6), (1, "b", 0.4), (2, "a", 0.5), (2, "b", 0.5)]
+    rounds, written, removed = prediction_store.upsert_rounds(
+        cur, "f1_race_probabilities", probabilities(season), run_id=1
+    )
+    assert (rounds, written, removed) == ([(2026, 1), (2026, 2)], 4, 0)
+
+    # Same values again: nothing to do
+    assert prediction_store.upsert_rounds(
+        cur, "f1_race_probabilities", probabilities(season), run_id=2
+    ) == ([], 0, 0)
+
+    # One value in round 2 moves: the whole round is rewritten, round 1 stays
+    season[3] = (2, "b", 0.45)
+    assert prediction_store.upsert_rounds(
+        cur, "f1_race_probabilities", probabilities(season), run_id=3
+    ) == ([(2026, 2)], 2, 0)
+    assert stored(cur) == [(1, "a", 0.6, 1), (1, "b", 0.4, 1), (2, "a", 0.5, 3), (2, "b", 0.45, 3)]
+
+
+def test_drivers_missing_from_a_round_are_removed(cur):
+    prediction_store.upsert_rounds(cur, "f1_race_probabilities", probabilities([
+        (1, "a", 0.5), (1, "b", 0.3), (1, "c", 0.2), (2, "a", 1.0),
+    ]), run_id=1)
+
+    rounds, written, removed = prediction_store.upsert_rounds(cur, "f1_race_probabilities", probabilities([
+        (1, "a", 0.5), (1, "b", 0.3), (2, "a", 1.0),
+    ]), run_id=2)
+    assert (rounds, removed) == ([(2026, 1)], 1)
+    assert [row[:2] for row in stored(cur)] == [(1, "a"), (1, "b"), (2, "a")]
+
+
+def test_nulls_compare_equal(cur):
+    df = probabilities([(1, "a", 0.5)]).assign(team_id=None, n_sims=None)
+    prediction_store.upsert_rounds(cur, "f1_race_probabilities", df, run_id=1)
+    assert prediction_store.upsert_rounds(cur, "f1_race_probabilities", df, run_id=2) == ([], 0, 0)
+
+
+def test_empty_frame(cur):
+    assert prediction_store.upsert_rounds(
+        cur, "f1_race_probabilities", probabilities([]), run_id=1
+    ) == ([], 0, 0)
@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+
+from race_ranking import rank_within_races
+
+
+def frame(rows):
+    return pd.DataFrame(rows, columns=["season", "round", "driver_id", "predicted_score", "grid_position"])
+
+
+def test_ranks_by_score_within_each_race():
+    df = frame([
+        (2025, 1, "a", 3.0, 1),
+        (2025, 1, "b", 1.0, 2),
+        (2025, 1, "c", 2.0, 3),
+        (2025, 2, "a", 0.5, 3),
+        (2025, 2, "b", 2.5, 1),
+    ])
+    assert rank_within_races(df).tolist() == [3, 1, 2, 1, 2]
+
+
+def test_ties_go_to_grid_then_driver_id():
+    df = frame([
+        (2025, 1, "c", 1.0, 5),
+        (2025, 1, "b", 1.0, 2),
+        (2025, 1, "a", 1.0, 5),
+        (2025, 1, "d", 1.0, None),
+    ])
+    # b has the better grid slot; a and c share grid 5; no grid goes last
+    assert rank_within_races(df).tolist() == [3, 1, 2, 4]
+
+
+def test_every_race_gets_a_unique_order():
+    rng = np.random.default_rng(0)
+    df = frame([
+        (2025, rnd, f"d{i}", float(rng.integers(0, 3)), int(rng.integers(1, 6)))
+        for rnd in range(1, 6)
+        for i in range(20)
+    ]).sample(frac=1, random_state=0)
+
+    ranks = rank_within_races(df)
+    assert ranks.index.equals(df.index)
+    for _, group in ranks.groupby([df["season"], df["round"]]):
+        assert sorted(group) == list(range(1, 21))
+
+
+def test_custom_columns():
+    df = pd.DataFrame({
+        "season": [2025] * 3, "round": [1] * 3, "driver_id": ["a", "b", "c"],
+        "score": [2.0, 2.0, 1.0], "qualy": ["7", "x", "3"],
+    })
+    # Non-numeric tiebreaks count as missing
+    assert rank_within_races(df, "score", "qualy").tolist() == [2, 3, 1]
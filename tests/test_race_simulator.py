@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+
+import flat_ensemble
+import model_backends
+import race_simulator
+
+
+def boosting_artifact():
+    # Two feature values that only float64 tells apart; the split between
+    # them decides the prediction
+    low, high = 1.0, 1.0 + 1e-9
+    assert np.float32(low) == np.float32(high)
+    X = np.repeat([[low], [high]], 100, axis=0)
+    y = np.repeat([2.0, 15.0], 100)
+    model = model_backends.fit("hgb", X, y, np.zeros(len(X)), max_iter=20)
+    artifact = model_backends.make_artifact("hgb", model, ["x"], {}, residual_std=1.5)
+    artifact["flat"] = flat_ensemble.compile_model(model)
+    return artifact, high
+
+
+@pytest.mark.parametrize("rows", [2, model_backends.FLAT_MAX_ROWS + 1])
+def test_boosting_samples_centre_on_the_stored_prediction(rows):
+    artifact, high = boosting_artifact()
+    X = np.full((rows, 1), high)
+    races = np.zeros(rows)
+
+    point = model_backends.predict_positions("hgb", artifact["model"], X, races, artifact["flat"])
+    assert point[0] > 10
+    samples = race_simulator.predictive_samples(artifact, X, races)
+    offsets = np.random.default_rng(race_simulator.SEED).standard_normal((64, 1)) * 1.5
+    np.testing.assert_array_equal(samples, point[None, :] + offsets)
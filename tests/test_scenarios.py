@@ -0,0 +1,53 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import flat_ensemble
+import model_backends
+import scenarios
+
+FEATURES = ["grid_position", "fp3_time", "driver_form_finish"]
+
+
+def artifact(backend):
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame({
+        "grid_position": rng.integers(1, 21, 400).astype(float),
+        "fp3_time": rng.normal(90, 1, 400),
+        "driver_form_finish": rng.uniform(1, 20, 400),
+    })
+    y = X["grid_position"] + rng.standard_normal(400)
+    params = {"n_estimators": 20, "n_jobs": 1} if backend == "rf" else {"max_iter": 30}
+    model = model_backends.fit(backend, X, y, np.zeros(len(X)), **params)
+    out = model_backends.make_artifact(backend, model, FEATURES, X.median(), residual_std=2.0)
+    out["flat"] = flat_ensemble.compile_model(model)
+    return out
+
+
+def round_frame():
+    drivers = [f"d{i:02d}" for i in range(20)]
+    return pd.DataFrame({
+        "driver_id": drivers,
+        "team_id": [f"t{i // 2}" for i in range(20)],
+        "grid_position": np.arange(1, 21, dtype=float),
+        "fp3_time": np.linspace(89, 91, 20),
+        "driver_form_finish": np.linspace(2, 18, 20),
+    })
+
+
+@pytest.mark.parametrize("backend", ["rf", "hgb"])
+def test_large_sweeps_score_without_feature_name_warnings(backend):
+    art, df = artifact(backend), round_frame()
+    sweep = scenarios.grid_drop_sweep(df["driver_id"].tolist(), [3, 10, "back"])
+    assert (len(sweep) + 1) * len(df) > model_backends.FLAT_MAX_ROWS
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        out = scenarios.evaluate(art, df, sweep, n_sims=200)
+
+    # The baseline scores the same through sklearn as through the flat copy
+    small = scenarios.evaluate(art, df, [], n_sims=0)
+    baseline = out[out["scenario"] == out["scenario"].iloc[0]]
+    np.testing.assert_array_equal(baseline["predicted_score"], small["predicted_score"])
@@ -0,0 +1,121 @@
+import validation
+
+SESSION = {"season": 2025, "round": 3, "race_id": "2025_03", "team_id": "mclaren"}
+
+
+def result(driver_id, **values):
+    row = {**SESSION, "driver_id": driver_id, "position": 1, "grid": 1, "points": 25,
+           "race_time": "1:31:44.742", "status": ""}
+    row.update(values)
+    return row
+
+
+def reasons(table, rows):
+    return list(validation.normalize(table, rows)[1])
+
+
+def test_race_time_formats():
+    rows = [
+        result("a", race_time="1:31:44.742"),
+        result("b", race_time="+5.123"),
+        result("c", race_time="+1:02.345s"),
+        result("d", race_time="+1 Lap"),
+        result("e", race_time="+2 LAPS"),
+        result("f", race_time="+3 laps"),
+        result("g", race_time=None),
+    ]
+    assert reasons("f1_race_results", rows) == [""] * len(rows)
+    assert reasons("f1_race_results", [result("x", race_time="+1 lapz")]) == ["bad race_time"]
+
+
+def test_half_points_are_accepted():
+    frame, bad = validation.normalize("f1_race_results", [
+        result("a", points="4.5"), result("b", points=0.5), result("c", points=None),
+    ])
+    assert list(bad) == ["", "", ""]
+    assert frame["points"].tolist()[:2] == [4.5, 0.5]
+
+
+def test_points_must_be_a_number_in_range():
+    rows = [result("a", points="-1"), result("b", points="51"), result("c", points="x")]
+    assert reasons("f1_race_results", rows) == [
+        "points out of range", "points out of range", "bad points",
+    ]
+
+
+def test_int_columns():
+    rows = [
+        result("a", position="3", grid="0"),
+        result("b", position="NC"),
+        result("c", position="2.5"),
+        result("d", grid=31),
+    ]
+    frame, bad = validation.normalize("f1_race_results", rows)
+    assert list(bad) == ["", "", "bad position", "grid out of range"]
+    assert frame["position"][0] == 3 and frame["position"].isna().tolist() == [False, True, True, False]
+    assert str(frame["position"].dtype) == "Int64"
+
+
+def test_missing_keys_and_duplicates():
+    rows = [
+        {**SESSION, "driver_id": "a", "best_time": "1:29.708"},
+        {**SESSION, "driver_id": "a", "best_time": "1:29.900"},
+        {**SESSION, "driver_id": None, "best_time": "1:30.000"},
+        {**SESSION, "driver_id": "b", "best_time": "1:30"},
+    ]
+    assert reasons("f1_fp1_results", rows) == [
+        "", "duplicate driver", "missing season/round/driver_id", "bad best_time",
+    ]
+
+
+def test_reasons_accumulate():
+    row = {**SESSION, "round": 0, "driver_id": "a", "q1": "slow", "q2": None, "q3": None,
+           "grid_position": 40}
+    assert reasons("f1_qualifying_results", [row]) == [
+        "round out of range; bad q1; grid_position out of range",
+    ]
+
+
+def test_prepare_splits_accepted_and_rejected():
+    rows = [result("a"), result("b", position="x"), result("a", points=18)]
+    batch = validation.prepare("f1_race_results", rows)
+
+    assert batch["table"] == "f1_race_results"
+    assert batch["accepted"] == [
+        (2025, 3, "2025_03", "a", "mclaren", 1, 1, 25.0, "1:31:44.742", None),
+    ]
+    assert [(row["driver_id"], key, reason) for row, key, reason in batch["rejected"]] == [
+        ("b", (2025, 3, "b"), "bad position"),
+        ("a", (2025, 3, "a"), "duplicate driver"),
+    ]
+
+
+def test_prepare_empty_batch():
+    assert validation.prepare("f1_dnf", []) == {"table": "f1_dnf", "accepted": [], "rejected": []}
+
+
+def test_by_round_orders_rounds_with_unkeyed_rejects_last():
+    rows = [
+        {**SESSION, "round": 5, "driver_id": "a", "dnf_reason": "engine"},
+        {**SESSION, "round": 2, "driver_id": "b", "dnf_reason": "gearbox"},
+        {**SESSION, "round": None, "driver_id": "c", "dnf_reason": "brakes"},
+        {**SESSION, "round": 2, "driver_id": "b", "dnf_reason": "gearbox"},
+    ]
+    rounds = validation.by_round(validation.prepare("f1_dnf", rows))
+
+    assert list(rounds) == [2, 5, None]
+    assert [len(rounds[r]["accepted"]) for r in rounds] == [1, 1, 0]
+    assert [len(rounds[r]["rejected"]) for r in rounds] == [1, 0, 1]
+
+
+def test_write_inserts_clean_rows_and_quarantines_the_rest(db):
+    cur = db.cursor()
+    rows = [result("a"), result("b", position=2, race_time="+1 Lap", points=18),
+            result("c", grid="pit")]
+    assert validation.load(cur, "f1_race_results", rows, "test") == 2
+
+    cur.execute("SELECT driver_id, race_time FROM f1_race_results ORDER BY driver_id")
+    assert cur.fetchall() == [("a", "1:31:44.742"), ("b", "+1 Lap")]
+    cur.execute("SELECT table_name, source, season, round, driver_id, reason, payload->>'grid' "
+                "FROM f1_quarantine")
+    assert cur.fetchall() == [("f1_race_results", "test", 2025, 3, "c", "bad grid", "pit")]
@@ -1,94 +1,19 @@
 import os
-import psycopg2
-import pandas as pd
-import joblib
-from sklearn.ensemble import RandomForestRegressor
+import sys
+import argparse
+
+import circuit_affinity
+import form_features
+import model_backends
+import telemetry
 
 # =====================================================
 # CONFIG
 # =====================================================
 DATABASE_URL = os.getenv("DATABASE_URL")
 MODEL_PATH = "model.pkl"
-
-if not DATABASE_URL:
-    raise RuntimeError("DATABASE_URL not set")
-
-print("🚀 TRAINING STARTED")
-
-# =====================================================
-# DB CONNECT
-# =====================================================
-conn = psycopg2.connect(DATABASE_URL)
-
-# =====================================================
-# LOAD SOURCE DATA (NO FEATURE TABLES)
-# =====================================================
-race = pd.read_sql("""
-SELECT
-    season,
-    round,
-    race_id,
-    driver_id,
-    team_id,
-    position AS race_position,
-    points   AS race_points
-FROM f1_race_results
-WHERE season < 2026
-""", conn)
-
-qualy = pd.read_sql("""
-SELECT
-    season,
-    round,
-    driver_id,
-    grid_position,
-    q1, q2, q3
-FROM f1_qualifying_results
-""", conn)
-
-fp1 = pd.read_sql("""
-SELECT season, round, driver_id, best_time AS fp1_time
-FROM f1_fp1_results
-""", conn)
-
-fp2 = pd.read_sql("""
-SELECT season, round, driver_id, best_time AS fp2_time
-FROM f1_fp2_results
-""", conn)
-
-fp3 = pd.read_sql("""
-SELECT season, round, driver_id, best_time AS fp3_time
-FROM f1_fp3_results
-""", conn)
-
-sprint_q = pd.read_sql("""
-SELECT season, round, driver_id, grid_position AS sprint_grid
-FROM f1_sprint_qualy_results
-""", conn)
-
-sprint_r = pd.read_sql("""
-SELECT season, round, driver_id, position AS sprint_finish
-FROM f1_sprint_race_results
-""", conn)
-
-conn.close()
-
-print(f"📊 Race rows loaded: {len(race)}")
-
-# =====================================================
-# FEATURE BUILDING (IN PYTHON)
-# =====================================================
-df = (
-    race
-    .merge(qualy, on=["season", "round", "driver_id"], how="left")
-    .merge(fp1,   on=["season", "round", "driver_id"], how="left")
-    .merge(fp2,   on=["season", "round", "driver_id"], how="left")
-    .merge(fp3,   on=["season", "round", "driver_id"], how="left")
-    .merge(sprint_q, on=["season", "round", "driver_id"], how="left")
-    .merge(sprint_r, on=["season", "round", "driver_id"], how="left")
-)
-
-print("🧩 Feature table shape:", df.shape)
+MODEL_BACKEND = os.getenv("MODEL_BACKEND", model_backends.DEFAULT_BACKEND)
+TRAIN_BEFORE_SEASON = 2026
 
 # =====================================================
 # MODEL INPUTS
@@ -100,28 +25,199 @@ FEATURES = [
     "fp3_time",
     "sprint_grid",
     "sprint_finish",
+    *form_features.FORM_FEATURES,
+    *circuit_affinity.AFFINITY_FEATURES,
 ]
 
-X = df[FEATURES]
-y = df["race_position"]
+KEYS = ["season", "round", "driver_id"]
 
-# Ensure numeric only
-X = X.apply(pd.to_numeric, errors="coerce")
-
-# Fill missing numeric values safely
-X = X.fillna(X.median())
 
 # =====================================================
-# TRAIN MODEL
+# LOAD SOURCE DATA (NO FEATURE TABLES)
 # =====================================================
-model = RandomForestRegressor(
-    n_estimators=250,
-    random_state=42,
-    n_jobs=-1
-)
-
-model.fit(X, y)
+def load_training_frame(conn, before_season=TRAIN_BEFORE_SEASON):
+    import pandas as pd
+
+    race = pd.read_sql("""
+    SELECT
+        season,
+        round,
+        race_id,
+        driver_id,
+        team_id,
+        position AS race_position,
+        points   AS race_points
+    FROM f1_race_results
+    WHERE season < %(before_season)s
+    """, conn, params={"before_season": before_season})
+
+    qualy = pd.read_sql("""
+    SELECT
+        season,
+        round,
+        driver_id,
+        grid_position,
+        q1, q2, q3
+    FROM f1_qualifying_results
+    """, conn)
+
+    fp1 = pd.read_sql("""
+    SELECT season, round, driver_id, best_time AS fp1_time
+    FROM f1_fp1_results
+    """, conn)
+
+    fp2 = pd.read_sql("""
+    SELECT season, round, driver_id, best_time AS fp2_time
+    FROM f1_fp2_results
+    """, conn)
+
+    fp3 = pd.read_sql("""
+    SELECT season, round, driver_id, best_time AS fp3_time
+    FROM f1_fp3_results
+    """, conn)
+
+    sprint_q = pd.read_sql("""
+    SELECT season, round, driver_id, grid_position AS sprint_grid
+    FROM f1_sprint_qualy_results
+    """, conn)
+
+    sprint_r = pd.read_sql("""
+    SELECT season, round, driver_id, position AS sprint_finish
+    FROM f1_sprint_race_results
+    """, conn)
+
+    # Recent driver/team form going into each round
+    form = form_features.history_features(
+        form_features.load_results(conn, before_season)
+    ).drop(columns="team_id")
+
+    # How the driver/team had done at this circuit before
+    affinity = circuit_affinity.history_features(
+        circuit_affinity.load_observations(conn, before_season)
+    ).drop(columns="team_id")
+
+    telemetry.log(f"📊 Race rows loaded: {len(race)}")
+
+    # FEATURE BUILDING (IN PYTHON)
+    return (
+        race
+        .merge(qualy, on=KEYS, how="left")
+        .merge(fp1,   on=KEYS, how="left")
+        .merge(fp2,   on=KEYS, how="left")
+        .merge(fp3,   on=KEYS, how="left")
+        .merge(sprint_q, on=KEYS, how="left")
+        .merge(sprint_r, on=KEYS, how="left")
+        .merge(form,  on=KEYS, how="left")
+        .merge(affinity, on=KEYS, how="left")
+    )
+
+
+def prepare_features(df, medians=None, features=FEATURES):
+    import pandas as pd
+
+    # Ensure numeric only
+    X = df[features].apply(pd.to_numeric, errors="coerce")
+
+    # Fill missing numeric values safely (prediction reuses training medians);
+    # a column with no values at all falls back to 0
+    if medians is None:
+        medians = X.median().fillna(0)
+    X = X.fillna(pd.Series(medians, dtype="float64").reindex(features))
+
+    return X, medians
+
+
+def prepare_xy(df):
+    import pandas as pd
+
+    # Rows without a classified finish carry no target. Missing features
+    # stay NaN: cross-validation fills each fold from its own training rows.
+    y = pd.to_numeric(df["race_position"], errors="coerce")
+    X = df.loc[y.notna(), FEATURES].apply(pd.to_numeric, errors="coerce")
+    return X, y[y.notna()]
+
+
+def race_keys(df):
+    return (df["season"].astype("int64") * 100 + df["round"].astype("int64")).to_numpy()
+
+
+def residual_std(backend, X, y, races, seasons):
+    # Noise scale for models without per-tree spread, from out-of-fold
+    # residuals: one refit per held-out season (evaluate_model's
+    # leave-one-season-out folds), so whole races are always held out
+    import numpy as np
+    from evaluate_model import fold_masks, season_folds
+
+    folds = season_folds(seasons, "loso")
+    if len(folds) < 2:
+        return None
+
+    y = np.asarray(y, dtype=np.float64)
+    residuals = np.empty(len(y))
+    for fold in folds:
+        train, test = fold_masks(seasons, fold)
+        model = model_backends.fit(backend, X[train], y[train], races[train])
+        residuals[test] = y[test] - model_backends.predict_positions(backend, model, X[test], races[test])
+    return float(residuals.std(ddof=1))
 
-joblib.dump(model, MODEL_PATH)
 
-print(f"✅ MODEL TRAINED & SAVED → {MODEL_PATH}")
\ No newline at end of file
+# =====================================================
+# TRAIN MODEL
+# =====================================================
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train the race position model")
+    parser.add_argument(
+        "--backend", choices=sorted(model_backends.BACKENDS), default=MODEL_BACKEND
+    )
+    args = parser.parse_args(argv)
+
+    if not DATABASE_URL:
+        raise RuntimeError("DATABASE_URL not set")
+
+    # Deferred so --help and importers of this module's helpers start fast
+    import pandas as pd
+    import storage
+
+    telemetry.log(f"🚀 TRAINING STARTED ({args.backend})")
+
+    with telemetry.span("load_training_frame") as span:
+        conn = storage.connect(DATABASE_URL)
+        df = load_training_frame(conn)
+        conn.close()
+        span["rows"] = len(df)
+
+    telemetry.log(f"🧩 Feature table shape: {df.shape}")
+
+    with telemetry.span("prepare_features"):
+        y = pd.to_numeric(df["race_position"], errors="coerce")
+        df = df[y.notna()]
+        X, medians = prepare_features(df)
+
+        y = y[y.notna()]
+        races = race_keys(df)
+
+    with telemetry.span("fit", backend=args.backend) as span:
+        model = model_backends.fit(args.backend, X, y, races)
+        span["rows"] = len(X)
+
+    # Forests draw their spread from the trees; only the others need a scale
+    std = None
+    if not hasattr(model, "estimators_"):
+        with telemetry.span("residual_std", backend=args.backend) as span:
+            std = residual_std(args.backend, X, y, races, df["season"].to_numpy())
+            if std is None:
+                telemetry.log("⚠️ One season only; using in-sample residuals for the noise scale")
+                std = float((y - model_backends.predict_positions(args.backend, model, X, races)).std())
+            span["std"] = round(std, 3)
+
+    with telemetry.span("save_artifact"):
+        artifact = model_backends.make_artifact(
+            args.backend, model, FEATURES, medians, residual_std=std
+        )
+        model_backends.save_artifact(artifact, MODEL_PATH)
+
+    telemetry.log(f"✅ MODEL TRAINED & SAVED → {MODEL_PATH}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,228 @@
+import json
+
+import telemetry
+
+# =====================================================
+# CONFIG
+# =====================================================
+# Every ingest write goes through here: prepare() normalises a batch into
+# typed columns and checks it in bulk without touching the database, then
+# write() inserts only the clean rows (load() does both).
+# Rejected rows land in f1_quarantine with the reason and the original
+# payload, so one bad driver never fails (or retries) the whole load.
+# COLUMNS is the one column layout both auto_pipeline and backfill_season
+# write with.
+MAX_GRID = 30
+MAX_ROUNDS = 30
+MAX_POINTS = 50
+MAX_LAPS = 100
+
+SESSION = {
+    "season": "int", "round": "int", "race_id": "text",
+    "driver_id": "text", "team_id": "text",
+}
+
+COLUMNS = {
+    "f1_races": {
+        "race_id": "text", "season": "int", "round": "int", "race_name": "text",
+        "race_date": "date", "race_time": "clock",
+        "qualy_date": "date", "qualy_time": "clock",
+        "circuit_name": "text", "circuit_country": "text", "laps": "int",
+    },
+    "f1_fp1_results": {**SESSION, "best_time": "lap"},
+    "f1_fp2_results": {**SESSION, "best_time": "lap"},
+    "f1_fp3_results": {**SESSION, "best_time": "lap"},
+    "f1_qualifying_results": {
+        **SESSION, "q1": "lap", "q2": "lap", "q3": "lap", "grid_position": "int",
+    },
+    "f1_race_results": {
+        **SESSION, "position": "int", "grid": "int", "points": "number",
+        "race_time": "race_time", "status": "text",
+    },
+    "f1_dnf": {**SESSION, "dnf_reason": "text"},
+}
+
+# One row per key; a repeat in the same batch is quarantined
+KEYS = {table: ["season", "round", "driver_id"] for table in COLUMNS}
+KEYS["f1_races"] = ["season", "round"]
+
+RANGES = {
+    "round": (1, MAX_ROUNDS),
+    "laps": (1, MAX_LAPS),
+    "grid_position": (1, MAX_GRID),
+    "position": (1, MAX_GRID),
+    "grid": (0, MAX_GRID),       # 0 = pit lane start
+    "points": (0, MAX_POINTS),   # half points after shortened races
+}
+
+PATTERNS = {
+    "lap": r"(\d{1,2}:)?\d{1,2}\.\d{1,3}",                      # 1:29.708
+    "race_time": r"(?i)\d{1,2}:\d{2}:\d{2}\.\d{1,3}"            # winner's clock
+                 r"|\+\d+(:\d{2})?\.\d{1,3}s?"                   # +5.123
+                 r"|\+\d+ laps?",                               # +1 lap, +2 Laps
+    "date": r"\d{4}-\d{2}-\d{2}",
+    "clock": r"\d{2}:\d{2}(:\d{2}(\.\d+)?)?(Z|[+-]\d{2}:?\d{2})?",
+}
+
+# Unclassified results: stored as NULL rather than rejected
+NULL_MARKERS = {"", "-", "NC", "DNF", "DNS", "DSQ", "DQ", "EX", "WD", "R"}
+
+SCHEMA_DDL = """
+CREATE TABLE IF NOT EXISTS f1_quarantine (
+    id             BIGSERIAL PRIMARY KEY,
+    table_name     TEXT NOT NULL,
+    source         TEXT NOT NULL,
+    season         INT,
+    round          INT,
+    driver_id      TEXT,
+    reason         TEXT NOT NULL,
+    payload        JSONB NOT NULL,
+    quarantined_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS f1_quarantine_round_idx
+    ON f1_quarantine (table_name, season, round);
+"""
+
+
+def ensure_schema(cur):
+    cur.execute(SCHEMA_DDL)
+
+
+# =====================================================
+# NORMALISE + CHECK (VECTORIZED)
+# =====================================================
+def normalize(table, rows):
+    # rows: dicts keyed by COLUMNS[table]. Returns the typed frame and one
+    # reason string per row ("" = clean).
+    import numpy as np
+    import pandas as pd
+
+    types = COLUMNS[table]
+    raw = pd.DataFrame.from_records(rows, columns=list(types))
+    frame = pd.DataFrame(index=raw.index)
+    reasons = np.full(len(raw), "", dtype=object)
+
+    def reject(mask, reason):
+        mask = np.asarray(mask, dtype=bool)
+        reasons[mask] = np.where(reasons[mask] == "", reason, reasons[mask] + "; " + reason)
+
+    for column, kind in types.items():
+        text = raw[column].astype("string").str.strip()
+        present = (text.notna() & (text != "")).fillna(False)
+
+        if kind in ("int", "number"):
+            blank = ~present | text.str.upper().isin(NULL_MARKERS).fillna(False)
+            number = pd.to_numeric(text.where(~blank), errors="coerce").astype("Float64")
+            ok = number.notna() if kind == "number" else number == number.round()
+            ok = ok.fillna(False)
+            reject(~blank & ~ok, f"bad {column}")
+            frame[column] = number.where(ok) if kind == "number" else number.where(ok).astype("Int64")
+            if column in RANGES:
+                low, high = RANGES[column]
+                reject(((frame[column] < low) | (frame[column] > high)).fillna(False),
+                       f"{column} out of range")
+        elif kind == "text":
+            frame[column] = text.where(present)
+        else:
+            ok = text.str.fullmatch(PATTERNS[kind]).fillna(False)
+            reject(present & ~ok, f"bad {column}")
+            frame[column] = text.where(present & ok)
+
+    keys = KEYS[table]
+    reject(frame[keys].isna().any(axis=1), "missing " + "/".join(keys))
+
+    # Repeats of a key among otherwise clean rows; the first one is kept
+    clean = reasons == ""
+    repeat = frame[clean].duplicated(keys, keep="first").reindex(raw.index, fill_value=False)
+    reject(repeat, "duplicate " + ("driver" if "driver_id" in keys else "round"))
+
+    return frame, reasons
+
+
+def _records(frame):
+    # Plain Python values for psycopg2 (NA -> None, Int64 -> int)
+    out = frame.astype(object).where(frame.notna(), None)
+    return list(out.itertuples(index=False, name=None))
+
+
+def quarantine(cur, table, source, rows, keys, reasons):
+    # keys: typed (season, round, driver_id) per row, for lookups
+    from psycopg2.extras import execute_values
+
+    ensure_schema(cur)
+    execute_values(cur, """
+        INSERT INTO f1_quarantine
+        (table_name, source, season, round, driver_id, reason, payload)
+        VALUES %s
+    """, [
+        (table, source, *key, reason, json.dumps(row, default=str))
+        for row, key, reason in zip(rows, keys, reasons)
+    ], template="(%s,%s,%s,%s,%s,%s,%s::jsonb)")
+
+
+# =====================================================
+# LOAD
+# =====================================================
+def prepare(table, rows):
+    # The checks, with no database access, so writers can run them before
+    # opening a transaction. Returns the batch write() takes.
+    if not rows:
+        return {"table": table, "accepted": [], "rejected": []}
+
+    with telemetry.span("validate", quiet=True, table=table) as span:
+        frame, reasons = normalize(table, rows)
+        bad = reasons != ""
+        span["rows"] = len(rows)
+        span["rejected"] = int(bad.sum())
+
+    keys = _records(frame.reindex(columns=["season", "round", "driver_id"])[bad])
+    return {
+        "table": table,
+        "accepted": _records(frame[~bad]),
+        "rejected": list(zip([row for row, b in zip(rows, bad) if b], keys, reasons[bad])),
+    }
+
+
+def by_round(batch):
+    # Splits a prepared batch into one batch per round, in round order;
+    # rejects without a usable round come last under None
+    table = batch["table"]
+    at = list(COLUMNS[table]).index("round")
+    rounds = {}
+    for row in batch["accepted"]:
+        rounds.setdefault(row[at], {"table": table, "accepted": [], "rejected": []})["accepted"].append(row)
+    for item in batch["rejected"]:
+        rnd = item[1][1]
+        rounds.setdefault(rnd, {"table": table, "accepted": [], "rejected": []})["rejected"].append(item)
+    return dict(sorted(rounds.items(), key=lambda kv: (kv[0] is None, kv[0] or 0)))
+
+
+def write(cur, batch, source):
+    # Quarantines the rejects and inserts the rest in one statement.
+    # Returns the number of rows accepted.
+    import pipeline_state
+    from psycopg2.extras import execute_values
+
+    table, accepted, rejected = batch["table"], batch["accepted"], batch["rejected"]
+
+    if rejected:
+        rows, keys, reasons = zip(*rejected)
+        quarantine(cur, table, source, rows, keys, reasons)
+        telemetry.count("rows_quarantined", len(rejected), table=table)
+        telemetry.log(f"⚠️ {table}: {len(rejected)} rows quarantined (first: {reasons[0]})")
+
+    if accepted:
+        execute_values(cur, f"""
+            INSERT INTO {table} ({', '.join(COLUMNS[table])})
+            VALUES %s
+            ON CONFLICT DO NOTHING
+        """, accepted)
+        pipeline_state.mark_updated(cur, table)
+        telemetry.count("rows_written", len(accepted), table=table)
+
+    return len(accepted)
+
+
+def load(cur, table, rows, source):
+    return write(cur, prepare(table, rows), source)
@@ -0,0 +1,232 @@
+import os
+import sys
+import argparse
+from datetime import date, datetime, timezone
+
+import telemetry
+
+# =====================================================
+# CONFIG
+# =====================================================
+# Every Open-Meteo fetch is appended here whole, one row per
+# (circuit, forecast_time, target_date), and never updated or deleted.
+# f1_weather is derived from it: per race, the last forecast for race day
+# issued before the start. Completed races keep that row, so training
+# sees what was known beforehand, and --rebuild re-derives it without
+# re-fetching. The history is range-partitioned by month of forecast_time;
+# retention drops whole partitions instead of scanning with DELETE.
+DATABASE_URL = os.getenv("DATABASE_URL")
+
+# Months of forecast history kept; 0 = keep everything
+RETENTION_MONTHS = int(os.getenv("WEATHER_RETENTION_MONTHS", "24"))
+
+TABLE = "f1_weather_forecasts"
+
+SCHEMA_DDL = f"""
+CREATE TABLE IF NOT EXISTS {TABLE} (
+    circuit_name  TEXT NOT NULL,
+    forecast_time TIMESTAMPTZ NOT NULL,
+    target_date   DATE NOT NULL,
+    temp_max      REAL,
+    temp_min      REAL,
+    precipitation REAL,
+    wind_speed    REAL,
+    PRIMARY KEY (circuit_name, forecast_time, target_date)
+) PARTITION BY RANGE (forecast_time);
+"""
+
+# Open-Meteo daily series -> columns
+DAILY = {
+    "temperature_2m_max": "temp_max",
+    "temperature_2m_min": "temp_min",
+    "precipitation_sum": "precipitation",
+    "windspeed_10m_max": "wind_speed",
+}
+
+# Race-day forecast per race, upserted into f1_weather; forecasts issued
+# after lights out (or after midnight UTC if the start time is unknown)
+# are ignored
+RACE_WEATHER_SQL = f"""
+WITH latest AS (
+    SELECT DISTINCT ON (r.season, r.round)
+        r.season, r.round, r.race_id, f.target_date,
+        -- via numeric, so 14.3 stays 14.3 rather than 14.300000190734863
+        f.temp_max::numeric::float8      AS temp_max,
+        f.temp_min::numeric::float8      AS temp_min,
+        f.precipitation::numeric::float8 AS precipitation,
+        f.wind_speed::numeric::float8    AS wind_speed
+    FROM f1_races r
+    JOIN {TABLE} f
+      ON f.circuit_name = r.circuit_name
+     AND f.target_date  = r.race_date
+    WHERE f.forecast_time < (r.race_date + COALESCE(r.race_time::text::time, '00:00'))
+                            AT TIME ZONE 'UTC'
+      AND (%(season)s::int IS NULL OR r.season = %(season)s::int)
+      AND (%(round)s::int IS NULL OR r.round = %(round)s::int)
+    ORDER BY r.season, r.round, f.forecast_time DESC
+),
+upserted AS (
+    INSERT INTO f1_weather AS w
+    (season, round, race_id, weather_date,
+     temp_avg, temp_max, temp_min, precipitation, wind_speed)
+    SELECT season, round, race_id, target_date,
+           (temp_max + temp_min) / 2, temp_max, temp_min, precipitation, wind_speed
+    FROM latest
+    ON CONFLICT (season, round) DO UPDATE SET
+        race_id       = EXCLUDED.race_id,
+        weather_date  = EXCLUDED.weather_date,
+        temp_avg      = EXCLUDED.temp_avg,
+        temp_max      = EXCLUDED.temp_max,
+        temp_min      = EXCLUDED.temp_min,
+        precipitation = EXCLUDED.precipitation,
+        wind_speed    = EXCLUDED.wind_speed
+    WHERE (w.weather_date, w.temp_max, w.temp_min, w.precipitation, w.wind_speed)
+          IS DISTINCT FROM
+          (EXCLUDED.weather_date, EXCLUDED.temp_max, EXCLUDED.temp_min,
+           EXCLUDED.precipitation, EXCLUDED.wind_speed)
+    RETURNING 1
+)
+SELECT COUNT(*) FROM upserted
+"""
+
+
+def ensure_schema(cur):
+    cur.execute(SCHEMA_DDL)
+
+
+# =====================================================
+# PARTITIONS
+# =====================================================
+def _month(value):
+    return date(value.year, value.month, 1)
+
+
+def _next_month(month):
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f"{TABLE}_{month:%Y_%m}"
+
+
+def ensure_partitions(cur, times):
+    # One partition per calendar month (UTC) the forecast_times fall in.
+    # Creating a partition locks the parent, so writers call this up front,
+    # in its own short transaction.
+    ensure_schema(cur)
+    for month in sorted({_month(t) for t in times}):
+        cur.execute(f"""
+            CREATE TABLE IF NOT EXISTS {partition_name(month)}
+            PARTITION OF {TABLE}
+            FOR VALUES FROM ('{month} 00:00+00') TO ('{_next_month(month)} 00:00+00')
+        """)
+
+
+def partitions(cur):
+    # (month, name) of every partition, oldest first
+    cur.execute("""
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        JOIN pg_class p ON p.oid = i.inhparent
+        WHERE p.relname = %s
+    """, (TABLE,))
+    out = []
+    for (name,) in cur.fetchall():
+        year, month = name[len(TABLE) + 1:].split("_")
+        out.append((date(int(year), int(month), 1), name))
+    return sorted(out)
+
+
+def drop_expired(cur, keep_months=RETENTION_MONTHS, today=None):
+    # Drops the partitions that ended more than keep_months ago.
+    # f1_weather keeps its race-day rows. Returns the partitions dropped.
+    if keep_months <= 0:
+        return []
+
+    ensure_schema(cur)
+    today = today or datetime.now(timezone.utc).date()
+    index = today.year * 12 + today.month - 1 - keep_months
+    cutoff = date(index // 12, index % 12 + 1, 1)
+
+    dropped = []
+    for month, name in partitions(cur):
+        if _next_month(month) <= cutoff:
+            cur.execute(f"DROP TABLE {name}")
+            dropped.append(name)
+    if dropped:
+        telemetry.log(f"🧹 {TABLE}: dropped {len(dropped)} partitions before {cutoff}")
+    return dropped
+
+
+# =====================================================
+# WRITE
+# =====================================================
+def issue_time():
+    # Fetches within the same hour count as one forecast
+    return datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def record(cur, circuit, forecast_time, daily):
+    # daily: Open-Meteo's "daily" block. Appends one row per target date
+    # and returns how many were new.
+    from psycopg2.extras import execute_values
+
+    targets = daily.get("time") or []
+    series = [daily.get(key) or [None] * len(targets) for key in DAILY]
+    rows = [(circuit, forecast_time, target, *values) for target, *values in zip(targets, *series)]
+    if not rows:
+        return 0
+
+    written = execute_values(cur, f"""
+        INSERT INTO {TABLE}
+        (circuit_name, forecast_time, target_date, {', '.join(DAILY.values())})
+        VALUES %s
+        ON CONFLICT DO NOTHING
+        RETURNING 1
+    """, rows, fetch=True)
+    if written:
+        telemetry.count("rows_written", len(written), table=TABLE)
+    return len(written)
+
+
+def refresh_race_weather(cur, season=None, rnd=None):
+    # Re-derives f1_weather from the history (all races by default).
+    # Returns the number of rows that changed.
+    import pipeline_state
+
+    cur.execute(RACE_WEATHER_SQL, {"season": season, "round": rnd})
+    (changed,) = cur.fetchone()
+    if changed:
+        pipeline_state.mark_updated(cur, "f1_weather")
+        telemetry.count("rows_written", changed, table="f1_weather")
+    return changed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain the weather forecast history")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="re-derive f1_weather from the stored forecasts")
+    parser.add_argument("--season", type=int, help="limit --rebuild to one season")
+    parser.add_argument("--prune", action="store_true", help="drop expired partitions")
+    args = parser.parse_args(argv)
+
+    if not DATABASE_URL:
+        raise RuntimeError("DATABASE_URL not set")
+
+    import psycopg2
+
+    conn = psycopg2.connect(DATABASE_URL)
+    cur = conn.cursor()
+    ensure_schema(cur)
+    if args.prune:
+        drop_expired(cur)
+    if args.rebuild:
+        changed = refresh_race_weather(cur, args.season)
+        telemetry.log(f"✅ f1_weather: {changed} races re-derived")
+    conn.commit()
+    conn.close()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])